@@ -0,0 +1,117 @@
+import os
+import time
+import traceback
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from engine import PricingEngine
+from schema import SchemaError
+
+########################################################################################
+# Batch pricing of a folder of workbooks
+#
+# Every workbook (one per product line or subsidiary, in the layout of input_df) is
+# priced end to end with the same parameters in its own process, the workbooks are
+# spread over all the cores. The priced lists of a workbook are written to a folder of
+# out named after it, and Summary.csv has one row per workbook with its margins and
+# price changes (or the error of a workbook which failed, the others are still priced):
+#   summary = price_folder("Workbooks", params, "results")
+# or from the command line with a folder in place of the workbook:
+#   python cli.py Workbooks --params params.json --out results
+########################################################################################
+
+SUMMARY_COLUMNS = ["Workbook", "Status", "Parts", "Short Parts", "Old_Gross Mean", "New_Gross Mean", "New_Gross Median",
+                   "Base Price Change (%) Mean", "Base Price Change (%) Median", "Price Increases", "Price Decreases",
+                   "Old Base Prices Total", "New Base Prices Total", "Total Price Change (%)", "Seconds"]
+
+
+def workbooks(folder):
+    """
+    Paths of the xlsx workbooks of folder, sorted (Excel lock files ~$ excluded).
+    """
+    names = sorted(name for name in os.listdir(folder) if name.lower().endswith(".xlsx") and not name.startswith("~$"))
+    return [os.path.join(folder, name) for name in names]
+
+
+def _finite(column):
+    return pd.to_numeric(column, errors="coerce").replace([np.inf, -np.inf], np.nan)
+
+
+def workbook_summary(results):
+    """
+    Margins and price changes of the priced Dom-All of an engine.PricingResults.
+    """
+    DOM_ALL = results.DOM_ALL
+    old_price = _finite(DOM_ALL[" Old Base Prices (IRR)"])
+    new_price = _finite(DOM_ALL["Base Price Including VAT (IRR)"])
+    change = _finite(DOM_ALL["Base Price Change (%)"])
+    # Price change of the whole list over the parts with an old and a new price
+    priced = old_price.notna() & new_price.notna()
+    old_total, new_total = old_price[priced].sum(), new_price[priced].sum()
+    return {
+        "Parts": len(DOM_ALL),
+        "Short Parts": len(results.DOM_short),
+        "Old_Gross Mean": _finite(DOM_ALL["Old_Gross"]).mean(),
+        "New_Gross Mean": _finite(DOM_ALL["New_Gross"]).mean(),
+        "New_Gross Median": _finite(DOM_ALL["New_Gross"]).median(),
+        "Base Price Change (%) Mean": change.mean(),
+        "Base Price Change (%) Median": change.median(),
+        "Price Increases": int((change > 0).sum()),
+        "Price Decreases": int((change < 0).sum()),
+        "Old Base Prices Total": old_total,
+        "New Base Prices Total": new_total,
+        "Total Price Change (%)": (new_total / old_total - 1) * 100 if old_total else np.nan,
+    }
+
+
+def price_workbook(path, params, out, fmt="xlsx", compact=False):
+    """
+    Prices one workbook and writes its lists to out/<workbook name>.
+    Returns its summary row, with the error as Status when it failed.
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    start = time.perf_counter()
+    row = {"Workbook": name}
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            results = PricingEngine(params, compact).run(path)
+        results.write(os.path.join(out, name), fmt)
+        row.update(workbook_summary(results), Status="ok")
+    except SchemaError as e:
+        row["Status"] = "layout: " + "; ".join(f"{p['sheet']} '{p['column']}': {p['problem']}" for p in e.problems)
+    except Exception as e:
+        row["Status"] = f"error: {e}"
+        row["Traceback"] = traceback.format_exc()
+    row["Seconds"] = time.perf_counter() - start
+    return row
+
+
+def price_folder(folder, params=None, out="results", fmt="xlsx", processes=None, compact=False, progress=None):
+    """
+    Prices every workbook of folder in a pool of processes (default: all cores, at
+    most one per workbook) and writes out/Summary.csv.
+    progress(summary row, workbooks done, workbooks) is called as the workbooks finish.
+    Returns the summary, one row per workbook in the order of the folder.
+    """
+    paths = workbooks(folder)
+    os.makedirs(out, exist_ok=True)
+    rows = []
+    if paths:
+        processes = min(processes or os.cpu_count(), len(paths))
+        with ProcessPoolExecutor(processes) as pool:
+            futures = [pool.submit(price_workbook, path, params, out, fmt, compact) for path in paths]
+            for future in as_completed(futures):
+                rows.append(future.result())
+                if progress is not None:
+                    progress(rows[-1], len(rows), len(paths))
+    order = {os.path.splitext(os.path.basename(path))[0]: i for i, path in enumerate(paths)}
+    summary = pd.DataFrame(sorted(rows, key=lambda row: order[row["Workbook"]]))
+    summary = summary.reindex(columns=SUMMARY_COLUMNS + [column for column in summary.columns if column not in SUMMARY_COLUMNS])
+    # Counts stay integers next to the failed workbooks
+    summary = summary.astype({column: "Int64" for column in ["Parts", "Short Parts", "Price Increases", "Price Decreases"]})
+    summary.drop(columns="Traceback", errors="ignore").to_csv(os.path.join(out, "Summary.csv"), index=False)
+    return summary
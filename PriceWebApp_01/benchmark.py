@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import calculations_v2 as calc
+import edits
+import synthetic
+from engine import PricingEngine
+from memory import compact_frames, memory_report
+from profiling import Profiler
+
+########################################################################################
+# Scaling benchmark on synthetic workbooks
+#
+# For every size the synthetic frames are priced from scratch and the time of each
+# pipeline stage is recorded, then the two interactive paths of the dashboard:
+#   "Update Table": one edited cell of the short list, repriced like the Update button
+#   "Parameter": a sidebar parameter change (vat), only the Pricing stage reruns
+# A second, traced run records the peak memory and the memory held by the frames of a
+# session (workbook and priced lists, see memory.memory_report). The sums of the price
+# columns are kept as a checksum of the results. --compact runs with the memory lean
+# dtypes of memory.py.
+#   python benchmark.py --parts 2000 20000 --save-baseline baseline.json
+#   python benchmark.py --parts 2000 20000 --baseline baseline.json
+# With --baseline the run is compared with the stored one and the exit code is 1 when a
+# time or the peak memory grew by more than the tolerance, or when the results changed.
+########################################################################################
+
+# Edited cell of the "Update Table" path
+EDIT_COLUMN = "New_Gross"
+
+# Times shorter than this are not reported as regressions (timer noise)
+MIN_SECONDS = 0.05
+
+
+def checksum(results):
+    """
+    Sum of every numeric column of the priced lists, keyed "list/column".
+    """
+    sums = {}
+    for name in ("DOM_short", "DOM_ALL"):
+        frame = results.frames[name]
+        for column in frame.select_dtypes("number").columns:
+            sums[f"{name}/{column}"] = float(np.nansum(frame[column].to_numpy(dtype=float)))
+    return sums
+
+
+def benchmark_size(parts, bom_lines=None, repeat=3, load=False, seed=0, compact=False):
+    """
+    Benchmark of one synthetic workbook size, returns a json serializable dictionary.
+    load also times reading the workbook written as xlsx (when xlsx can hold it).
+    """
+    start = time.perf_counter()
+    frames = synthetic.synthetic_frames(parts, bom_lines=bom_lines, seed=seed)
+    if compact:
+        frames = compact_frames(frames)
+    result = {"parts": parts, "bom_lines": len(frames["BOM"]), "generate": time.perf_counter() - start}
+    key = f"synthetic-{parts}-{len(frames['BOM'])}-{seed}"
+
+    if load and all(len(frame) <= synthetic.XLSX_MAX_ROWS for frame in frames.values()):
+        # Parsed without the sheet cache: the cache folder is a new empty folder
+        cache_dir = calc.CACHE_DIR
+        with tempfile.TemporaryDirectory() as folder:
+            path = synthetic.write_workbook(frames, os.path.join(folder, "Synthetic.xlsx"))
+            calc.CACHE_DIR = os.path.join(folder, "cache")
+            try:
+                start = time.perf_counter()
+                PricingEngine(compact=compact).load(path)
+                result["load"] = time.perf_counter() - start
+            finally:
+                calc.CACHE_DIR = cache_dir
+
+    # Full pricing, the stage times are those of the fastest run
+    stages = None
+    for _ in range(repeat):
+        engine = PricingEngine()
+        start = time.perf_counter()
+        results = engine.price(frames, key)
+        seconds = time.perf_counter() - start
+        if stages is None or seconds < result["full"]:
+            result["full"], stages = seconds, dict(results.timings)
+    result["stages"] = stages
+
+    # Update Table: one edited cell of the short list
+    DOM_short = results.DOM_short
+    change = pd.DataFrame({"Part No.": [DOM_short["Part No."].iloc[len(DOM_short) // 2]],
+                           "column": [EDIT_COLUMN], "value": [float(DOM_short[EDIT_COLUMN].iloc[len(DOM_short) // 2]) + 1]})
+    edited = edits.apply_edits(DOM_short, change)
+    times = []
+    for _ in range(repeat):
+        engine.price(frames, key)       # back to the unedited list
+        start = time.perf_counter()
+        engine.price(frames, key, edited, edits_version=1)
+        times.append(time.perf_counter() - start)
+    result["update_table"] = min(times)
+
+    # Parameter change: only the Pricing stage reruns
+    times = []
+    for i in range(repeat):
+        engine.params["vat"] = 10 + (i % 2 + 1)
+        start = time.perf_counter()
+        engine.price(frames, key)
+        times.append(time.perf_counter() - start)
+    engine.params["vat"] = PricingEngine().params["vat"]
+    result["parameter"] = min(times)
+
+    # Peak traced memory of a full pricing
+    with Profiler(memory=True) as profiler:
+        results = PricingEngine().price(frames, key)
+    peaks = [record["peak_mb"] for record in profiler.records]
+    result["peak_mb"] = max(peaks) if peaks else None
+    result["frames_mb"] = float(memory_report(results.frames)["mb"].iloc[-1])
+    result["checksum"] = checksum(results)
+    return result
+
+
+def run_benchmark(sizes, bom_lines=None, repeat=3, load=False, seed=0, compact=False):
+    """
+    Benchmarks every size of parts, bom_lines is the BOM lines per part (default 6).
+    Returns {"sizes": {parts: result}}.
+    """
+    benchmark = {"sizes": {}}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        for parts in sizes:
+            lines = int(parts * bom_lines) if bom_lines else None
+            benchmark["sizes"][str(parts)] = benchmark_size(parts, lines, repeat, load, seed, compact)
+    return benchmark
+
+
+def _times(result):
+    # Timed paths of a size result, name -> seconds
+    times = {f"stage {stage}": seconds for stage, seconds in result["stages"].items()}
+    for name in ("load", "full", "update_table", "parameter"):
+        if name in result:
+            times[name] = result[name]
+    return times
+
+
+def compare_baseline(benchmark, baseline, tolerance=0.25):
+    """
+    Regressions of benchmark against baseline, a list of messages (empty when none).
+    A time or the peak memory is a regression when it grew by more than tolerance
+    (a fraction), the results when a checksum differs.
+    """
+    regressions = []
+    for size, result in benchmark["sizes"].items():
+        base = baseline["sizes"].get(size)
+        if base is None or base["bom_lines"] != result["bom_lines"]:
+            continue
+        base_times = _times(base)
+        for name, seconds in _times(result).items():
+            before = base_times.get(name)
+            if before is not None and seconds > before * (1 + tolerance) and seconds - before > MIN_SECONDS:
+                regressions.append(f"{size} parts: {name} {before:.3f} s -> {seconds:.3f} s")
+        for name in ("peak_mb", "frames_mb"):
+            if base.get(name) and result.get(name) and result[name] > base[name] * (1 + tolerance):
+                regressions.append(f"{size} parts: {name} {base[name]:.1f} MB -> {result[name]:.1f} MB")
+        for column, total in result["checksum"].items():
+            before = base["checksum"].get(column)
+            if before is not None and not np.isclose(total, before, rtol=1e-9, equal_nan=True):
+                regressions.append(f"{size} parts: results of {column} changed ({before!r} -> {total!r})")
+    return regressions
+
+
+def report(benchmark):
+    """
+    Table of the benchmark, one column per size.
+    """
+    rows = []
+    for size, result in benchmark["sizes"].items():
+        row = {"parts": result["parts"], "bom_lines": result["bom_lines"]}
+        row.update(_times(result))
+        row["peak_mb"] = result["peak_mb"]
+        row["frames_mb"] = result.get("frames_mb")
+        rows.append(row)
+    return pd.DataFrame(rows).set_index("parts").T
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pricing on synthetic workbooks.")
+    parser.add_argument("--parts", type=int, nargs="+", default=[2000, 20000], help="Sizes of Dom-All (default: 2000 20000)")
+    parser.add_argument("--bom-lines", type=float, help="BOM lines per part (default: 6)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per timing, the best is kept (default: 3)")
+    parser.add_argument("--load", action="store_true", help="Also time reading the workbook from xlsx")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the workbooks (default: 0)")
+    parser.add_argument("--compact", action="store_true", help="Use the memory lean dtypes")
+    parser.add_argument("--out", help="Write the results to this json file")
+    parser.add_argument("--save-baseline", help="Write the results as the baseline json file")
+    parser.add_argument("--baseline", help="Compare with this baseline json file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed growth of times and memory (default: 0.25)")
+    args = parser.parse_args(argv)
+
+    benchmark = run_benchmark(args.parts, args.bom_lines, args.repeat, args.load, args.seed, args.compact)
+    with pd.option_context("display.float_format", "{:.3f}".format):
+        print(report(benchmark).to_string())
+
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(benchmark, f, indent=2)
+            print(f"Written {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_baseline(benchmark, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("Regression:", regression)
+        if regressions:
+            return 1
+        print("No regression against", args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
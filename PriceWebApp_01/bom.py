@@ -0,0 +1,154 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+########################################################################################
+# Sparse product structure of the BOM sheet
+#
+# The flattened BOM (one line per top level part and component with the cumulative
+# quantity) is stored as sparse top level part x component matrices, so the material
+# cost of every assembly is a single sparse matrix-vector product and the where-used
+# index (component -> assemblies) is the transposed matrix.
+# A BOM sheet given as single level lines (PARENT PART NO, PART NO, QTY PER ASSEMBLY)
+# is exploded into that layout when the workbook is loaded (explode_bom).
+########################################################################################
+
+class BOMStructure:
+    """
+    Quantity matrices of the BOM built once per workbook.
+        parents: top level part numbers (matrix rows)
+        components: component part numbers (matrix columns)
+    The cost matrix holds the quantities for the master data costs and the quantity x
+    estimated material cost of the lines for the fallback costs, stacked for all lines
+    and for the raw material lines (TEMPLATE ID 'RM') so both roll-ups are one product.
+    """
+    def __init__(self, BOM):
+        BOM = BOM[BOM['TOP LEVEL PART NO'].notna()]
+        parent_codes, self.parents = pd.factorize(BOM['TOP LEVEL PART NO'])
+        component_codes, self.components = pd.factorize(BOM['PART NO'], use_na_sentinel=False)
+        self.parents = pd.Index(self.parents)
+        self.components = pd.Index(self.components)
+
+        qty = BOM['CUMM QTY PER ASSEMBLY'].to_numpy(dtype=float)
+        line_cost = qty * BOM['ESTIMATED MATERIAL COST'].to_numpy(dtype=float)
+        rm = (BOM['TEMPLATE ID'] == 'RM').to_numpy()
+
+        n_parents, n_components = len(self.parents), len(self.components)
+        shape = (n_parents, n_components)
+        self.qty = sparse.csr_matrix((np.nan_to_num(qty), (parent_codes, component_codes)), shape=shape)
+        self.rm_qty = sparse.csr_matrix((np.nan_to_num(qty[rm]), (parent_codes[rm], component_codes[rm])), shape=shape)
+
+        # Lines with a missing quantity or cost count as zero, like the groupby sum
+        qty_fallback = sparse.csr_matrix((np.nan_to_num(line_cost), (parent_codes, component_codes)), shape=shape)
+        rm_fallback = sparse.csr_matrix((np.nan_to_num(line_cost[rm]), (parent_codes[rm], component_codes[rm])), shape=shape)
+        self.cost_matrix = sparse.vstack([
+            sparse.hstack([self.qty, qty_fallback]),
+            sparse.hstack([self.rm_qty, rm_fallback]),
+        ]).tocsr()
+
+        # Parents without raw material lines have no Raw Material Cost (NaN)
+        self.has_rm = np.bincount(parent_codes[rm], minlength=n_parents) > 0
+
+        # Where-used index: component -> assemblies using it
+        self.where_used_matrix = self.cost_matrix.T.tocsr()
+
+        self._baseline = None      # (vector, rollup) of the first call, never changed
+        self._lock = threading.Lock()
+
+    def component_vector(self, master_cost, DomesticRM):
+        """
+        Cost vector of the components matching the columns of the cost matrix.
+        master_cost is a Series of the master data cost (Aluminium, Imported, Shemsh)
+        indexed by part number, the estimated material cost increased by DomesticRM
+        is used where a component has no master data cost.
+        """
+        master = master_cost.reindex(self.components).fillna(0).to_numpy(dtype=float)
+        fallback = (master == 0) * (1 + DomesticRM / 100.0)
+        return np.concatenate([master, fallback])
+
+    def rollup(self, vector):
+        """
+        Material cost and raw material cost of every parent for a component cost vector.
+        The roll-up of the first vector is kept as the baseline: later calls only re-cost
+        the assemblies using a component whose cost differs from the baseline, found
+        through the where-used index, on a copy of the baseline roll-up. The baseline is
+        never updated, so the sessions sharing the structure do not see each other's
+        costs and the deltas do not add up over the calls.
+        """
+        baseline = self._baseline
+        if baseline is not None and len(baseline[0]) == len(vector):
+            base_vector, base_rollup = baseline
+            changed = np.flatnonzero(vector != base_vector)
+            indptr = self.where_used_matrix.indptr
+            # Re-costing the lines of more than 1% of the matrix costs more than a full product
+            if (indptr[changed + 1] - indptr[changed]).sum() * 100 < self.cost_matrix.nnz:
+                used = self.where_used_matrix[changed]
+                rows = np.unique(used.indices)
+                rollup = base_rollup.copy()
+                if len(rows):
+                    delta = used.T @ (vector[changed] - base_vector[changed])
+                    rollup[rows] += delta[rows]
+                return self._split(rollup)
+
+        rollup = self.cost_matrix @ vector
+        if baseline is None:
+            with self._lock:
+                if self._baseline is None:
+                    self._baseline = (vector.copy(), rollup.copy())
+        return self._split(rollup)
+
+    def _split(self, rollup):
+        n_parents = len(self.parents)
+        material = pd.Series(rollup[:n_parents], index=self.parents)
+        raw_material = pd.Series(np.where(self.has_rm, rollup[n_parents:], np.nan), index=self.parents)
+        return material, raw_material
+
+    def where_used(self, components):
+        """
+        Top level parts using any of the given components.
+        """
+        positions = self.components.get_indexer(pd.Index(components))
+        positions = positions[positions >= 0]
+        # Master data and fallback columns of the components
+        columns = np.concatenate([positions, positions + len(self.components)])
+        rows = self.where_used_matrix[columns].indices % len(self.parents)
+        return self.parents[np.unique(rows)]
+
+
+def explode_bom(BOM, parent='PARENT PART NO', component='PART NO', qty='QTY PER ASSEMBLY', max_depth=50):
+    """
+    Flattens a multi level BOM into top level part, component and cumulative quantity
+    lines (the layout of the BOM sheet). The cumulative quantities are the sum over
+    all paths, A + A^2 + ... with A the single level quantity matrix.
+    Raises ValueError when the structure contains a cycle.
+    Other columns (e.g. TEMPLATE ID, ESTIMATED MATERIAL COST) are taken from the
+    first line of each component, part numbers are returned as strings. Lines without
+    a parent or a component are left out.
+    The loader (schema.validate_frames) explodes a BOM sheet given in this layout.
+    """
+    BOM = BOM[BOM[parent].notna() & BOM[component].notna()]
+    items, codes = np.unique(pd.concat([BOM[parent], BOM[component]]).astype(str), return_inverse=True)
+    parent_codes, component_codes = codes[:len(BOM)], codes[len(BOM):]
+    A = sparse.csr_matrix((BOM[qty].fillna(0).to_numpy(dtype=float), (parent_codes, component_codes)), shape=(len(items), len(items)))
+
+    total = A.copy()
+    level = A
+    for _ in range(max_depth):
+        level = level @ A
+        if level.nnz == 0:
+            break
+        total = total + level
+    else:
+        raise ValueError("The BOM contains a cycle, the structure does not end after %d levels" % max_depth)
+
+    total = total.tocoo()
+    flat = pd.DataFrame({
+        'TOP LEVEL PART NO': items[total.row],
+        'PART NO': items[total.col],
+        'CUMM QTY PER ASSEMBLY': total.data,
+    })
+    attributes = BOM.assign(**{component: BOM[component].astype(str)}).drop_duplicates(component)
+    attributes = attributes.drop(columns=[parent, qty]).set_index(component)
+    return flat.join(attributes, on='PART NO')
@@ -1,93 +1,221 @@
+import hashlib
+import json
+import os
+import shutil
+import warnings
+
 import numpy as np
 import pandas as pd
-import streamlit as st
+
+from bom import BOMStructure
+from catalog import Catalog, catalog_for, take
+from compare_rules import resolve
+from memory import compact_frames, lazy_copy, parquet_frame
+from profiles import ProfileCostModel
+from profiling import profiled
+from rounding import ROUNDING_POLICIES, RoundingPolicy
+from overrides import rules_for
+from routing import Routing
+from schema import validate_frames
+from targets import solve_base_price, target_gross
 
 ########################################################################################
+# Rounding of prices, the tiers are declared in rounding.py
 def custom_round(value):
-    steps = [(200, 10), (1000, 50), (5000, 100), (20000, 500), (100000, 1000)]
-    for threshold, step in steps:
-        if value < threshold:
-            return np.ceil(value / step) * step
-    return np.ceil(value / 5000) * 5000
+    return ROUNDING_POLICIES["Imported Raw Material"](value)
 
 #########################################################################################
 # Test rounding function 
 def test_round(value):
 
     """Rounds a number to a specific logic IRR:
-        - Round to the nearest 50_000 if it is greater than 10,000,000
-        - otherwise round to the nearest 10_000
+        - Round up to 10_000 if it is at least 300,000
+        - otherwise round up to 5_000
+    Works on single values and whole columns.
     """
-    if value >= 300_000:
-        return np.ceil(value/10000)*10000
-    return np.ceil(value/5000)*5000
+    return ROUNDING_POLICIES["Side Prices"](value)
 
 ##########################################################################################
-def input_df(uploaded_file):
+# Workbook sheets and the variable names used for them in the pipeline
+EXPECTED_SHEETS = {
+    "Cost Centers": "Cost",
+    "Aluminium Profile": "Al_profile",
+    "IMP": "Imp_RM",
+    "MH": "MH",
+    "BOM": "BOM",
+    "Shemsh": "Shemsh",
+    "Dom-Short": "DOM_short",
+    "Dom-All": "DOM_ALL",
+    "Compare": "Compare"
+}
+
+# Sheets read when the workbook has them, without a warning otherwise
+OPTIONAL_SHEETS = {
+    "Rules": "Rules",   # exception rules added to the configured ones (overrides.py)
+}
+
+# Parsed workbooks are cached here as columnar files keyed by the workbook content hash
+CACHE_DIR = os.environ.get("PRICEWEBAPP_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+# Workbooks kept in the cache, the least recently used are deleted beyond
+MAX_CACHED_WORKBOOKS = 20
+
+def workbook_hash(uploaded_file):
     """
-    Reads and extracts data from the uploaded file.
-    Returns a dictionary of dataframes for further processing.
+    Returns the sha256 hex digest of the workbook content.
+    Accepts a file path or a file-like object (e.g. streamlit UploadedFile).
     """
-    
-    if uploaded_file:
-        # Define expected sheet names
-        expected_sheets = {
-            "Cost Centers": "Cost",
-            "Aluminium Profile": "Al_profile",
-            "IMP": "Imp_RM",
-            "MH": "MH",
-            "BOM": "BOM",
-            "Shemsh": "Shemsh",
-            "Dom-Short": "DOM_short",
-            "Dom-All": "DOM_ALL",
-            "Compare": "Adj"
-        }
-
-        # Dictionary to hold dataframes
+    digest = hashlib.sha256()
+    if hasattr(uploaded_file, "getvalue"):
+        digest.update(uploaded_file.getvalue())
+    else:
+        with open(uploaded_file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def read_cached_sheets(key):
+    """
+    Loads the cached sheets of a workbook, returns None if the workbook is not cached.
+    An unreadable cache (corrupt, or written by an older version) is reported with
+    warnings.warn and deleted, the workbook is then parsed again.
+    """
+    folder = os.path.join(CACHE_DIR, key)
+    if not os.path.exists(os.path.join(folder, "sheets.json")):
+        return None
+    try:
+        with open(os.path.join(folder, "sheets.json"), encoding="utf-8") as f:
+            files = json.load(f)
         dataframes = {}
-        
-        try:
-            # Read the uploaded file
-            available_sheets = pd.ExcelFile(uploaded_file).sheet_names
-
-            # Loop through expected sheets and load data
-            for sheet_name, variable_name in expected_sheets.items():
-                if sheet_name in available_sheets:
-                    dataframes[variable_name] = pd.read_excel(uploaded_file, sheet_name=sheet_name)
-                else:
-                    st.warning(f"Warning: Sheet '{sheet_name}' is missing in the uploaded file.")
-
-            # Extract individual dataframes for further use
-            Cost = dataframes.get("Cost")
-            Al_profile = dataframes.get("Al_profile")
-            Imp_RM = dataframes.get("Imp_RM")
-            MH = dataframes.get("MH")
-            BOM = dataframes.get("BOM")
-            Shemsh = dataframes.get("Shemsh")
-            DOM_short = dataframes.get("DOM_short")
-            DOM_ALL = dataframes.get("DOM_ALL")
-            Compare = dataframes.get("Adj")
-
-
-        except Exception as e:
-            st.error(f"An error occurred: {e}")
+        for variable_name, file_name in files.items():
+            # Only Parquet files are read, older caches also held pickles
+            if not file_name.endswith(".parquet"):
+                raise ValueError(f"{file_name} is not a Parquet file")
+            # Older caches named the Compare sheet Adj
+            variable_name = "Compare" if variable_name == "Adj" else variable_name
+            dataframes[variable_name] = pd.read_parquet(os.path.join(folder, file_name))
+        # Most recently used first when pruning
+        os.utime(folder)
+    except Exception as e:
+        warnings.warn(f"Warning: the cached workbook {key} can not be read ({e}), it is parsed again.")
+        shutil.rmtree(folder, ignore_errors=True)
+        return None
+    return dataframes
+
+def write_cached_sheets(key, dataframes):
+    """
+    Stores the parsed sheets as Parquet, mixed columns (e.g. int/str Part No) are
+    stored as strings (parquet_frame). The least recently used workbooks beyond
+    MAX_CACHED_WORKBOOKS are deleted.
+    The cache is best effort so failures are ignored.
+    """
+    folder = os.path.join(CACHE_DIR, key)
+    tmp_folder = f"{folder}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(tmp_folder, exist_ok=True)
+        files = {}
+        for variable_name, df in dataframes.items():
+            file_name = f"{variable_name}.parquet"
+            parquet_frame(df).to_parquet(os.path.join(tmp_folder, file_name))
+            files[variable_name] = file_name
+        with open(os.path.join(tmp_folder, "sheets.json"), "w", encoding="utf-8") as f:
+            json.dump(files, f)
+        os.replace(tmp_folder, folder)
+        prune_cache()
+    except Exception:
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+
+def prune_cache(cache_dir=None, keep=MAX_CACHED_WORKBOOKS):
+    """
+    Deletes the least recently used cached workbooks beyond keep (the .tmp folders
+    are the workbooks being written and kept).
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    if not os.path.isdir(cache_dir):
+        return
+    folders = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if not name.endswith(".tmp")]
+    folders = sorted((folder for folder in folders if os.path.isdir(folder)), key=os.path.getmtime, reverse=True)
+    for folder in folders[keep:]:
+        shutil.rmtree(folder, ignore_errors=True)
+
+##########################################################################################
+@profiled
+def input_df(uploaded_file, key=None, compact=False):
+    """
+    Reads and extracts data from the uploaded file.
+    The workbook is parsed once and cached by its content hash, so uploading
+    the same file again loads the cached columnar copy instead of the Excel file.
+    Missing sheets are reported with warnings.warn, reading errors are raised
+    to the caller (the dashboard or the command line).
+    The sheets are checked and coerced with the layout of schema.py, a workbook
+    which does not match it raises a schema.SchemaError.
+    key is the content hash of the workbook when the caller already computed it, a
+    cached workbook can then be loaded without the file (uploaded_file None).
+    compact converts the frames to the memory lean dtypes of memory.py.
+    Returns the dataframes for further processing.
+    """
+    if not uploaded_file and not key:
+        raise ValueError("Please upload an Excel file to proceed.")
+
+    key = key or workbook_hash(uploaded_file)
+    dataframes = read_cached_sheets(key)
+
+    if dataframes is None and not uploaded_file:
+        raise ValueError("The workbook is no longer cached, please upload it again.")
+    if dataframes is None:
+        # Open the workbook once and parse only the expected sheets
+        with pd.ExcelFile(uploaded_file) as xls:
+            available_sheets = xls.sheet_names
+            sheet_names = [name for name in {**EXPECTED_SHEETS, **OPTIONAL_SHEETS} if name in available_sheets]
+            parsed = xls.parse(sheet_name=sheet_names)
+        dataframes = validate_frames({{**EXPECTED_SHEETS, **OPTIONAL_SHEETS}[name]: df for name, df in parsed.items()})
+        write_cached_sheets(key, dataframes)
     else:
-        st.info("Please upload an Excel file to proceed.")
-    return Cost, Al_profile, Imp_RM, MH, BOM, Shemsh, DOM_short, DOM_ALL, Compare
+        # Cached sheets are already coerced, checking them again is cheap
+        dataframes = validate_frames(dataframes)
+    if compact:
+        dataframes = compact_frames(dataframes)
+
+    for sheet_name, variable_name in EXPECTED_SHEETS.items():
+        if variable_name not in dataframes:
+            warnings.warn(f"Warning: Sheet '{sheet_name}' is missing in the uploaded file.")
+
+    # Extract individual dataframes for further use
+    Cost = dataframes.get("Cost")
+    Al_profile = dataframes.get("Al_profile")
+    Imp_RM = dataframes.get("Imp_RM")
+    MH = dataframes.get("MH")
+    BOM = dataframes.get("BOM")
+    Shemsh = dataframes.get("Shemsh")
+    DOM_short = dataframes.get("DOM_short")
+    DOM_ALL = dataframes.get("DOM_ALL")
+    Compare = dataframes.get("Compare")
+    Rules = dataframes.get("Rules")
+
+    return Cost, Al_profile, Imp_RM, MH, BOM, Shemsh, DOM_short, DOM_ALL, Compare, Rules
 
 ##########################################################################################
-def process_AlprofIMPRM(Al_profile, Imp_RM, euro_to_currency, nima, custom, ExpDuties):
+@profiled
+def process_AlprofIMPRM(Al_profile, Imp_RM, euro_to_currency, nima, custom, ExpDuties, Al_index=None):
     """
     Process Aluminium Profile and Imported Raw Material.
+    Al_profile is the Aluminium Profile sheet or a profiles.ProfileCostModel built from it,
+    Al_index the indices of its base fees ({fee column or "*": index}, 1 = the workbook fees).
+    The sheets are not modified (they may be shared by several sessions), the new
+    columns are added to lazy copies.
     """
+    if not isinstance(Al_profile, ProfileCostModel):
+        Al_profile = ProfileCostModel(Al_profile)
+    profiles = Al_profile
+    Al_profile, Imp_RM = lazy_copy(profiles.frame), lazy_copy(Imp_RM)
     ##########
     # Perform calculations for Aluminium Profiles Imported Raw Material
-    baseFees = Al_profile.columns[Al_profile.columns.str.contains("پايه", case=False, na=False)]
-    Al_profile["Total"] = Al_profile[baseFees].mul(Al_profile["وزن"], axis=0).sum(axis=1)
+    # Weight x base fees, every fee scaled by its commodity index
+    Al_profile["Total"] = profiles.totals(Al_index)
     
     # Example: Currency Conversion
     currency_to_euro = {key: 1 / value for key, value in euro_to_currency.items()}
-    Imp_RM["Euro Cost"] = Imp_RM["Cost"] * Imp_RM["Currency"].map(currency_to_euro)
+    Imp_RM["Euro Cost"] = Imp_RM["Cost"] * Imp_RM["Currency"].map(currency_to_euro).astype(float)  # Currency may be categorical
  
     # Determine Euro Cost for Megalit and VSG then find IRR
     # Commission Megalite and VS.G from Euro price
@@ -105,83 +233,108 @@ def process_AlprofIMPRM(Al_profile, Imp_RM, euro_to_currency, nima, custom, ExpD
     Imp_RM["Domestic Cost"] = Imp_RM["Domestic Custom Duties"] + Imp_RM["IRR Cost"]
 
     # Apply rounding for IRR Cost with Customs
-    Imp_RM["Final Domestic Cost"] = Imp_RM["Domestic Cost"].apply(custom_round)
+    Imp_RM["Final Domestic Cost"] = custom_round(Imp_RM["Domestic Cost"])
 
     return Al_profile, Imp_RM
 
 ################################################################################################
-def process_bom(Al_profile, Imp_RM, Shemsh, Cost, BOM, MH, DomesticRM):
+@profiled
+def process_bom(Al_profile, Imp_RM, Shemsh, BOM, DomesticRM, Al_index=None):
     """
-    Process BOM and Man Hour file.
+    Material cost of the assemblies from the BOM.
+    The component cost is the master data cost (Aluminium Profile, Imported Raw Material, Shemsh)
+    and the estimated material cost increased by DomesticRM where there is none.
+    BOM is the BOM sheet or a bom.BOMStructure built from it, a structure keeps the
+    previous costs and only re-costs the assemblies using changed components.
+    Al_profile is the processed Aluminium Profile sheet (Total) or a profiles.ProfileCostModel,
+    the profiles are then costed with the fee indices Al_index.
+    Returns Material Cost and Raw Material Cost indexed by the top level part no.
     """
-    # Example: BOM Calculation
-    # Example merge: Ensure column names in the source dataframes match
-    BOM = BOM.merge(Al_profile[['Part No', 'Total']], how='left', left_on='PART NO', right_on='Part No', suffixes=('', '_aluminium'))
-    BOM = BOM.merge(Imp_RM[['Part No', 'Final Domestic Cost']], how='left', left_on='PART NO', right_on='Part No', suffixes=('', '_imp'))
-    BOM = BOM.merge(Shemsh[['Part No', 'Est Mtr Cost']], how='left', left_on='PART NO', right_on='Part No', suffixes=('', '_shemsh'))
-
-    BOM['Material Cost'] = BOM['Total'].fillna(0) + BOM['Final Domestic Cost'].fillna(0) + BOM['Est Mtr Cost'].fillna(0)
-    DropCols = ['Part No', 'Part No_aluminium', 'Part No_imp', 'Part No_shemsh', 'Total', 'Final Domestic Cost', 'Est Mtr Cost']
-    BOM.drop(columns=DropCols, inplace=True, errors='ignore')
-    BOM['ESTIMATED MATERIAL COST'] = BOM['ESTIMATED MATERIAL COST'] * (1 + DomesticRM / 100.0)
-    BOM['Material Cost'] = BOM['Material Cost'].where(BOM['Material Cost'] != 0, BOM['ESTIMATED MATERIAL COST'])
-
-    BOM['Total Component Cost'] = BOM['Material Cost'] * BOM['CUMM QTY PER ASSEMBLY']
+    if not isinstance(BOM, BOMStructure):
+        BOM = BOMStructure(BOM)
+
+    if isinstance(Al_profile, ProfileCostModel):
+        # Index changes only re-cost the assemblies using the profiles
+        master_cost = pd.concat([
+            Imp_RM.set_index('Part No')['Final Domestic Cost'],
+            Shemsh.set_index('Part No')['Est Mtr Cost'],
+        ])
+        material, raw_material = Al_profile.bom_costs(BOM, Al_index, master_cost, DomesticRM)
+        return pd.DataFrame({'Material Cost': material, 'Raw Material Cost': raw_material})
+
+    # Master data cost of the components
+    master_cost = pd.concat([
+        Al_profile.set_index('Part No')['Total'],
+        Imp_RM.set_index('Part No')['Final Domestic Cost'],
+        Shemsh.set_index('Part No')['Est Mtr Cost'],
+    ])
+    master_cost = master_cost.groupby(level=0).sum()
+
+    # Roll up of the material cost: quantity matrix times the component costs
+    material, raw_material = BOM.rollup(BOM.component_vector(master_cost, DomesticRM))
+    Assembly_costs = pd.DataFrame({'Material Cost': material, 'Raw Material Cost': raw_material})
+    return Assembly_costs
 
+################################################################################################
+@profiled
+def process_mh(MH, Cost):
+    """
+    Process Man Hour file.
+    """
     # Calculate Labor Cost and Man Hour
-    dropCols = ['Cost Center Description']
-    MH = pd.merge(MH, Cost, on='Cost Center', how='left').drop(columns=dropCols)
+    # The labor cost of the cost center is looked up in place of merging the whole MH sheet
+    # (a merge duplicates the MH lines when a cost center is repeated, kept in that case)
+    if Cost['Cost Center'].is_unique:
+        MH = MH.assign(**{column: MH['Cost Center'].map(Cost.set_index('Cost Center')[column])
+                          for column in Cost.columns if column not in ('Cost Center', 'Cost Center Description')})
+    else:
+        dropCols = ['Cost Center Description']
+        MH = pd.merge(MH, Cost, on='Cost Center', how='left').drop(columns=dropCols)
 
     MH["Man_Hour"] = ((1 / MH["RUN FACTOR"]) + (MH[" SETUP TIME"]/MH["STD LOT SIZE"])) * MH["QTY"] * MH["CREW SIZE"]
-    # MH["Labor Cost -OLD"] = MH["Man_Hour"] * OLDlaborRate
-    # MH['Labor Cost -NEW'] = MH['Man_Hour'] * MH['Est Labor Cost']
-    # MH['Diff'] = MH['Labor Cost -NEW'] - MH["Labor Cost -OLD"]
-    return BOM, MH
+    # The labor cost per part and per cost center (old and new rates) is in routing.Routing
+    return MH
 
 ################################################################################################
-def process_DOM_ALL(BOM, MH, DOM_ALL, OverHead_Rates, OLDlaborRate):
+@profiled
+def process_DOM_ALL(Assembly_costs, MH, DOM_ALL, Overrides, OverHead_Rates, OLDlaborRate, LaborCosting="Labor Rate"):
     """
-    Mapping the Calculated Material Cost From BOM and and Labor Cost from MH to Dom ALL and calculate Finish cost
+    Mapping the Calculated Material Cost From BOM (process_bom) and and Labor Cost from MH to Dom ALL and calculate Finish cost
         - Material Cost
         - Labor Cost
         - OverHead Cost
+    Works on a lazy copy of DOM_ALL, the loaded sheet is not modified.
+    MH is the processed MH sheet (process_mh) or its routing.Routing. LaborCosting
+    'Cost Center' costs the man hours at the Est Labor Cost of their cost centers
+    in place of OLDlaborRate, Labor Cost Diff is that cost minus the cost at OLDlaborRate.
+    Overrides are the overrides.Overrides of the workbook (the exceptions of the man
+    hours and the MOH), the configured rules are used when it is None.
     """
+    rules = rules_for(DOM_ALL, Overrides.all if Overrides is not None else None)
     ## DOM_ALL
-    grp = MH.groupby('PART_NO')['Man_Hour'].sum().reset_index()
-    DOM_ALL['Man_Hour'] = DOM_ALL['Part No.'].map(grp.set_index('PART_NO')['Man_Hour'])
-
-    ###########
-    Exceptions = ['31BB802000', '31BB803000', '31BB804000', '31BB805000']
-    DOM_ALL.loc[DOM_ALL['Part No.'].isin(Exceptions) , 'Man_Hour'] = 0.1
+    DOM_ALL = lazy_copy(DOM_ALL)
+    routing = MH if isinstance(MH, Routing) else Routing(MH)
+    positions = routing.positions(DOM_ALL['Part No.'])
+    DOM_ALL['Man_Hour'] = take(routing.man_hours, positions)
     DOM_ALL['Man_Hour'] = DOM_ALL['Man_Hour'].fillna(0)
-    ###########
-    Galaxy = ['31CS009006', '31CS009007']
-    DOM_ALL.loc[DOM_ALL['Part No.'].isin(Galaxy) , 'Man_Hour'] = DOM_ALL.loc[1213 , 'Man_Hour']
-    ##########
 
-    DOM_ALL['Labor Cost'] = DOM_ALL['Man_Hour'] * OLDlaborRate
-    DOM_ALL.drop(columns=['TOP LEVEL PART NO', 'Total Component Cost'], inplace=True, errors='ignore')  
+    # Man hour exceptions (fixed man hours, Galaxy parts copied from another part)
+    rules.apply("Man_Hour", DOM_ALL)
 
-    grp2 = BOM.groupby('TOP LEVEL PART NO')['Total Component Cost'].sum().reset_index()
-    DOM_ALL = DOM_ALL.merge(grp2, how='left', left_on='Part No.', right_on='TOP LEVEL PART NO')
-    DOM_ALL['Material Cost'] = DOM_ALL['Total Component Cost']  # Raw Material plus semi-finished
-    DOM_ALL.drop(columns=['TOP LEVEL PART NO', 'Total Component Cost'], inplace=True, errors='ignore')   
+    # Labor cost at the labor rate or at the rates of the cost centers of the part
+    center_rates = routing.labor_rates(positions, OLDlaborRate)
+    DOM_ALL['Labor Cost Diff'] = DOM_ALL['Man_Hour'] * (center_rates - OLDlaborRate)
+    if LaborCosting == "Cost Center":
+        DOM_ALL['Labor Cost'] = DOM_ALL['Man_Hour'] * center_rates
+    else:
+        DOM_ALL['Labor Cost'] = DOM_ALL['Man_Hour'] * OLDlaborRate
 
-    filtered_bom = BOM[BOM['TEMPLATE ID'] == 'RM']
-    grp3 = filtered_bom.groupby('TOP LEVEL PART NO')['Total Component Cost'].sum().reset_index()
-    DOM_ALL = DOM_ALL.merge(grp3, how='left', left_on='Part No.', right_on='TOP LEVEL PART NO')
-    DOM_ALL['Raw Material Cost'] = DOM_ALL['Total Component Cost']
-    DOM_ALL.drop(columns=['TOP LEVEL PART NO', 'Total Component Cost'], inplace=True, errors='ignore')   
+    DOM_ALL['Material Cost'] = DOM_ALL['Part No.'].map(Assembly_costs['Material Cost'])  # Raw Material plus semi-finished
+    DOM_ALL['Raw Material Cost'] = DOM_ALL['Part No.'].map(Assembly_costs['Raw Material Cost'])
     DOM_ALL['MOH'] = DOM_ALL['Raw Material Cost'] * OverHead_Rates['MOH'] / 100
 
     # MOH for Explosion Proof and Fanal barchasb set to zero
-    # make type of part no column as string for searching effectivly
-    Copy_DOM_ALL = DOM_ALL.copy()
-    Copy_DOM_ALL['Part No.'] = Copy_DOM_ALL['Part No.'].astype(str)
-    Copy_DOM_ALL.loc[Copy_DOM_ALL['Part No.'].str.startswith('34'), 'MOH'] = 0
-    # Fanal Barchasb changes
-    Copy_DOM_ALL.loc[Copy_DOM_ALL['Part No.']=='3129814000', 'MOH'] = 0
-    DOM_ALL['MOH'] = Copy_DOM_ALL['MOH']
+    rules.apply("MOH", DOM_ALL)
     #####################################
 
     DOM_ALL['LAB'] = DOM_ALL['Man_Hour'] * OverHead_Rates['LAB'] + OverHead_Rates['LABSU2'] * OverHead_Rates['LAB'] * DOM_ALL['Man_Hour'] / 100 + \
@@ -193,55 +346,63 @@ def process_DOM_ALL(BOM, MH, DOM_ALL, OverHead_Rates, OLDlaborRate):
     return DOM_ALL
 
 ########################################################################################################
-def compare(Compare, DOM_ALL, price_type):
+@profiled
+def compare(Compare, DOM_ALL, price_type, index=None, rules=None):
+    """
+    Compare adjustments of price_type (a column or a list of columns) in DOM_ALL (or DOM_short),
+    resolved in the order of the compare graph so chains of super components are consistent.
+    index is the catalog.PartIndex of the list, built here when not given.
+    rules are the overrides.CompiledRules of the list (old price floor of the Common Parts).
+    """
+    if index is None:
+        index = Catalog(DOM_ALL, DOM_ALL, Compare).all
+    price_types = [price_type] if isinstance(price_type, str) else list(price_type)
+    prices = DOM_ALL[price_types].to_numpy(dtype=float, copy=True)
 
     ## Compare Adjustments
-    # Diff component part 1 price with component part 2 price plus the increase or decreased price
-    Compare['Diff Component Part 2 and 1'] = Compare['Component Part 1'].map(DOM_ALL.set_index('Part No.')[price_type]) - \
-        Compare['Component Part 2'].map(DOM_ALL.set_index('Part No.')[price_type])
-    
-
-    # Compare['Increase or Decrease Price'] =  0
-    # Compare['Diff Component Part 2 and 1'] = Compare['Component Part 1'].map(DOM_ALL.set_index('Part No.')[price_type]) - \
-    #     Compare['Component Part 2'].map(DOM_ALL.set_index('Part No.')[price_type]) \
-    #      - Compare['Component Part 2'].map(Compare.set_index('Component Part 1')['Increase or Decrease Price'])
+    # Diff component part 1 price with component part 2 price and the same diff of the super component,
+    # the columns of the Compare sheet hold the values of the last price column
+    diff, super_diff, adjustment = resolve(index.compare_graph, prices, index.compare_1, index.compare_2)
+    Compare['Diff Component Part 2 and 1'] = diff[:, -1]
+    Compare['Diff Super Component Part 2 and 1'] = super_diff[:, -1]
+    Compare['Increase or Decrease Price'] = adjustment[:, -1]
 
-
-    Compare['Diff Super Component Part 2 and 1'] = Compare['Super Component 1'].map(Compare.set_index('Component Part 1')['Diff Component Part 2 and 1'])
-
-    Compare['Increase or Decrease Price'] =  Compare['Diff Super Component Part 2 and 1'] - Compare['Diff Component Part 2 and 1']
-    
     # Pricing After Compare Adjustments
-    DOM_ALL[price_type] += DOM_ALL['Part No.'].map(Compare.set_index('Component Part 1')['Increase or Decrease Price']).fillna(0)
+    DOM_ALL[price_types] = prices
     # Common Parts
-    cond1 = (DOM_ALL['Price List Type']=="Common Parts")
-    cond4 = (DOM_ALL[price_type] <= DOM_ALL[" Old Base Prices (IRR)"])
-    DOM_ALL.loc[cond1 & cond4, price_type] = DOM_ALL[" Old Base Prices (IRR)"]
+    rules_for(DOM_ALL, rules).apply("Compare", DOM_ALL, price_types)
 
     return DOM_ALL
 
 ########################################################################################################
-def UpdateBasePrice(DOM_ALL, DOM_short, method, Compare, RepCom, VAT, CommonPartPriceCriteria, CommonPartCoeff):
+def round_base_price(price):
+    return ROUNDING_POLICIES["Base Price"](price)
+
+########################################################################################################
+@profiled
+def UpdateBasePrice(DOM_ALL, DOM_short, method, Compare, RepCom, VAT, CommonPartPriceCriteria, CommonPartCoeff, catalog=None, targets=None, rules=None):
     """
     Calculation of short list products price with Mani Algorithm then perform adjustments 
     based on compare method and finnaly updating the DOM_ALL dataFrame.
+    catalog is the catalog.Catalog of the lists, rebuilt when it does not match them.
+    targets are the target New_Gross of the 'Target Margin' method (targets.py).
+    rules are the overrides.CompiledRules of DOM_ALL (Common Parts pricing and floor).
     """
+    catalog = catalog_for(DOM_ALL, DOM_short, Compare, catalog)
+
     ## DOM Short
-    DOM_short['Finished Cost'] = DOM_short['Part No.'].map(DOM_ALL.set_index('Part No.')['Finished Cost'])
-    DOM_short[' Old Base Prices (IRR)'] = DOM_short['Part No.'].map(DOM_ALL.set_index('Part No.')[' Old Base Prices (IRR)'])
-    DOM_short['Old Finished Cost With Comp.'] = DOM_short['Part No.'].map(DOM_ALL.set_index('Part No.')['Old Finished Cost With Comp.'])
+    DOM_short['Finished Cost'] = take(DOM_ALL['Finished Cost'], catalog.short_in_all)
+    DOM_short[' Old Base Prices (IRR)'] = take(DOM_ALL[' Old Base Prices (IRR)'], catalog.short_in_all)
+    DOM_short['Old Finished Cost With Comp.'] = take(DOM_ALL['Old Finished Cost With Comp.'], catalog.short_in_all)
 
     # Calculating Old Gross
     NoVATOLDPrice = (1-(RepCom/100)) * DOM_short[' Old Base Prices (IRR)'] / (1 + VAT / 100)
     DOM_short['Old_Gross'] = (NoVATOLDPrice - DOM_short['Old Finished Cost With Comp.'] ) / (NoVATOLDPrice) * 100
     # DOM_short['Old_Gross'] = round(DOM_short['Old_Gross'], 2)
 
-    # Create a mapping from 'Part No.' to 'Old Base Prices (IRR)'
-    price_map = DOM_short.set_index('Part No.')[' Old Base Prices (IRR)']
-
-    # Use the 'Super Base Part' to map the corresponding 'Old Base Prices (IRR)' from the price_map 
+    # Use the 'Super Base Part' to map the corresponding 'Old Base Prices (IRR)'
     # OLD Base price for the super base parts
-    DOM_short['Matching Price'] = DOM_short['Super Base Part'].map(price_map)
+    DOM_short['Matching Price'] = take(DOM_short[' Old Base Prices (IRR)'], catalog.super_in_short)
 
     # Calculate the 'Coefficient' in a vectorized manner
     DOM_short['Coefficient'] = (DOM_short[' Old Base Prices (IRR)'] / DOM_short['Matching Price']) * 100
@@ -249,8 +410,8 @@ def UpdateBasePrice(DOM_ALL, DOM_short, method, Compare, RepCom, VAT, CommonPart
 
     if (method == 'Original Price'):
         # Original Price is the new base price for super base parts
-        Original_price_map = DOM_short.set_index('Part No.')['Original Price (IRR)']
-        mapped = pd.to_numeric(DOM_short['Super Base Part'].map(Original_price_map), errors='coerce')
+        Original_price = pd.to_numeric(DOM_short['Original Price (IRR)'], errors='coerce')
+        mapped = take(Original_price, catalog.super_in_short)
         DOM_short['Rough Price'] = mapped * DOM_short['Coefficient'] / 100
         #DOM_short['Rough Price'] = DOM_short['Rough Price'].astype(int)    
 
@@ -261,18 +422,17 @@ def UpdateBasePrice(DOM_ALL, DOM_short, method, Compare, RepCom, VAT, CommonPart
         # Updating Dom_short base price Including VAT (IRR)
         DOM_short["Base Price Including VAT (IRR)"] = DOM_short['Finished Cost'] * (1 + VAT / 100) / (((100 - RepCom)- DOM_short['New_Gross'])/100)
         # Rounding will get the results closer tosource but by changing original price we will be under valuing by a 10000 irr supposably.
-        # DOM_short["Base Price Including VAT (IRR)"] = np.ceil(round(DOM_short["Base Price Including VAT (IRR)"] / 10000)) * 10000
-        DOM_short["Base Price Including VAT (IRR)"] = np.ceil(DOM_short["Base Price Including VAT (IRR)"] / 10000) * 10000
+        DOM_short["Base Price Including VAT (IRR)"] = round_base_price(DOM_short["Base Price Including VAT (IRR)"])
         DOM_short["Base Price Change (%)"] = (DOM_short["Base Price Including VAT (IRR)"] - DOM_short[' Old Base Prices (IRR)']) /  DOM_short[' Old Base Prices (IRR)'] * 100
 
     elif (method == 'New Gross'):
         DOM_short["Base Price Including VAT (IRR)"] = DOM_short['Finished Cost'] * (1 + VAT / 100) / (((100 - RepCom)- DOM_short['New_Gross'])/100)
-        DOM_short["Base Price Including VAT (IRR)"] = np.ceil(DOM_short["Base Price Including VAT (IRR)"] / 10000) * 10000
+        DOM_short["Base Price Including VAT (IRR)"] = round_base_price(DOM_short["Base Price Including VAT (IRR)"])
         DOM_short["Base Price Change (%)"] = (DOM_short["Base Price Including VAT (IRR)"] - DOM_short[' Old Base Prices (IRR)']) /  DOM_short[' Old Base Prices (IRR)'] * 100
 
     elif (method == "Price Diff"):
         DOM_short["Base Price Including VAT (IRR)"] = (1 + DOM_short["Base Price Change (%)"] / 100) * DOM_short[' Old Base Prices (IRR)']
-        DOM_short["Base Price Including VAT (IRR)"] = np.ceil(DOM_short["Base Price Including VAT (IRR)"] / 10000) * 10000
+        DOM_short["Base Price Including VAT (IRR)"] = round_base_price(DOM_short["Base Price Including VAT (IRR)"])
         # New Gross Calculation
         NoVATRoughPrice = (DOM_short["Base Price Including VAT (IRR)"] / (1 + VAT / 100))
         DOM_short['New_Gross'] = ((1-(RepCom/100)) * NoVATRoughPrice - DOM_short['Finished Cost'] ) / (NoVATRoughPrice) * 100
@@ -284,23 +444,46 @@ def UpdateBasePrice(DOM_ALL, DOM_short, method, Compare, RepCom, VAT, CommonPart
         # Drop the 'Orig' column after the update
         DOM_short.drop(columns='Orig', inplace=True, errors='ignore')
 
+    elif (method == "Target Margin"):
+        # Smallest rounded price reaching the target of the product group, the rows without
+        # a target (Target Gross NaN) are solved for their New_Gross. The column only holds
+        # the configured targets, a priced list sent back with the edits keeps the same ones
+        DOM_short['Target Gross'] = target_gross(DOM_short, targets)
+        goal = DOM_short['Target Gross'].fillna(pd.to_numeric(DOM_short['New_Gross'], errors='coerce'))
+        DOM_short["Base Price Including VAT (IRR)"] = solve_base_price(DOM_short['Finished Cost'], goal, RepCom, VAT)
+        # New Gross reached by the rounded price
+        NoVATRoughPrice = (DOM_short["Base Price Including VAT (IRR)"] / (1 + VAT / 100))
+        DOM_short['New_Gross'] = ((1-(RepCom/100)) * NoVATRoughPrice - DOM_short['Finished Cost'] ) / (NoVATRoughPrice) * 100
+        DOM_short["Base Price Change (%)"] = (DOM_short["Base Price Including VAT (IRR)"] - DOM_short[' Old Base Prices (IRR)']) /  DOM_short[' Old Base Prices (IRR)'] * 100
+
 
     ## Set Prices For all products based on the short list pricing algorithm in DOM_ALL
-    DOM_ALL["Base Price Including VAT (IRR)"] = DOM_ALL['Part No.'].map(DOM_short.set_index('Part No.')['Base Price Including VAT (IRR)']).fillna(0) \
-    + DOM_ALL['Base Part'].map(DOM_short.set_index('Part No.')['Base Price Including VAT (IRR)']).fillna(0)
+    ShortBasePrice = DOM_short['Base Price Including VAT (IRR)'].to_numpy(dtype=float)
+    DOM_ALL["Base Price Including VAT (IRR)"] = np.nan_to_num(take(ShortBasePrice, catalog.all_in_short), nan=0, posinf=np.inf, neginf=-np.inf) \
+    + np.nan_to_num(take(ShortBasePrice, catalog.base_in_short), nan=0, posinf=np.inf, neginf=-np.inf)
 
     ## Common Parts Fix Rounding
-    cond1 = (DOM_ALL['Price List Type']=="Common Parts")
-    cond2 = (DOM_ALL['Finished Cost'] < CommonPartPriceCriteria)
-    cond3 = (DOM_ALL['Finished Cost'] > CommonPartPriceCriteria)
-
-    DOM_ALL.loc[cond1 & cond3, 'Base Price Including VAT (IRR)'] = np.ceil(DOM_ALL['Finished Cost'] / CommonPartCoeff / 100000) * 100000
-    DOM_ALL.loc[cond1 & cond2, 'Base Price Including VAT (IRR)'] = np.ceil(DOM_ALL['Finished Cost'] / CommonPartCoeff / 5000) * 5000
+    # The step depends on the Finished Cost compared with the price criteria. A Finished
+    # Cost equal to the criteria is in neither tier, the part keeps the price of its list
+    common_round = RoundingPolicy([CommonPartPriceCriteria], ROUNDING_POLICIES["Common Parts"].steps)
+    rules = rules_for(DOM_ALL, rules)
+    cond1 = rules.mask("Base Price", "cost_price") & DOM_ALL['Finished Cost'].notna() & (DOM_ALL['Finished Cost'] != CommonPartPriceCriteria)
+    FinishedCost = DOM_ALL.loc[cond1, 'Finished Cost']
+    CommonPrice = common_round(FinishedCost / CommonPartCoeff, by=FinishedCost)
+    if (method == "Target Margin"):
+        # Common parts with a target are raised to the smallest price of their steps reaching it,
+        # the parts of the short list keep their target (the parts priced from their Base Part
+        # share its price, not its margin)
+        DOM_ALL['Target Gross'] = take(DOM_short['Target Gross'].to_numpy(dtype=float), catalog.all_in_short)
+        CommonTarget = target_gross(DOM_ALL.loc[cond1], targets)
+        CommonPrice = np.fmax(CommonPrice, solve_base_price(FinishedCost, CommonTarget, RepCom, VAT, common_round, by=FinishedCost))
+        DOM_ALL.loc[cond1, 'Target Gross'] = CommonTarget
+    DOM_ALL.loc[cond1, 'Base Price Including VAT (IRR)'] = CommonPrice
 
     DOM_ALL["Base Price Including VAT (IRR)"] = DOM_ALL["Base Price Including VAT (IRR)"].astype(int)
 
     ## Compare Function Call to Adjust prices
-    DOM_ALL = compare(Compare, DOM_ALL, price_type='Base Price Including VAT (IRR)')
+    DOM_ALL = compare(Compare, DOM_ALL, price_type='Base Price Including VAT (IRR)', index=catalog.all, rules=rules)
 
     # New & Old Gross in DOM ALL
     NoVATOLDPriceAll = (1-(RepCom/100)) * DOM_ALL[' Old Base Prices (IRR)'] / (1 + VAT / 100)
@@ -317,31 +500,3 @@ def UpdateBasePrice(DOM_ALL, DOM_short, method, Compare, RepCom, VAT, CommonPart
     #DOM_ALL["Base Price Change (%)"] = round(DOM_ALL["Base Price Change (%)"], 1)
 
     return DOM_short, DOM_ALL
-
-########################################################################################################
-def Calc_Side_Prices(DOM_ALL, Sales_Percent, Compare, price_type):
-    
-    cond = (DOM_ALL['Model']== 'ضد انفجار')
-
-    if (price_type=='End-User Price Including VAT (IRR)'):
-    
-        old_price_type = 'Base Price Including VAT (IRR)'
-        DOM_ALL[price_type] = DOM_ALL[old_price_type] * Sales_Percent["End_User_DOM_All"]
-        DOM_ALL.loc[cond, price_type] = DOM_ALL[old_price_type] * Sales_Percent["End_User_DOM_Explosion"]
- 
-    elif (price_type=='Electrical Shops (IRR)'):
-        old_price_type = 'End-User Price Including VAT (IRR)'
-        DOM_ALL[price_type] = DOM_ALL[old_price_type] * Sales_Percent["Electrical_All"]
-        DOM_ALL.loc[cond, price_type] = DOM_ALL[old_price_type] * Sales_Percent["Electrical_Explosion"]
-
-    elif(price_type=='Wholesales Price Including VAT (IRR)'):
-        old_price_type = 'End-User Price Including VAT (IRR)'
-        DOM_ALL[price_type] = DOM_ALL[old_price_type] * Sales_Percent["Wholesales"]
-    
-    
-    # Rounding and adjustments of the price
-    DOM_ALL[price_type] = DOM_ALL[price_type].apply(test_round)
-    DOM_ALL = compare(Compare, DOM_ALL, price_type)
-    
-
-    return DOM_ALL
\ No newline at end of file
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+from compare_rules import CompareGraph
+
+########################################################################################
+# Part number index shared by the pricing stages
+#
+# Every part number of DOM_ALL, DOM_short and the Compare sheet is interned once as an
+# integer code, and the positions linking the lists (short list part in DOM_ALL, super
+# base part in the short list, compare components in each list, ...) are computed when
+# the data is loaded. The lookups of the pricing stages are then integer gathers
+# (take) instead of a set_index(...).map hashing the part numbers on every call.
+########################################################################################
+
+COMPARE_COLUMNS = ['Component Part 1', 'Component Part 2', 'Super Component 1']
+
+
+def _column(frame, name):
+    # Lists without the column (e.g. compare of a single list) link to nothing
+    if name in frame:
+        return frame[name]
+    return pd.Series(np.nan, index=frame.index)
+
+
+def take(values, positions):
+    """
+    values[positions] (rows of values) with NaN where the position is -1
+    (part not found), like Series.map for a missing key.
+    """
+    values = np.asarray(values)
+    found = positions >= 0
+    if found.all():
+        return values[positions]
+    result = values[np.where(found, positions, 0)].astype(float)
+    result[~found] = np.nan
+    return result
+
+
+class PartIndex:
+    """
+    Integer codes and positions of the part numbers of one list.
+    Raises ValueError when a part number is listed twice.
+    """
+    def __init__(self, catalog, part_no, name):
+        self.name = name
+        self.keys = pd.Index(part_no)
+        self.codes = catalog.codes(part_no)
+
+        duplicated = self.keys[self.keys.duplicated()]
+        if len(duplicated):
+            raise ValueError(f"Duplicate part numbers in {name}: {', '.join(map(str, duplicated.unique()[:10]))}")
+
+        self.position_of_code = np.full(len(catalog.parts), -1)
+        self.position_of_code[self.codes] = np.arange(len(self.codes))
+
+    def positions(self, codes):
+        """
+        Position of each code in the list, -1 where the part is not in the list.
+        """
+        return self.position_of_code[codes]
+
+
+class Catalog:
+    """
+    Part numbers of the price lists and the Compare sheet with the stable
+    position arrays used by UpdateBasePrice, compare and the side prices.
+    Built once per data load, matches() tells whether it still fits the frames.
+    """
+    def __init__(self, DOM_ALL, DOM_short, Compare):
+        base_part = _column(DOM_ALL, 'Base Part')
+        super_base_part = _column(DOM_short, 'Super Base Part')
+        columns = [DOM_ALL['Part No.'], base_part, DOM_short['Part No.'], super_base_part] + [Compare[col] for col in COMPARE_COLUMNS]
+        self.parts = pd.Index(pd.unique(pd.concat(columns, ignore_index=True)))
+
+        self.all = PartIndex(self, DOM_ALL['Part No.'], 'Dom-All')
+        self.short = PartIndex(self, DOM_short['Part No.'], 'Dom-Short')
+        self.compare = PartIndex(self, Compare['Component Part 1'], 'Compare (Component Part 1)')
+        self.base_part = pd.Index(base_part)
+        self.super_base_part = pd.Index(super_base_part)
+        self.compare_parts = [pd.Index(Compare[col]) for col in COMPARE_COLUMNS]
+
+        # Links between the lists
+        self.short_in_all = self.all.positions(self.short.codes)
+        self.super_in_short = self.short.positions(self.codes(super_base_part))
+        self.all_in_short = self.short.positions(self.all.codes)
+        self.base_in_short = self.short.positions(self.codes(base_part))
+
+        # Compare rules compiled into levels, and the Compare components in each list
+        component_2 = self.codes(Compare['Component Part 2'])
+        self.compare_2_codes = component_2
+        self.compare_graph = CompareGraph(self.compare.positions(self.codes(Compare['Super Component 1'])),
+                                          self.compare.positions(component_2), self.compare.keys)
+        for index in (self.all, self.short):
+            index.compare_1 = index.positions(self.compare.codes)
+            index.compare_2 = index.positions(component_2)
+            index.compare_graph = self.compare_graph
+
+    def codes(self, part_no):
+        return self.parts.get_indexer(pd.Index(part_no))
+
+    def matches(self, DOM_ALL, DOM_short, Compare):
+        """
+        True when the frames have the part numbers (same order) the catalog was built from.
+        """
+        return (all(parts.equals(pd.Index(Compare[col])) for parts, col in zip(self.compare_parts, COMPARE_COLUMNS))
+                and self.all.keys.equals(pd.Index(DOM_ALL['Part No.']))
+                and self.base_part.equals(pd.Index(_column(DOM_ALL, 'Base Part')))
+                and self.short.keys.equals(pd.Index(DOM_short['Part No.']))
+                and self.super_base_part.equals(pd.Index(_column(DOM_short, 'Super Base Part'))))
+
+
+def catalog_for(DOM_ALL, DOM_short, Compare, catalog=None):
+    """
+    Returns catalog when it fits the frames, otherwise a new catalog.
+    """
+    if catalog is not None and catalog.matches(DOM_ALL, DOM_short, Compare):
+        return catalog
+    return Catalog(DOM_ALL, DOM_short, Compare)
@@ -0,0 +1,80 @@
+import numpy as np
+
+from calculations_v2 import compare
+from profiling import profiled
+from rounding import ROUNDING_POLICIES
+
+########################################################################################
+# Sales channels
+#
+# Every side price is a channel: the price of its parent channel (or the base price)
+# times a Sales_Percent rate, with another rate for some models (explosion proof), then
+# rounded with a policy of rounding.py. The channels are priced level by level (a
+# channel after its parent) for all the channels of a level at once, and the compare
+# adjustments of a level are resolved in one pass for all its columns.
+########################################################################################
+
+class Channel:
+    """
+    A price column computed from the parent column.
+        rate: key of Sales_Percent
+        model_rates: Model -> key of Sales_Percent used instead of rate for that model
+        rounding: name of the rounding policy
+    """
+    def __init__(self, column, parent, rate, model_rates=None, rounding="Side Prices"):
+        self.column = column
+        self.parent = parent
+        self.rate = rate
+        self.model_rates = model_rates or {}
+        self.rounding = rounding
+
+
+BASE_PRICE = 'Base Price Including VAT (IRR)'
+END_USER = 'End-User Price Including VAT (IRR)'
+
+CHANNELS = [
+    Channel(END_USER, BASE_PRICE, "End_User_DOM_All", {'ضد انفجار': "End_User_DOM_Explosion"}),
+    Channel('Electrical Shops (IRR)', END_USER, "Electrical_All", {'ضد انفجار': "Electrical_Explosion"}),
+    Channel('Wholesales Price Including VAT (IRR)', END_USER, "Wholesales"),
+    # Export markets
+    Channel('End-User Turkey Price (IRR)', BASE_PRICE, "End_User_Turkey"),
+    Channel('End-User Iraq Armenia Afghanistan Price (IRR)', BASE_PRICE, "End_User_Iraq_Armenia_Afghan"),
+]
+
+
+def channel_levels(channels):
+    """
+    Channels grouped by level: the first level only needs the base price,
+    a channel is in the level after the one of its parent.
+    """
+    levels = []
+    pending = list(channels)
+    while pending:
+        columns = {channel.column for channel in pending}
+        level = [channel for channel in pending if channel.parent not in columns]
+        if not level:
+            raise ValueError("The channels have a cycle of parent channels: " + ", ".join(columns))
+        levels.append(level)
+        pending = [channel for channel in pending if channel not in level]
+    return levels
+
+
+@profiled
+def side_prices(DOM, Sales_Percent, Compare, index=None, channels=CHANNELS, rules=None):
+    """
+    Side prices of every channel for DOM_ALL or DOM_short (modified in place).
+    index is the catalog.PartIndex of the list used by compare, rules its
+    overrides.CompiledRules.
+    """
+    model = DOM['Model'].to_numpy()
+    for level in channel_levels(channels):
+        columns = [channel.column for channel in level]
+        prices = np.empty((len(DOM), len(level)))
+        for i, channel in enumerate(level):
+            rate = np.full(len(DOM), Sales_Percent[channel.rate], dtype=float)
+            for name, key in channel.model_rates.items():
+                rate[model == name] = Sales_Percent[key]
+            prices[:, i] = ROUNDING_POLICIES[channel.rounding](DOM[channel.parent].to_numpy(dtype=float) * rate)
+        DOM[columns] = prices
+        compare(Compare, DOM, columns, index, rules)
+    return DOM
@@ -0,0 +1,144 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import warnings
+
+import batch
+import calculations_v2 as calc
+import runs
+import scenarios
+from engine import PricingEngine, merge_params
+from memory import memory_report
+from profiling import Profiler
+from schema import SchemaError
+
+########################################################################################
+# Command line pricing of a workbook without the dashboard
+#   python cli.py Pricing.xlsx --params params.json --method "New Gross" --out results
+# The params file is a json object with the names of engine.DEFAULT_PARAMS, missing
+# parameters keep their default values.
+# With --scenarios grid.json the workbook is priced for every combination of the grid
+# ({"nima": [650000, 700000], "OverHead_Rates.MOH": [1.0, 1.2]}) and the per scenario
+# summary and Finished Cost / prices are written instead.
+# A folder in place of the workbook prices all its workbooks in a process pool
+# (batch.py, --processes workers) and writes their lists with a Summary.csv.
+# --profile prints the time, rows, peak memory and DataFrame copies of every pricing
+# function and logs them as json lines on stderr, --profile-dump writes a cProfile
+# stats file (or a pyinstrument html report for a .html path).
+# --compact loads the workbook with the memory lean dtypes of memory.py and --memory
+# prints the memory of the loaded and priced frames.
+# --save-run NAME keeps the priced lists and the parameters in the run store (runs.py)
+# to compare them with later runs.
+########################################################################################
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Price a cost workbook end to end and write the price lists.")
+    parser.add_argument("workbook", help="Input Excel file with the sheets expected by input_df, or a folder of them")
+    parser.add_argument("--params", help="Json file with the pricing parameters")
+    parser.add_argument("--method", choices=["Original Price", "New Gross", "Price Diff", "Target Margin"], help="Pricing method")
+    parser.add_argument("--out", default="results", help="Output folder (default: results)")
+    parser.add_argument("--format", default="xlsx", choices=["xlsx", "csv", "parquet"], help="Output format (default: xlsx)")
+    parser.add_argument("--scenarios", help="Json file with a grid of parameter values to sweep")
+    parser.add_argument("--processes", type=int, help="Processes used for large sweeps and folders (default: all cores)")
+    parser.add_argument("--profile", action="store_true", help="Profile the pricing functions")
+    parser.add_argument("--profile-dump", help="Write a cProfile (.prof) or pyinstrument (.html) profile to this path")
+    parser.add_argument("--compact", action="store_true", help="Load the workbook with memory lean dtypes")
+    parser.add_argument("--memory", action="store_true", help="Print the memory of the frames")
+    parser.add_argument("--save-run", metavar="NAME", help="Save the priced lists as a run of the run store under this name")
+    args = parser.parse_args(argv)
+
+    params = {}
+    if args.params:
+        with open(args.params, encoding="utf-8") as f:
+            params = json.load(f)
+    if args.method:
+        params["method"] = args.method
+
+    if args.scenarios:
+        return sweep(args, params)
+    if os.path.isdir(args.workbook):
+        return price_folder(args, params)
+
+    profiler = None
+    if args.profile or args.profile_dump:
+        if args.profile:
+            logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+        tool = "pyinstrument" if args.profile_dump and args.profile_dump.endswith(".html") else "cprofile"
+        profiler = Profiler(memory=args.profile, dump=args.profile_dump, tool=tool)
+
+    try:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", UserWarning)
+            if profiler:
+                with profiler:
+                    results = PricingEngine(params, args.compact).run(args.workbook)
+            else:
+                results = PricingEngine(params, args.compact).run(args.workbook)
+    except SchemaError as e:
+        print("The workbook does not match the expected layout:", file=sys.stderr)
+        print(e.report().to_string(index=False), file=sys.stderr)
+        return 1
+    for warning in caught:
+        print(warning.message, file=sys.stderr)
+
+    paths = results.write(args.out, args.format)
+
+    # Stage timings
+    for stage, seconds in results.timings.items():
+        print(f"{stage:<10} {seconds:8.3f} s")
+    print(f"{'Total':<10} {sum(results.timings.values()):8.3f} s")
+    if args.profile:
+        print(profiler.summary().to_string(index=False))
+    if args.memory:
+        print(memory_report(results.frames).to_string(index=False, float_format="{:.1f}".format))
+    if args.profile_dump:
+        print(f"Profile written to {args.profile_dump}")
+    for path in paths:
+        print(f"Written {path}")
+    if args.save_run:
+        run_id = runs.save_run(results, merge_params(params), calc.workbook_hash(args.workbook), args.save_run)
+        print(f"Saved run {run_id}")
+    return 0
+
+
+def sweep(args, params):
+    """
+    Prices the workbook for every scenario of the grid file.
+    """
+    with open(args.scenarios, encoding="utf-8") as f:
+        grid = json.load(f)
+
+    start = time.perf_counter()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        key, frames = PricingEngine(params, args.compact).load(args.workbook)
+    results = scenarios.run_scenarios(frames, scenarios.scenario_grid(**grid), params, processes=args.processes)
+
+    os.makedirs(args.out, exist_ok=True)
+    results.summary().to_csv(os.path.join(args.out, "Scenarios.csv"), index_label="Scenario")
+    results.finished_cost.to_csv(os.path.join(args.out, "Finished Cost.csv"))
+    for name, frame in results.prices.items():
+        frame.to_csv(os.path.join(args.out, f"{name}.csv"))
+    print(f"{len(results.scenarios)} scenarios priced in {time.perf_counter() - start:.3f} s, written to {args.out}")
+    return 0
+
+
+def price_folder(args, params):
+    """
+    Prices every workbook of the folder, returns 1 when one of them failed.
+    """
+    start = time.perf_counter()
+    progress = lambda row, done, total: print(f"[{done}/{total}] {row['Workbook']}: {row['Status']} ({row['Seconds']:.1f} s)")
+    summary = batch.price_folder(args.workbook, params, args.out, args.format, args.processes, args.compact, progress)
+    if "Traceback" in summary:
+        for trace in summary["Traceback"].dropna():
+            print(trace, file=sys.stderr)
+    print(f"{len(summary)} workbooks priced in {time.perf_counter() - start:.3f} s, written to {args.out}")
+    return int((summary["Status"] != "ok").any())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
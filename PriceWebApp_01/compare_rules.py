@@ -0,0 +1,82 @@
+import numpy as np
+
+########################################################################################
+# Compare sheet as a dependency graph
+#
+# A Compare row keeps the price gap between Component Part 1 and Component Part 2 equal
+# to the gap of its Super Component 1 row:
+#   P[Component Part 1] = P[Component Part 2] + (P[Super Component 1] - P[its Component Part 2])
+# so a row depends on the rows adjusting its Component Part 2, its super component and
+# the Component Part 2 of the super row. The rows are sorted once into levels (roots:
+# no super component or the row is its own super), every level is then resolved for all
+# its rows and all the price columns with one vectorized pass, in topological order.
+########################################################################################
+
+class CompareGraph:
+    """
+    Levels of the Compare rows, compiled once per Compare sheet.
+        super_row: row of the Super Component 1 of each row, -1 when not in the sheet
+        component_2_row: row adjusting the Component Part 2 of each row, -1 when none
+        levels: arrays of row numbers, levels[0] are the roots (never adjusted)
+    Raises ValueError when the super components form a cycle.
+    """
+    def __init__(self, super_row, component_2_row, parts):
+        self.super_row = super_row
+        self.component_2_row = component_2_row
+        self.levels, cycle = compare_levels(super_row, component_2_row)
+        if len(cycle):
+            raise ValueError("The Compare sheet has a cycle of super components, Component Part 1: "
+                             + ", ".join(map(str, parts[cycle][:10])))
+
+    @property
+    def depth(self):
+        return len(self.levels) - 1
+
+
+def compare_levels(super_row, component_2_row):
+    """
+    Levels of the Compare rows (see CompareGraph) and the rows left out of them,
+    which wait on a cycle of super components.
+    """
+    rows = np.arange(len(super_row))
+    super_2_row = np.where(super_row >= 0, component_2_row[super_row], -1)
+    deps = np.vstack([component_2_row, super_row, super_2_row])
+    deps = np.where(deps == rows, -1, deps)     # a row never waits for itself
+    has_dep = deps >= 0
+    deps = np.where(has_dep, deps, 0)
+
+    resolved = (super_row < 0) | (super_row == rows)
+    levels = [rows[resolved]]
+    while not resolved.all():
+        ready = ~resolved & (resolved[deps] | ~has_dep).all(axis=0)
+        if not ready.any():
+            break
+        levels.append(rows[ready])
+        resolved |= ready
+    return levels, rows[~resolved]
+
+
+def resolve(graph, prices, component_1, component_2):
+    """
+    Applies the Compare adjustments to prices (list rows x price columns, modified in
+    place) level by level. component_1 and component_2 are the positions of the
+    Compare components in the list (-1 when not in the list).
+    Returns the diff, super diff and adjustment of each Compare row (rows x columns)
+    in the layout of the Compare columns.
+    """
+    # Position -1 reads the extra NaN row, like Series.map for a missing part
+    padded = np.vstack([prices, np.full((1, prices.shape[1]), np.nan)])
+    diff = padded[component_1] - padded[component_2]
+    super_diff = np.where(graph.super_row[:, None] >= 0, diff[graph.super_row], np.nan)
+    adjustment = super_diff - diff
+
+    for rows in graph.levels[1:]:
+        targets = component_1[rows]
+        supers = graph.super_row[rows]
+        diff[rows] = padded[targets] - padded[component_2[rows]]
+        super_diff[rows] = padded[component_1[supers]] - padded[component_2[supers]]
+        adjustment[rows] = super_diff[rows] - diff[rows]
+        padded[targets] += np.nan_to_num(adjustment[rows], nan=0, posinf=np.inf, neginf=-np.inf)
+
+    prices[:] = padded[:-1]
+    return diff, super_diff, adjustment
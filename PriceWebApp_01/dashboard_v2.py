@@ -1,8 +1,25 @@
+import os
+import tempfile
+import time
+import uuid
+
 import streamlit as st
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, ColumnsAutoSizeMode
 
-import pandas as pd
 import calculations_v2 as calc
+import edits
+import engine as eng
+import export
+import grid_window
+import memory
+import profiling
+import routing
+import runs
+import schema
+import sessions
+import store
+import targets
+import worker
 
 try:
     st.set_page_config(layout="wide")
@@ -11,6 +28,10 @@ except:
 
 # st.header("Pricing Session")
 
+# A resumed session (sessions.py) gives the sidebar its saved parameters
+resumed = st.session_state.get('resumed')
+defaults = eng.merge_params(resumed.params if resumed is not None else None)
+
 # Sidebar Tabs for Input Parameters
 st.sidebar.title("Input Parameters")
 tabs = st.sidebar.tabs(["General", "Currency", "Overheads", "Sales Rates", "Others"])
@@ -18,106 +39,282 @@ tabs = st.sidebar.tabs(["General", "Currency", "Overheads", "Sales Rates", "Othe
 with tabs[0]:
     uploaded_file = st.file_uploader("Upload Input File (Excel)", type=["xlsx"])
     ## Choose Update Method 
-    options = ["Original Price", "New Gross", "Price Diff"]
-    selected_option = st.selectbox("Choose the Pricing Method:", options)
+    options = ["Original Price", "New Gross", "Price Diff", "Target Margin"]
+    selected_option = st.selectbox("Choose the Pricing Method:", options, index=options.index(defaults["method"]))
+    # Target New_Gross per price list type, product family or model, the other rows keep their New_Gross
+    Target_Gross = {}
+    if selected_option == "Target Margin":
+        target_rows = st.data_editor(targets.target_table(defaults["Target_Gross"]), num_rows="dynamic", hide_index=True, key="target_table",
+                                     column_config={"Level": st.column_config.SelectboxColumn(options=targets.TARGET_LEVELS, required=True)})
+        Target_Gross = targets.targets_from_table(target_rows)
     up_butt = st.sidebar.button("Update Table") # Update table
     show_extras = st.sidebar.checkbox("Extras", value=False)    # Sidebar toggle buttons to show/hide columns
     show_freez = st.sidebar.checkbox("Freez Part No & Desc", value=False)
 
 with tabs[1]:
-    nima = st.number_input("Dollar NIMA (IRR):", value=680000)
-    custom = st.number_input("Dollar Custom (IRR):", value=300000)
+    nima = st.number_input("Dollar NIMA (IRR):", value=defaults["nima"])
+    custom = st.number_input("Dollar Custom (IRR):", value=defaults["custom"])
     euro_to_currency = {
-        "USD": st.number_input("Euro to USD", value=1.10, step=0.01, format="%.2f"),
-        "AED": st.number_input("Euro to AED", value=4.054, step=0.001, format="%.3f"),
+        "USD": st.number_input("Euro to USD", value=defaults["euro_to_currency"]["USD"], step=0.01, format="%.2f"),
+        "AED": st.number_input("Euro to AED", value=defaults["euro_to_currency"]["AED"], step=0.001, format="%.3f"),
         "EUR": 1.0,
     }
-    ExpDuties = st.number_input("Custom Export Duties Percentage (%)", value=2.5)
+    ExpDuties = st.number_input("Custom Export Duties Percentage (%)", value=defaults["ExpDuties"])
+    # Index of the aluminium base fees (e.g. the weekly aluminium price / the workbook price)
+    Al_index = {"*": st.number_input("Aluminium Base Fee Index", value=float(defaults["Al_index"].get("*", 1.0)), step=0.01, format="%.3f")}
 
 with tabs[2]:
-    OLDlaborRate = st.number_input("Labor Rate (IRR):", value=2300000)
+    OLDlaborRate = st.number_input("Labor Rate (IRR):", value=defaults["OLDlaborRate"])
+    # Cost Center: the man hours are costed at the Est Labor Cost of their cost centers
+    LaborCosting = st.selectbox("Labor costing", routing.LABOR_COSTING, index=routing.LABOR_COSTING.index(defaults["LaborCosting"]))
     OverHead_Rates = {
-        "MOH": st.number_input("MOH (%)", value=1.2),
-        "LAB": st.number_input("LAB (IRR)", value=282000),
-        "LABSU1": st.number_input("LABSU1 (%)", value=27.8),
-        "LABSU2": st.number_input("LABSU2 (%)", value=22.9),
+        "MOH": st.number_input("MOH (%)", value=defaults["OverHead_Rates"]["MOH"]),
+        "LAB": st.number_input("LAB (IRR)", value=defaults["OverHead_Rates"]["LAB"]),
+        "LABSU1": st.number_input("LABSU1 (%)", value=defaults["OverHead_Rates"]["LABSU1"]),
+        "LABSU2": st.number_input("LABSU2 (%)", value=defaults["OverHead_Rates"]["LABSU2"]),
     }
 
 with tabs[3]:
-    vat = st.number_input("Value Added Tax (%)", value=10)
-    RepCom = st.number_input("Representative Commission (%)", value=5)
+    vat = st.number_input("Value Added Tax (%)", value=defaults["vat"])
+    RepCom = st.number_input("Representative Commission (%)", value=defaults["RepCom"])
+    rates = defaults["Sales_Percent"]
     Sales_Percent = {
-        "End_User_DOM_All": st.number_input("End-User DOM All Luminaires (%)", value=1.22, format="%.3f"),
-        "End_User_DOM_Explosion": st.number_input("End-User DOM Explosion Proof (%)", value=1.175, format="%.3f"),
-        "End_User_Turkey": st.number_input("End-User Turkey (%)", value=3.85, format="%.3f"),
-        "End_User_Iraq_Armenia_Afghan": st.number_input("End-User Iraq Armenia Afghanistan (%)", value=1.4, format="%.2f"),
-        "Electrical_All": st.number_input("Electrical All Luminaires (%)", value=0.895, format="%.3f"),
-        "Electrical_Explosion": st.number_input("Electrical Explosion Proof (%)", value=0.925, format="%.3f"),
-        "Wholesales": st.number_input("Wholesales (%)", value=0.94, format="%.3f"),
+        "End_User_DOM_All": st.number_input("End-User DOM All Luminaires (%)", value=rates["End_User_DOM_All"], format="%.3f"),
+        "End_User_DOM_Explosion": st.number_input("End-User DOM Explosion Proof (%)", value=rates["End_User_DOM_Explosion"], format="%.3f"),
+        "End_User_Turkey": st.number_input("End-User Turkey (%)", value=rates["End_User_Turkey"], format="%.3f"),
+        "End_User_Iraq_Armenia_Afghan": st.number_input("End-User Iraq Armenia Afghanistan (%)", value=rates["End_User_Iraq_Armenia_Afghan"], format="%.2f"),
+        "Electrical_All": st.number_input("Electrical All Luminaires (%)", value=rates["Electrical_All"], format="%.3f"),
+        "Electrical_Explosion": st.number_input("Electrical Explosion Proof (%)", value=rates["Electrical_Explosion"], format="%.3f"),
+        "Wholesales": st.number_input("Wholesales (%)", value=rates["Wholesales"], format="%.3f"),
     }
 
 with tabs[4]:
-    DomesticRM = st.number_input("Domestic Raw Material Increase (%)", value=0)
-    CommonPartPriceCriteria = st.number_input("Price Criteria for Rounding Common Parts (IRR):", value=900000)
-    CommonPartCoeff = st.number_input("Coefficient for Common Parts Price:", value=0.55, format="%.2f")
+    DomesticRM = st.number_input("Domestic Raw Material Increase (%)", value=defaults["DomesticRM"])
+    CommonPartPriceCriteria = st.number_input("Price Criteria for Rounding Common Parts (IRR):", value=defaults["CommonPartPriceCriteria"])
+    CommonPartCoeff = st.number_input("Coefficient for Common Parts Price:", value=defaults["CommonPartCoeff"], format="%.2f")
+    compact = st.checkbox("Compact memory mode (text columns as Arrow strings and categories)", value=resumed.compact if resumed is not None else True)
+
+# Profiling panel, filled once the pricing ran
+profile_panel = st.sidebar.expander("Profiling", expanded=False)
+with profile_panel:
+    profile_on = st.checkbox("Profile pricing runs (time, rows, memory, copies)", value=False)
+    profile_dump = st.checkbox("Keep a cProfile dump of the run", value=False)
+
+runs_panel = st.sidebar.expander("Runs", expanded=False)
+export_panel = st.sidebar.expander("Export", expanded=False)
+centers_panel = st.sidebar.expander("Cost centers", expanded=False)
+
+# Saved sessions: every session is checkpointed after each run and can be resumed,
+# after a restart too, without uploading its workbook again (while it is cached).
+# Only the sessions of the owner token of the page are listed, the token is kept in
+# the URL so the link of the page finds its sessions again
+if "owner" not in st.query_params:
+    st.query_params["owner"] = uuid.uuid4().hex
+owner = st.query_params["owner"]
+with st.sidebar.expander("Session", expanded=False):
+    saved_sessions = sessions.list_sessions(owner=owner)
+    if saved_sessions:
+        labels = {session["id"]: f"{session['saved']} (workbook {session['workbook'][:8]})" for session in saved_sessions}
+        resume_id = st.selectbox("Saved sessions", list(labels), format_func=labels.get)
+        if st.button("Resume session"):
+            st.session_state.resumed = sessions.load_session(resume_id)
+            st.session_state.workbook = None    # the workbook state is reset with the snapshot
+            st.rerun()
+    else:
+        st.caption("No saved session yet")
 
 # Getting the data as cache
-@st.cache_data
-def getdata(uploaded_file):
-    # Input DataFrame
-    Cost, Al_profile, Imp_RM, MH, BOM, Shemsh, DOM_short, DOM_ALL, Compare = calc.input_df(uploaded_file)
-    return Cost, Al_profile, Imp_RM, MH, BOM, Shemsh, DOM_short, DOM_ALL, Compare
-
-# Calculation of Finish Cost
-def FinishCostUp(Al_profile, Imp_RM, BOM, MH, Shemsh, Cost, DOM_ALL, euro_to_currency, nima, custom, ExpDuties, DomesticRM, OverHead_Rates, OLDlaborRate):
-
-    Al_profile, Imp_RM = calc.process_AlprofIMPRM(Al_profile, Imp_RM, euro_to_currency, nima, custom, ExpDuties)
-    BOM, MH = calc.process_bom(Al_profile, Imp_RM, Shemsh, Cost, BOM, MH, DomesticRM) # BOM MH Update
-    DOM_ALL = calc.process_DOM_ALL(BOM, MH, DOM_ALL, OverHead_Rates, OLDlaborRate) # Collecting all and Finish Cost calculation
-
-    return DOM_ALL
-
-# Update prices
-def UpdatePricing(DOM_ALL, DOM_short, Compare, RepCom, vat, CommonPartPriceCriteria, CommonPartCoeff, Sales_Percent):
-
-    # Call to Update DOM_short and DOM_ALL with Mani algorithm
-    DOM_short, DOM_ALL = calc.UpdateBasePrice(DOM_ALL, DOM_short, selected_option, Compare, RepCom, vat, CommonPartPriceCriteria, CommonPartCoeff)
-
-    # Call to Calculate Other Users Prices in Dom-all
-    DOM_ALL = calc.Calc_Side_Prices(DOM_ALL, Sales_Percent, Compare, price_type='End-User Price Including VAT (IRR)')
-    DOM_ALL = calc.Calc_Side_Prices(DOM_ALL, Sales_Percent, Compare, price_type='Electrical Shops (IRR)')
-    DOM_ALL = calc.Calc_Side_Prices(DOM_ALL, Sales_Percent, Compare, price_type='Wholesales Price Including VAT (IRR)')
-
-    # DOM_Short Update
-    DOM_short = calc.Calc_Side_Prices(DOM_short, Sales_Percent, Compare, price_type='End-User Price Including VAT (IRR)')
-    DOM_short = calc.Calc_Side_Prices(DOM_short, Sales_Percent, Compare, price_type='Electrical Shops (IRR)')
-    DOM_short = calc.Calc_Side_Prices(DOM_short, Sales_Percent, Compare, price_type='Wholesales Price Including VAT (IRR)')
-
-    return DOM_ALL, DOM_short
-
-if uploaded_file:
+# The workbook is loaded once per process and shared read only by every session,
+# with the stage results which do not depend on the edits of a session (store.py)
+@st.cache_resource(max_entries=4)
+def getdata(workbook_key, compact, _uploaded_file):
+    return store.load_workbook(_uploaded_file, workbook_key, compact)
+
+# Saved runs do not change, their diff is read once per pair of runs
+@st.cache_data(max_entries=16)
+def run_diff(old_id, new_id):
+    return runs.diff_runs(old_id, new_id, only_changed=True)
+
+# Progress of a background pricing run while the page shows the previous prices,
+# the page is rerun with the new prices once the run finished
+@st.fragment(run_every=0.5)
+def worker_progress(job):
+    if job.done.is_set():
+        st.rerun(scope="app")
+    st.progress(job.fraction, text=f"Computing the new prices ({job.stage}), the tables show the previous prices")
+
+# Progress of the export file written in the background, the page is rerun with the
+# download button once it is written
+@st.fragment(run_every=0.5)
+def export_progress(job):
+    if job.done.is_set():
+        st.rerun(scope="app")
+    st.progress(job.fraction, text=f"Writing the {job.fmt} export...")
+
+# Search, sort and page controls of a grid, only the rows of the page are sent to it.
+# changed is the mask of the rows changed by the last recompute, if the grid can show only those
+def grid_page(frame, key, changed=None):
+    col1, col2, col3, col4, col5 = st.columns([3, 2, 1, 1, 1])
+    search = col1.text_input("Search (Part No., Description, Family, Model, Type)", key=f"{key}_search")
+    sort_by = col2.selectbox("Sort by", ["-"] + list(frame.columns), key=f"{key}_sort")
+    ascending = col3.checkbox("Ascending", value=True, key=f"{key}_ascending")
+    only_changed = changed is not None and col4.checkbox("Changed rows only", value=False, key=f"{key}_changed")
+    page_size = col5.selectbox("Rows per page", [50, 100, 500, 1000], index=1, key=f"{key}_page_size")
+
+    mask = grid_window.filter_rows(frame, search, only=changed if only_changed else None)
+    positions = grid_window.sort_rows(frame, mask, None if sort_by == "-" else sort_by, ascending)
+    pages = grid_window.page_count(len(positions), page_size)
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+    st.caption(f"{len(positions)} of {len(frame)} rows")
+    return grid_window.window(frame, positions, page - 1, page_size)
+
+# A resumed session prices its workbook until another workbook is uploaded
+uploaded_key = calc.workbook_hash(uploaded_file) if uploaded_file else None
+if resumed is not None and uploaded_key not in (None, resumed.workbook):
+    resumed = None
+
+if uploaded_file or resumed is not None:
     # Input data
-    
-    Cost, Al_profile, Imp_RM, MH, BOM, Shemsh, DOM_short, DOM_ALL, Compare = getdata(uploaded_file) # Cache
+    try:
+        workbook_key = uploaded_key or resumed.workbook
+        workbook = getdata(workbook_key, compact, uploaded_file) # Cache
+    except schema.SchemaError as e:
+        # Every problem of the workbook layout with its sheet, column and rows
+        st.error("The workbook does not match the expected layout:")
+        st.dataframe(e.report(), hide_index=True)
+        st.stop()
+    except Exception as e:
+        st.error(f"An error occurred: {e}")
+        st.stop()
+    # Warnings of the loader (e.g. missing sheets)
+    for message in workbook.warnings:
+        st.warning(message)
+    frames = workbook.frames
 
     # Using session state to update price and save changes
-    if 'data' not in st.session_state:
-        st.session_state.data = DOM_short
-
-    if 'All' not in st.session_state:
-        st.session_state.All = DOM_ALL
-
-    st.session_state.All = FinishCostUp(Al_profile, Imp_RM, BOM, MH, Shemsh, Cost, st.session_state.All, euro_to_currency, nima, custom, ExpDuties, DomesticRM, OverHead_Rates, OLDlaborRate)
+    # A new workbook (or dtype mode) resets the edits and the memoized engine results
+    if st.session_state.get('workbook') != (workbook_key, compact):
+        st.session_state.workbook = (workbook_key, compact)
+        st.session_state.data = frames["DOM_short"]
+        st.session_state.data_version = 0
+        if resumed is not None and resumed.data is not None and st.session_state.get('restored') != resumed.session_id:
+            # The edits and the last prices of the resumed session, its snapshot continues
+            st.session_state.restored = resumed.session_id
+            st.session_state.data = resumed.data
+            st.session_state.data_version = resumed.data_version
+            st.session_state.All = resumed.DOM_ALL
+            st.session_state.checkpoint = sessions.Checkpoint(workbook_key, compact, resumed.session_id, owner)
+        else:
+            st.session_state.checkpoint = sessions.Checkpoint(workbook_key, compact, owner=owner)
+        st.session_state.worker = worker.PricingWorker(eng.PricingEngine(shared=workbook.stages))
+
+    # The pricing runs in the background worker of the session, only the stages depending
+    # on a changed input or parameter are recomputed and a newer change cancels the run
+    runner = st.session_state.worker
+    params = eng.merge_params({
+        "euro_to_currency": euro_to_currency, "nima": nima, "custom": custom, "ExpDuties": ExpDuties, "Al_index": Al_index,
+        "DomesticRM": DomesticRM, "OverHead_Rates": OverHead_Rates, "OLDlaborRate": OLDlaborRate,
+        "LaborCosting": LaborCosting,
+        "method": selected_option, "RepCom": RepCom, "vat": vat, "CommonPartPriceCriteria": CommonPartPriceCriteria,
+        "CommonPartCoeff": CommonPartCoeff, "Sales_Percent": Sales_Percent, "Target_Gross": Target_Gross,
+    })
+    # The dump of every session has its own file
+    if 'profile_key' not in st.session_state:
+        st.session_state.profile_key = uuid.uuid4().hex[:12]
+    dump_path = os.path.join(tempfile.gettempdir(), f"pricing-{workbook_key[:12]}-{st.session_state.profile_key}.prof") if profile_dump else None
+    make_profiler = (lambda: profiling.Profiler(memory=True, dump=dump_path)) if profile_on or profile_dump else None
+    job = runner.submit(params, frames, workbook_key, st.session_state.data, st.session_state.data_version, profiler=make_profiler)
+
+    # Short runs are waited for, longer ones show the previous prices meanwhile
+    wait = None if runner.latest is None else worker.PAGE_WAIT
+    if not job.done.is_set():
+        bar = st.progress(job.fraction, text="Pricing...")
+        start = time.monotonic()
+        while not job.done.wait(0.1) and (wait is None or time.monotonic() - start < wait):
+            bar.progress(job.fraction, text=f"Pricing: {job.stage}")
+        bar.empty()
+    if job.error is not None:
+        # e.g. duplicate part numbers or a cycle in the Compare sheet
+        st.error(f"An error occurred: {job.error}")
+        st.stop()
+    if runner.latest is None:
+        st.stop()   # superseded by a newer run of the page
+    finished = runner.latest
+    results = finished.results
+    # The prices shown are those of a previous run while the latest one is computed
+    pending = finished is not job
+    if pending:
+        worker_progress(job)
+    else:
+        # Checkpoint of the session, only the frames changed since the last one are written
+        st.session_state.checkpoint.save(params, st.session_state.data, st.session_state.data_version, results.DOM_ALL)
+
+    with profile_panel:
+        st.caption("Stage seconds (memoized stages take no time): " + ", ".join(f"{name} {seconds:.3f}" for name, seconds in results.timings.items()))
+        st.caption(f"Shared stage results: {len(workbook.stages)} ({workbook.stages.hits} hits, {workbook.stages.misses} misses)")
+        if finished.profiled:
+            st.dataframe(finished.profiler.summary(), hide_index=True)
+            st.caption("Memory of the session frames (MB)")
+            st.dataframe(memory.memory_report(results.frames), hide_index=True)
+        if dump_path and finished.profiled and os.path.exists(dump_path):
+            with open(dump_path, "rb") as f:
+                st.download_button("Download cProfile dump", f.read(), file_name=os.path.basename(dump_path))
+    # Saved pricing runs: the current prices can be saved and any two runs compared
+    with runs_panel:
+        run_name = st.text_input("Run name", placeholder="e.g. October prices")
+        if st.button("Save current run"):
+            run_id = runs.save_run(results, finished.params, workbook_key, run_name or None)
+            st.success(f"Saved run {run_id}")
+        saved = runs.list_runs()
+        if len(saved) >= 2:
+            labels = dict(zip(saved["id"], saved["name"] + " (" + saved["created"] + ")"))
+            old_id = st.selectbox("Old run", saved["id"], index=len(saved) - 2, format_func=labels.get)
+            new_id = st.selectbox("New run", saved["id"], index=len(saved) - 1, format_func=labels.get)
+            diff = run_diff(old_id, new_id)
+            st.caption(", ".join(f"{status} {count}" for status, count in diff["Status"].value_counts().items()) or "No change")
+            st.dataframe(diff, hide_index=True)
+            st.download_button("Download the diff", diff.to_csv(index=False), file_name=f"diff {old_id} {new_id}.csv")
+    # Export of the current prices: Dom-Short, Dom-All and the channel price lists
+    with export_panel:
+        export_format = st.selectbox("Export format", export.FORMATS)
+        if st.button("Build export"):
+            if st.session_state.get('export') is not None:
+                st.session_state.export.remove()
+            st.session_state.export = export.ExportJob(export.export_sheets(results.frames, finished.params["OLDlaborRate"]), export_format)
+        export_job = st.session_state.get('export')
+        if export_job is not None and not export_job.done.is_set():
+            export_progress(export_job)
+        elif export_job is not None and export_job.error is not None:
+            st.error(f"The export failed: {export_job.error}")
+        elif export_job is not None:
+            with open(export_job.path, "rb") as f:
+                st.download_button("Download the export", f, file_name=export_job.file_name)
+    # Labor cost per cost center at the labor rate (-OLD) and at the center rates (-NEW)
+    with centers_panel:
+        st.dataframe(results.frames["Routing"].center_costs(finished.params["OLDlaborRate"]))
+    if selected_option == "Target Margin" and "Target Gross" in results.DOM_ALL:
+        missed = targets.missed_targets(results.DOM_ALL)
+        if missed.any():
+            st.warning(f"{missed.sum()} parts of DOM_All are below their target margin after the Compare and Common Parts rules")
+    # Rows changed by a recompute, the DOM_All grid can show only those
+    if results.DOM_ALL is not st.session_state.get('All'):
+        st.session_state.changed_all = grid_window.changed_rows(st.session_state.get('All'), results.DOM_ALL)
+    st.session_state.All = results.DOM_ALL
+    DOM_short_priced = results.DOM_short
+    if pending:
+        # The edited cells not priced yet are shown over the previous prices
+        DOM_short_priced = edits.apply_edits(DOM_short_priced, edits.grid_edits(DOM_short_priced, st.session_state.data))
 
     # Display DataFrames
     # Using AgGrid for better tables
     tabs = st.tabs(["DOM_Short","DOM_All", "test"])
 
     # Configure AG Grid
-    gb = GridOptionsBuilder.from_dataframe(st.session_state.data)
+    gb = GridOptionsBuilder.from_dataframe(DOM_short_priced)
     gb2 = GridOptionsBuilder.from_dataframe(st.session_state.All)
 
-    gb.configure_default_column(filter=True)
+    # Filtering and sorting of both grids run server side over all the rows
+    gb.configure_default_column(filter=False, sortable=False)
     gb.configure_column("Original Price (IRR)", editable=True)
     gb.configure_column("New_Gross", editable=True)
     
@@ -139,7 +336,7 @@ if uploaded_file:
                 # valueFormatter="x",
                 valueFormatter="Math.abs(x).toFixed(2)",
             )
-        if selected_option == "New Gross":
+        if selected_option in ("New Gross", "Target Margin"):
             if col == "New_Gross":
                 gb.configure_column(
                     col,
@@ -219,7 +416,7 @@ if uploaded_file:
         )
 
     # Configure SideBar to hide or show extras
-    extraCols = ["كد كاتالوگ نهايي", "نوع عرضه", "تاريخ اجرا", "توضيحات", "Base Part", "Depr.", "Machin", "Man_Hour", "Labor Cost", "Super Base Part", \
+    extraCols = ["كد كاتالوگ نهايي", "نوع عرضه", "تاريخ اجرا", "توضيحات", "Base Part", "Depr.", "Machin", "Man_Hour", "Labor Cost", "Labor Cost Diff", "Super Base Part", \
                   "Coefficient", "Material Cost", "Raw Material Cost", "MOH", "LAB", "Overhead Cost"]
     
     for col in extraCols:
@@ -241,7 +438,7 @@ if uploaded_file:
     grid_options = gb.build()
 
     # Fixing the problem of showing invalid number in some cases
-    gb2.configure_default_column(autoWidth=True, filter=True)
+    gb2.configure_default_column(autoWidth=True, filter=False, sortable=False)
     gb2.configure_column("Part No.", valueFormatter="value ? value.toString() : ''")
     gb2.configure_column("Base Part", valueFormatter="value ? value.toString() : ''")
     gb2.configure_grid_options(enableRangeSelection=True)
@@ -252,8 +449,10 @@ if uploaded_file:
 
 
     with tabs[0]:
+        # Only the rows of the current page are sent to the grid, the edits of the
+        # page are matched back to DOM_short by Part No.
         grid_return = AgGrid(
-            st.session_state.data,
+            grid_page(DOM_short_priced, "short"),
             height=800,
             gridOptions=grid_options,
             update_mode=GridUpdateMode.VALUE_CHANGED,
@@ -264,21 +463,27 @@ if uploaded_file:
 
     with tabs[1]:
         grid_DOM_ALL = AgGrid(
-            st.session_state.All,
+            grid_page(st.session_state.All, "all", st.session_state.changed_all),
             height=800,
             gridOptions=grid_options2,
-            update_mode=GridUpdateMode.VALUE_CHANGED,
+            update_mode=GridUpdateMode.NO_UPDATE,
             theme='alpine',
             style={'font-size': '20px'},
             columns_auto_size_mode=ColumnsAutoSizeMode.FIT_ALL_COLUMNS_TO_VIEW,
         )
 
     with tabs[2]:
-        st.write(grid_DOM_ALL.data)
+        # Bounded preview of the priced DOM_All
+        st.caption(f"First {min(grid_window.PREVIEW_ROWS, len(st.session_state.All))} of {len(st.session_state.All)} rows")
+        st.write(st.session_state.All.head(grid_window.PREVIEW_ROWS))
 
     # Button to modify the dataframe
+    # Only the edited cells are patched into the priced short list, the pricing stage
+    # then reprices the rows reached by them
     if up_butt:
-        updated_data = pd.DataFrame(grid_return.data)
-        update_all = pd.DataFrame(grid_DOM_ALL.data)
-        
-        st.session_state.All, st.session_state.data = UpdatePricing(update_all, updated_data, Compare, RepCom, vat, CommonPartPriceCriteria, CommonPartCoeff, Sales_Percent)
\ No newline at end of file
+        changes = edits.grid_edits(DOM_short_priced, grid_return.data)
+        # While a run is pending the previous prices do not hold its edits, the new
+        # edits are added to the latest edited list so none is lost
+        st.session_state.data = edits.apply_edits(st.session_state.data if pending else DOM_short_priced, changes)
+        st.session_state.data_version += 1
+        st.rerun()
\ No newline at end of file
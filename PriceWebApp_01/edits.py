@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+
+from memory import lazy_copy
+
+########################################################################################
+# Edits of the short list
+#
+# The edited cells of the DOM_short grid are captured as a delta (part number, column,
+# value) and patched into the priced short list, instead of rebuilding the lists from
+# the grid data. Repricing then only touches the rows reached by the edits:
+#   edited parts -> short list parts with an edited Super Base Part
+#                -> Dom-All parts and parts with such a Base Part
+#                -> Component Part 1 of the Compare rows reading an affected part
+# and computes them with the parts they read (see affected_rows).
+########################################################################################
+
+# Columns of the DOM_short grid the user can edit
+EDITABLE_COLUMNS = ["Original Price (IRR)", "New_Gross", "Base Price Change (%)"]
+
+
+def _changed(new, old):
+    # Cell by cell difference, two missing values are equal
+    new, old = np.asarray(new, dtype=object), np.asarray(old, dtype=object)
+    return ~((new == old) | (pd.isna(new) & pd.isna(old)))
+
+
+def grid_edits(DOM_short, grid_data, columns=EDITABLE_COLUMNS):
+    """
+    Cells of the editable columns changed in the grid, rows are matched by Part No.
+    (the grid may return the rows filtered or sorted).
+    Returns a DataFrame with the Part No., column and new value of every edit.
+    """
+    grid_data = pd.DataFrame(grid_data)
+    positions = pd.Index(DOM_short['Part No.']).get_indexer(grid_data['Part No.'])
+    found = positions >= 0
+    edits = []
+    for column in columns:
+        if column not in DOM_short or column not in grid_data:
+            continue
+        new = pd.to_numeric(grid_data[column][found], errors='coerce').to_numpy()
+        old = pd.to_numeric(DOM_short[column], errors='coerce').to_numpy()[positions[found]]
+        changed = _changed(new, old)
+        edits.append(pd.DataFrame({'Part No.': grid_data['Part No.'][found][changed].to_numpy(),
+                                   'column': column, 'value': new[changed]}))
+    if not edits:
+        return pd.DataFrame(columns=['Part No.', 'column', 'value'])
+    return pd.concat(edits, ignore_index=True)
+
+
+def apply_edits(DOM_short, edits):
+    """
+    Copy of DOM_short with the edited cells set.
+    """
+    DOM_short = lazy_copy(DOM_short)
+    edits = edits.reset_index(drop=True)
+    positions = pd.Index(DOM_short['Part No.']).get_indexer(edits['Part No.'])
+    for column, group in edits.groupby('column', sort=False):
+        values = DOM_short[column].to_numpy(copy=True)
+        if values.dtype.kind not in 'fO':
+            values = values.astype(float)
+        values[positions[group.index]] = group['value'].to_numpy(dtype=float)
+        DOM_short[column] = values
+    return DOM_short
+
+
+def edited_rows(DOM_short, previous, columns=EDITABLE_COLUMNS):
+    """
+    Rows of DOM_short with an edited cell compared with the previous priced short list.
+    Returns None when other columns or the part numbers changed too (the edits can not
+    be repriced row by row).
+    """
+    if list(DOM_short.columns) != list(previous.columns) or len(DOM_short) != len(previous):
+        return None
+    edited = np.zeros(len(DOM_short), dtype=bool)
+    for column in DOM_short.columns:
+        if column in columns:
+            edited |= _changed(DOM_short[column], previous[column])
+        elif not DOM_short[column].equals(previous[column]):
+            return None
+    return edited
+
+
+def affected_rows(catalog, edited):
+    """
+    Rows reached by the edited short list rows (boolean arrays over Dom-All and
+    Dom-Short) and the rows to price with them (the affected rows and every row
+    they read: super base parts, base parts and the Compare components).
+    Returns (affected Dom-All, affected Dom-Short, priced Dom-All, priced Dom-Short).
+    """
+    parts = np.zeros(len(catalog.parts), dtype=bool)
+    graph = catalog.compare_graph
+    component_1 = catalog.compare.codes
+    component_2 = catalog.compare_2_codes
+    supers = np.where(graph.super_row >= 0, graph.super_row, 0)
+
+    # Short list rows priced from an edited row
+    short = edited.copy()
+    has_super = catalog.super_in_short >= 0
+    short[has_super] |= edited[catalog.super_in_short[has_super]]
+    parts[catalog.short.codes[short]] = True
+
+    # Dom-All rows taking the price of an affected short list row
+    all_rows = _linked(short, catalog.all_in_short) | _linked(short, catalog.base_in_short)
+    parts[catalog.all.codes[all_rows]] = True
+
+    # Compare rows reading an affected part adjust their Component Part 1, in order
+    for rows in graph.levels[1:]:
+        reads = (parts[component_1[rows]] | parts[component_2[rows]]
+                 | parts[component_1[supers[rows]]] | parts[component_2[supers[rows]]])
+        parts[component_1[rows[reads]]] = True
+    affected = parts.copy()
+
+    # The Compare components read by the affected rows, in reverse order
+    for rows in reversed(graph.levels[1:]):
+        rows = rows[parts[component_1[rows]]]
+        for codes in (component_2[rows], component_1[supers[rows]], component_2[supers[rows]]):
+            parts[codes] = True
+
+    # Short list rows needed for the Dom-All rows and the super base parts
+    priced_all = parts[catalog.all.codes]
+    priced_short = parts[catalog.short.codes]
+    for links in (catalog.all_in_short, catalog.base_in_short):
+        priced_short[links[priced_all & (links >= 0)]] = True
+    priced_short[catalog.super_in_short[priced_short & has_super]] = True
+    # Dom-All rows of the short list parts (Finished Cost, old prices)
+    priced_all[catalog.short_in_all[priced_short & (catalog.short_in_all >= 0)]] = True
+
+    return affected[catalog.all.codes], affected[catalog.short.codes], priced_all, priced_short
+
+
+def _linked(rows, links):
+    # rows (boolean over a list) looked up through positions in that list
+    found = links >= 0
+    linked = np.zeros(len(links), dtype=bool)
+    linked[found] = rows[links[found]]
+    return linked
+
+
+def patch_rows(frame, rows, subset):
+    """
+    Copy of frame with the rows (boolean) replaced by the same rows of subset,
+    subset holds a part of the rows of frame with the same index labels and columns.
+    Only the columns with a changed value are rewritten.
+    """
+    frame = frame.copy(deep=False)
+    positions = np.flatnonzero(rows)
+    source = subset.index.get_indexer(frame.index[positions])
+    for column in frame.columns:
+        new = subset[column].to_numpy()[source]
+        if not _changed(new, frame[column].iloc[positions].to_numpy()).any():
+            continue
+        values = frame[column].to_numpy()
+        values = values.astype(np.result_type(values.dtype, new.dtype), copy=True)
+        values[positions] = new
+        frame[column] = values
+    return frame
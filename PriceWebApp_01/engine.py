@@ -0,0 +1,162 @@
+import os
+import time
+
+import calculations_v2 as calc
+import export
+import pipeline as pipe
+
+########################################################################################
+# Headless pricing engine
+#
+# Runs the whole costing and pricing chain without streamlit so it can be used by the
+# dashboard, the command line (cli.py), batch jobs and benchmarks.
+#   engine = PricingEngine({"nima": 700000})
+#   results = engine.run("Pricing.xlsx")
+#   results.DOM_ALL, results.DOM_short, results.timings
+########################################################################################
+
+# Default parameters, the same values as the dashboard sidebar
+DEFAULT_PARAMS = {
+    "method": "Original Price",
+    "nima": 680000,
+    "custom": 300000,
+    "euro_to_currency": {"USD": 1.10, "AED": 4.054, "EUR": 1.0},
+    "ExpDuties": 2.5,
+    # Indices of the aluminium base fees, fee column or "*" (every fee) -> index (profiles.py)
+    "Al_index": {},
+    "OLDlaborRate": 2300000,
+    "OverHead_Rates": {"MOH": 1.2, "LAB": 282000, "LABSU1": 27.8, "LABSU2": 22.9},
+    # "Labor Rate" (OLDlaborRate) or "Cost Center" (Est Labor Cost of the cost centers, routing.py)
+    "LaborCosting": "Labor Rate",
+    "vat": 10,
+    "RepCom": 5,
+    "Sales_Percent": {
+        "End_User_DOM_All": 1.22,
+        "End_User_DOM_Explosion": 1.175,
+        "End_User_Turkey": 3.85,
+        "End_User_Iraq_Armenia_Afghan": 1.4,
+        "Electrical_All": 0.895,
+        "Electrical_Explosion": 0.925,
+        "Wholesales": 0.94,
+    },
+    "DomesticRM": 0,
+    "CommonPartPriceCriteria": 900000,
+    "CommonPartCoeff": 0.55,
+    # Target New_Gross of the "Target Margin" method per level of targets.TARGET_LEVELS
+    "Target_Gross": {},
+}
+
+# Names of the frames returned by calc.input_df, in order (Rules is None when the
+# workbook has no Rules sheet)
+FRAME_NAMES = ["Cost", "Al_profile", "Imp_RM", "MH", "BOM", "Shemsh", "DOM_short", "DOM_ALL", "Compare", "Rules"]
+
+
+def merge_params(params):
+    """
+    Returns the default parameters updated with params, rate dictionaries are merged
+    so a partial dictionary (e.g. only "MOH") keeps the other default rates.
+    """
+    merged = {}
+    for name, value in DEFAULT_PARAMS.items():
+        merged[name] = dict(value) if isinstance(value, dict) else value
+    for name, value in (params or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(name), dict):
+            merged[name].update(value)
+        else:
+            merged[name] = value
+    return merged
+
+
+class PricingResults:
+    """
+    Output of a pricing run: the priced lists, every intermediate frame, the
+    seconds spent in each stage ("Load" plus the pipeline stages) and the parameters.
+    """
+    def __init__(self, frames, timings, recomputed, params=None):
+        self.frames = frames
+        self.timings = timings
+        self.recomputed = recomputed
+        self.params = merge_params(params)
+
+    @property
+    def DOM_ALL(self):
+        return self.frames["DOM_ALL"]
+
+    @property
+    def DOM_short(self):
+        return self.frames["DOM_short"]
+
+    def center_costs(self):
+        """
+        Man hours and labor cost at the labor rate and at the cost center rates per
+        cost center (routing.Routing.center_costs).
+        """
+        return self.frames["Routing"].center_costs(self.params["OLDlaborRate"])
+
+    def write(self, out_dir, fmt="xlsx"):
+        """
+        Writes DOM_short, DOM_ALL, the channel price lists and the cost centers
+        (export.py) to out_dir as one xlsx workbook or one csv / parquet file per sheet.
+        Returns the written paths.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        sheets = export.export_sheets(self.frames, self.params["OLDlaborRate"])
+        if fmt == "xlsx":
+            return [export.write_xlsx(sheets, os.path.join(out_dir, "Pricing.xlsx"))]
+        return export.write_files(sheets, out_dir, fmt)
+
+
+class PricingEngine:
+    """
+    Costing and pricing of a workbook with a fixed parameter set.
+    The stage results are memoized, running again after changing a parameter
+    only recomputes the stages depending on it.
+    compact loads the workbooks with the memory lean dtypes of memory.py.
+    shared is an optional store.StageCache holding the stage results shared with
+    the engines of other sessions.
+    """
+    def __init__(self, params=None, compact=False, shared=None):
+        self.params = merge_params(params)
+        self.compact = compact
+        self.pipeline = pipe.Pipeline(pipe.PRICING_STAGES, shared)
+
+    def load(self, workbook):
+        """
+        Reads the workbook (path or file-like object).
+        Returns the workbook content hash and a dictionary of the frames.
+        """
+        key = calc.workbook_hash(workbook)
+        frames = dict(zip(FRAME_NAMES, calc.input_df(workbook, key, compact=self.compact)))
+        return key, frames
+
+    def run(self, workbook):
+        """
+        Loads and prices a workbook end to end.
+        """
+        start = time.perf_counter()
+        key, frames = self.load(workbook)
+        load_time = time.perf_counter() - start
+
+        results = self.price(frames, key)
+        results.timings = {"Load": load_time, **results.timings}
+        return results
+
+    def price(self, frames, key, DOM_short=None, edits_version=0, progress=None):
+        """
+        Prices already loaded frames.
+        key identifies the workbook content, DOM_short optionally replaces the
+        workbook short list (e.g. with the edits of a dashboard session) and
+        edits_version must change whenever those edits change.
+        progress is passed to Pipeline.run.
+        """
+        sources = {name: (key, frames.get(name)) for name in FRAME_NAMES if name != "DOM_short"}
+        sources["Workbook_DOM_short"] = (key, frames["DOM_short"])
+        private = []
+        if DOM_short is None or DOM_short is frames["DOM_short"]:
+            sources["DOM_short"] = (key, frames["DOM_short"])
+        else:
+            sources["DOM_short"] = ((key, edits_version), DOM_short)
+            private.append("DOM_short")
+
+        values = self.pipeline.run(sources, self.params, private, progress)
+        return PricingResults(values, dict(self.pipeline.timings), list(self.pipeline.recomputed), self.params)
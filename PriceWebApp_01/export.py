@@ -0,0 +1,184 @@
+import os
+import tempfile
+import threading
+import weakref
+import zipfile
+
+import pandas as pd
+
+from channels import BASE_PRICE, END_USER
+from memory import parquet_frame
+
+########################################################################################
+# Export of the priced lists
+#
+# The priced lists, one price list per sales channel and the labor cost per cost center
+# (Cost Centers) are written as the sheets of an xlsx workbook, or as csv / parquet
+# files (one per sheet, zipped for a download):
+#   path = write_export(export_sheets(results.frames, params["OLDlaborRate"]), "Pricing.xlsx")
+# The xlsx is written row by row with xlsxwriter in constant memory mode, every row is
+# flushed to a temporary file once written, so the memory does not grow with the number
+# of rows. The dashboard builds the file in a background thread (ExportJob) and offers
+# the download once it is done.
+########################################################################################
+
+FORMATS = ["xlsx", "csv", "parquet"]
+
+# Price lists of the sales channels: sheet name -> price column
+PRICE_LISTS = {
+    "Base Price": BASE_PRICE,
+    "End-User": END_USER,
+    "Electrical Shops": 'Electrical Shops (IRR)',
+    "Wholesales": 'Wholesales Price Including VAT (IRR)',
+}
+
+# Columns of the part kept in the price lists
+PART_COLUMNS = ["Part No.", "Part Description", "Price List Type", "Product Family", "Model"]
+
+# Rows written between two progress updates
+CHUNK_ROWS = 10000
+
+
+def export_sheets(frames, OLDlaborRate=None):
+    """
+    Sheets of the export: Dom-Short, Dom-All and the price list of every channel
+    (the part columns and its price from Dom-All). frames are the frames of an
+    engine.PricingResults. With OLDlaborRate the labor cost per cost center
+    (routing.Routing.center_costs) is added as the Cost Centers sheet.
+    """
+    DOM_ALL = frames["DOM_ALL"]
+    sheets = {"Dom-Short": frames["DOM_short"], "Dom-All": DOM_ALL}
+    parts = [column for column in PART_COLUMNS if column in DOM_ALL]
+    for name, column in PRICE_LISTS.items():
+        if column in DOM_ALL:
+            sheets[name] = DOM_ALL[parts + [column]]
+    if OLDlaborRate is not None and frames.get("Routing") is not None:
+        sheets["Cost Centers"] = frames["Routing"].center_costs(OLDlaborRate).reset_index()
+    return sheets
+
+
+def _number_format(name):
+    # Excel format of a numeric column: percentages with 2 decimals, amounts with separators
+    if "Gross" in name or "(%)" in name or name == "Coefficient":
+        return "0.00"
+    if "(IRR)" in name or "Price" in name or "Cost" in name:
+        return "#,##0"
+    return None
+
+
+def _cells(column):
+    # Python values of a column for xlsxwriter, None (blank) for the missing values
+    # (infinite values are written as Excel errors)
+    return column.astype(object).where(column.notna(), None).tolist()
+
+
+def write_xlsx(sheets, path, progress=None):
+    """
+    Writes the sheets to an xlsx workbook at path with a bold frozen header, filters
+    and number formats, in constant memory.
+    progress(rows written, rows) is called after every CHUNK_ROWS rows.
+    """
+    import xlsxwriter
+
+    total = sum(len(frame) for frame in sheets.values())
+    done = 0
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "strings_to_urls": False, "nan_inf_to_errors": True,
+                                          "default_date_format": "yyyy-mm-dd"})
+    try:
+        header = workbook.add_format({"bold": True, "bg_color": "#DDEBF7", "border": 1})
+        formats = {}
+        for name, frame in sheets.items():
+            sheet = workbook.add_worksheet(name[:31])
+            for i, column in enumerate(frame.columns):
+                number_format = _number_format(str(column)) if pd.api.types.is_numeric_dtype(frame[column]) else None
+                if number_format and number_format not in formats:
+                    formats[number_format] = workbook.add_format({"num_format": number_format})
+                sheet.set_column(i, i, min(max(len(str(column)) + 2, 12), 40), formats.get(number_format))
+            sheet.write_row(0, 0, [str(column) for column in frame.columns], header)
+            sheet.freeze_panes(1, 0)
+            sheet.autofilter(0, 0, len(frame), max(len(frame.columns) - 1, 0))
+
+            # Constant memory: the rows are written in order, a chunk of rows at a time
+            for start in range(0, len(frame), CHUNK_ROWS):
+                chunk = frame.iloc[start:start + CHUNK_ROWS]
+                for row, values in enumerate(zip(*(_cells(chunk[column]) for column in chunk.columns)), start + 1):
+                    sheet.write_row(row, 0, values)
+                done += len(chunk)
+                if progress is not None:
+                    progress(done, total)
+    finally:
+        workbook.close()
+    return path
+
+
+def write_files(sheets, folder, fmt="csv"):
+    """
+    Writes every sheet as a csv or parquet file of folder. Returns the written paths.
+    """
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for name, frame in sheets.items():
+        path = os.path.join(folder, f"{name}.{fmt}")
+        if fmt == "csv":
+            frame.to_csv(path, index=False)
+        elif fmt == "parquet":
+            parquet_frame(frame).to_parquet(path, index=False)
+        else:
+            raise ValueError(f"Unknown export format '{fmt}'")
+        paths.append(path)
+    return paths
+
+
+def write_export(sheets, path, fmt="xlsx", progress=None):
+    """
+    Writes the sheets to path: an xlsx workbook, or a zip of csv / parquet files.
+    """
+    if fmt == "xlsx":
+        return write_xlsx(sheets, path, progress)
+    with tempfile.TemporaryDirectory() as folder, zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for file in write_files(sheets, folder, fmt):
+            archive.write(file, os.path.basename(file))
+    return path
+
+
+def _remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class ExportJob:
+    """
+    Builds an export file in a background thread.
+        fraction: rows written / rows (xlsx)
+        path: the written file once done is set, error the exception of a failed build
+    The file is a temporary file, remove() deletes it, else it is deleted with the job
+    (when the session holding it ends) or at exit.
+    """
+    def __init__(self, sheets, fmt="xlsx"):
+        self.fmt = fmt
+        self.file_name = "Pricing.xlsx" if fmt == "xlsx" else f"Pricing {fmt}.zip"
+        self.fraction = 0.0
+        self.path = None
+        self.error = None
+        self.done = threading.Event()
+        handle, self._path = tempfile.mkstemp(suffix=os.path.splitext(self.file_name)[1], prefix="pricing-export-")
+        os.close(handle)
+        self._remove = weakref.finalize(self, _remove_file, self._path)
+        self._thread = threading.Thread(target=self._run, args=(sheets,), name="pricing-export", daemon=True)
+        self._thread.start()
+
+    def _progress(self, done, total):
+        self.fraction = done / total if total else 1.0
+
+    def _run(self, sheets):
+        try:
+            write_export(sheets, self._path, self.fmt, self._progress)
+            self.fraction = 1.0
+            self.path = self._path
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+    def remove(self):
+        self._remove()
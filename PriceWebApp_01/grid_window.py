@@ -0,0 +1,74 @@
+import numpy as np
+
+########################################################################################
+# Server side rows of the grids
+#
+# The grids only receive the rows of the visible page. Searching, filtering and sorting
+# run here with pandas over the whole frame, the result is an array of row positions
+# which is then sliced to the page:
+#   positions = sort_rows(DOM_ALL, filter_rows(DOM_ALL, "31AA"), "Finished Cost")
+#   AgGrid(window(DOM_ALL, positions, page=0, page_size=100))
+########################################################################################
+
+# Columns searched by the search box
+SEARCH_COLUMNS = ["Part No.", "Part Description", "Product Family", "Model", "Price List Type"]
+
+# Rows shown by the debug preview
+PREVIEW_ROWS = 200
+
+
+def filter_rows(frame, search="", columns=SEARCH_COLUMNS, only=None):
+    """
+    Boolean mask of the rows containing search (case insensitive) in any of columns.
+    only optionally restricts the rows further (e.g. the rows changed by a recompute).
+    """
+    mask = np.ones(len(frame), dtype=bool) if only is None else np.asarray(only, dtype=bool).copy()
+    search = (search or "").strip().lower()
+    if search:
+        found = np.zeros(len(frame), dtype=bool)
+        for column in columns:
+            if column in frame:
+                found |= frame[column].astype(str).str.lower().str.contains(search, regex=False).to_numpy()
+        mask &= found
+    return mask
+
+
+def sort_rows(frame, mask, by=None, ascending=True):
+    """
+    Positions of the rows of mask, sorted by the column by (stable, missing values last).
+    Columns mixing numbers and text (part numbers) are sorted as text.
+    """
+    positions = np.flatnonzero(mask)
+    if by is None or by not in frame:
+        return positions
+    values = frame[by].iloc[positions]
+    if values.dtype == object:
+        values = values.where(values.isna(), values.astype(str))
+    order = np.argsort(values.rank(method="first", ascending=ascending, na_option="bottom").to_numpy(), kind="stable")
+    return positions[order]
+
+
+def page_count(rows, page_size):
+    return max(1, -(-rows // page_size))
+
+
+def window(frame, positions, page, page_size):
+    """
+    Rows of one page (page counts from 0).
+    """
+    return frame.iloc[positions[page * page_size:(page + 1) * page_size]]
+
+
+def changed_rows(before, after):
+    """
+    Boolean mask of the rows of after with a value different from before,
+    every row when the frames do not have the same rows, columns and dtypes.
+    """
+    if (before is None or not before.index.equals(after.index) or list(before.columns) != list(after.columns)
+            or not before.dtypes.equals(after.dtypes)):
+        return np.ones(len(after), dtype=bool)
+    changed = np.zeros(len(after), dtype=bool)
+    for column in after.columns:
+        x, y = before[column], after[column]
+        changed |= ~((x == y).fillna(False) | (x.isna() & y.isna())).to_numpy(dtype=bool)
+    return changed
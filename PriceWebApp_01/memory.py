@@ -0,0 +1,98 @@
+import pandas as pd
+
+########################################################################################
+# Memory lean frames
+#
+# In compact mode the dtypes are decided once when the workbook is loaded:
+#   - part number columns become Arrow strings, numbers and text mixed in one column
+#     (e.g. 3129814000 between the '31..' parts) no longer make it an object column
+#   - other text columns with few distinct values (Model, Price List Type, Product
+#     Family, Currency, TEMPLATE ID...) become categoricals
+# Numeric columns keep their dtype: the IRR prices and costs need 64 bits and narrower
+# integers could overflow in the cost sums.
+# With copy on write (pandas 3) a frame can be copied without copying its columns,
+# a column is only copied when one of the frames modifies it (lazy_copy).
+########################################################################################
+
+# Columns holding part numbers in the sheets of input_df
+PART_COLUMNS = ["Part No", "Part No.", "PART_NO", "PART NO", "TOP LEVEL PART NO", "Base Part", "Super Base Part",
+                "Component Part 1", "Component Part 2", "Super Component 1"]
+
+# Text columns with at most this share of distinct values become categoricals
+CATEGORY_RATIO = 0.5
+
+COPY_ON_WRITE = int(pd.__version__.split(".")[0]) >= 3 or pd.get_option("mode.copy_on_write") is True
+
+
+def lazy_copy(frame):
+    """
+    Copy of frame that can be modified without changing frame. The columns are shared
+    until modified with copy on write, copied at once otherwise.
+    """
+    return frame.copy(deep=not COPY_ON_WRITE)
+
+
+def part_numbers(column):
+    """
+    Part numbers as strings, whole numbers without a decimal part.
+    """
+    if column.dtype.kind == "f":
+        whole = column.dropna()
+        if (whole == whole.round()).all():
+            return column.astype("Int64").astype("str")
+    return column.astype("str")
+
+
+def compact_frame(frame):
+    """
+    Copy of frame with the compact dtypes (the numeric columns are shared).
+    """
+    columns = {}
+    for name in frame.columns:
+        column = frame[name]
+        if name in PART_COLUMNS:
+            columns[name] = part_numbers(column)
+        elif column.dtype == object or isinstance(column.dtype, pd.StringDtype):
+            if pd.api.types.infer_dtype(column, skipna=True) not in ("string", "empty"):
+                continue        # numbers, dates or mixed values are left as they are
+            if column.nunique() <= CATEGORY_RATIO * len(column):
+                columns[name] = column.astype("category")
+            else:
+                columns[name] = column.astype("str")
+    return frame.assign(**columns) if columns else frame
+
+
+def parquet_frame(frame):
+    """
+    frame with one type per column for Parquet.
+    """
+    # Parquet needs one type per column: mixed part numbers (3129814000 among the
+    # '31..' parts) and other mixed text columns are stored as strings
+    columns = {}
+    for name in frame.columns:
+        column = frame[name]
+        if column.dtype == object and pd.api.types.infer_dtype(column, skipna=True) not in ("string", "empty"):
+            columns[name] = column.where(column.isna(), column.astype(str))
+    return frame.assign(**columns) if columns else frame
+
+
+def compact_frames(frames):
+    """
+    compact_frame of every frame of a dictionary.
+    """
+    return {name: compact_frame(frame) if isinstance(frame, pd.DataFrame) else frame for name, frame in frames.items()}
+
+
+def memory_report(frames):
+    """
+    Rows, columns and memory (MB, strings included) of every DataFrame of a dictionary,
+    with a total row. Columns shared between frames (copy on write) are counted in each.
+    """
+    rows = []
+    for name, frame in frames.items():
+        if isinstance(frame, pd.DataFrame):
+            rows.append({"frame": name, "rows": len(frame), "columns": frame.shape[1],
+                         "mb": frame.memory_usage(deep=True, index=True).sum() / 2**20})
+    report = pd.DataFrame(rows, columns=["frame", "rows", "columns", "mb"])
+    total = {"frame": "Total", "rows": report["rows"].sum(), "columns": report["columns"].sum(), "mb": report["mb"].sum()}
+    return pd.concat([report, pd.DataFrame([total])], ignore_index=True)
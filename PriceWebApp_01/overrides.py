@@ -0,0 +1,205 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+########################################################################################
+# Costing and pricing exceptions as a rule table
+#
+# A rule selects rows of Dom-All / Dom-Short and changes a column at one step of the
+# calculations:
+#   Step:   Man_Hour (process_DOM_ALL, after the man hours are mapped), MOH (after the
+#           MOH is computed), Base Price (UpdateBasePrice) or Compare (compare)
+#   Match:  Part No. (a list of parts), Prefix (part numbers starting with a value) or
+#           any column of the list (Product Family, Model, Price List Type...)
+#   Values: the matched values, separated by commas
+#   Action: set (Column = Value), copy_row (Column = Column of the part Value),
+#           floor (Column at least the Value column, * for the compared prices) or
+#           cost_price (priced from the Finished Cost with the Common Parts coefficient)
+# The rules are the DEFAULT_RULES, then the rules of rules.json next to this file (or
+# the path in PRICEWEBAPP_RULES), then the rows of an optional Rules sheet of the
+# workbook. They are compiled once per list into the row positions of every rule (one
+# lookup per matched column, not a string scan per rule), so applying a step is an
+# indexed assignment per rule.
+########################################################################################
+
+# Part whose man hours the Galaxy parts take: the part of Dom-All row 1213 in the
+# workbook the exception was written for, PRICEWEBAPP_GALAXY_PART when it changes
+GALAXY_MAN_HOURS_PART = os.environ.get("PRICEWEBAPP_GALAXY_PART", "31CS009005")
+
+STEPS = ["Man_Hour", "MOH", "Base Price", "Compare"]
+ACTIONS = ["set", "copy_row", "floor", "cost_price"]
+
+# Exceptions of the calculations, in the order they are applied
+DEFAULT_RULES = [
+    {"Step": "Man_Hour", "Match": "Part No.", "Values": "31BB802000, 31BB803000, 31BB804000, 31BB805000",
+     "Column": "Man_Hour", "Action": "set", "Value": 0.1},
+    # Galaxy parts take the man hours of GALAXY_MAN_HOURS_PART
+    {"Step": "Man_Hour", "Match": "Part No.", "Values": "31CS009006, 31CS009007",
+     "Column": "Man_Hour", "Action": "copy_row", "Value": GALAXY_MAN_HOURS_PART},
+    # No MOH for Explosion Proof (34..) and Fanal barchasb
+    {"Step": "MOH", "Match": "Prefix", "Values": "34", "Column": "MOH", "Action": "set", "Value": 0},
+    {"Step": "MOH", "Match": "Part No.", "Values": "3129814000", "Column": "MOH", "Action": "set", "Value": 0},
+    {"Step": "Base Price", "Match": "Price List Type", "Values": "Common Parts",
+     "Column": "Base Price Including VAT (IRR)", "Action": "cost_price", "Value": None},
+    # Common parts are never priced below their old price
+    {"Step": "Compare", "Match": "Price List Type", "Values": "Common Parts",
+     "Column": "*", "Action": "floor", "Value": " Old Base Prices (IRR)"},
+]
+
+RULE_COLUMNS = ["Step", "Match", "Values", "Column", "Action", "Value"]
+
+
+class Rule:
+    """
+    One row of the rule table.
+    """
+    def __init__(self, Step, Match, Values, Column, Action, Value=None):
+        if Step not in STEPS:
+            raise ValueError(f"Unknown rule step '{Step}', expected one of {', '.join(STEPS)}")
+        if Action not in ACTIONS:
+            raise ValueError(f"Unknown rule action '{Action}', expected one of {', '.join(ACTIONS)}")
+        self.step = Step
+        self.match = Match
+        self.values = [value.strip() for value in str(Values).split(",") if value.strip()]
+        self.column = Column
+        self.action = Action
+        self.value = None if pd.isna(Value) else Value
+
+    def __repr__(self):
+        return f"Rule({self.step}: {self.match} in {', '.join(self.values[:3])} -> {self.action} {self.column})"
+
+
+def load_rules(path=None):
+    """
+    The default rules followed by the rules of the json file (a list of rule objects).
+    """
+    path = path or os.environ.get("PRICEWEBAPP_RULES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json"))
+    rules = [Rule(**rule) for rule in DEFAULT_RULES]
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            rules += [Rule(**rule) for rule in json.load(f)]
+    return rules
+
+
+def sheet_rules(Rules):
+    """
+    Rules of the Rules sheet of a workbook (None when the workbook has none).
+    """
+    if Rules is None:
+        return []
+    return [Rule(**{column: row.get(column) for column in RULE_COLUMNS}) for row in Rules.to_dict("records")]
+
+
+RULES = load_rules()
+
+
+class CompiledRules:
+    """
+    Row positions of every rule in one list, compiled once for its part numbers,
+    and the row of the source part of the copy_row rules (-1 when not in the list).
+    """
+    def __init__(self, frame, rules):
+        self.rules = rules
+        self.parts = pd.Index(frame['Part No.'])
+        self.rows = [np.empty(0, dtype=np.intp)] * len(rules)
+        self.sources = [self.parts.get_indexer([str(rule.value).strip()])[0] if rule.action == 'copy_row' else -1
+                        for rule in rules]
+
+        # The rules matching the same column (prefixes of the same length) are looked up together
+        groups = {}
+        for i, rule in enumerate(rules):
+            column, length = ('Part No.', None) if rule.match == 'Part No.' else \
+                ('Part No.', 0) if rule.match == 'Prefix' else (rule.match, None)
+            for value in rule.values:
+                key = (column, len(value) if length == 0 else None)
+                groups.setdefault(key, {}).setdefault(value, []).append(i)
+
+        matched = {}
+        for (column, length), values in groups.items():
+            if column not in frame:
+                continue
+            keys = frame[column].astype(str)
+            if length is not None:
+                keys = keys.str[:length]
+            codes = pd.Index(list(values)).get_indexer(keys)
+            # Rows of every value: the rows sorted by the code of their value
+            order = np.argsort(codes, kind='stable')
+            counts = np.bincount(codes + 1, minlength=len(values) + 1)
+            for rows, rule_ids in zip(np.split(order, np.cumsum(counts)[:-1])[1:], values.values()):
+                for i in rule_ids:
+                    matched.setdefault(i, []).append(rows)
+        for i, rows in matched.items():
+            self.rows[i] = np.unique(np.concatenate(rows))
+
+    def matches(self, frame):
+        """
+        True when frame has the part numbers (same order) the rules were compiled for.
+        """
+        return self.parts.equals(pd.Index(frame['Part No.']))
+
+    def mask(self, step, action=None):
+        """
+        Rows selected by the rules of a step (and action).
+        """
+        mask = np.zeros(len(self.parts), dtype=bool)
+        for rule, rows in zip(self.rules, self.rows):
+            if rule.step == step and (action is None or rule.action == action):
+                mask[rows] = True
+        return mask
+
+    def apply(self, step, frame, columns=()):
+        """
+        Applies the set, copy_row and floor rules of a step to frame, in order.
+        columns are the price columns of the floor rules with Column '*'.
+        """
+        targets = [column for rule, rows in zip(self.rules, self.rows) if rule.step == step and rule.action != 'cost_price' and len(rows)
+                   for column in (columns if rule.column == '*' else [rule.column])]
+        for column in dict.fromkeys(targets):
+            frame[column] = self.apply_values(step, column, frame[column].to_numpy(dtype=float, copy=True), frame, columns)
+        return frame
+
+    def apply_values(self, step, column, values, frame, columns=()):
+        """
+        Applies the rules of a step changing column to values, the column as an array
+        (rows first, e.g. parts x scenarios) modified in place and returned.
+        """
+        for rule, rows, source in zip(self.rules, self.rows, self.sources):
+            if rule.step != step or rule.action == 'cost_price' or not len(rows):
+                continue
+            if column not in (columns if rule.column == '*' else [rule.column]):
+                continue
+            if rule.action == 'set':
+                values[rows] = float(rule.value)
+            elif rule.action == 'copy_row':
+                if source < 0:
+                    raise ValueError(f"{rule}: part {rule.value} is not in the list")
+                values[rows] = values[source]
+            elif rule.action == 'floor':
+                floor = frame[rule.value].to_numpy(dtype=float)[rows]
+                if values.ndim > 1:
+                    floor = floor[:, None]
+                values[rows] = np.where(values[rows] <= floor, floor, values[rows])
+        return values
+
+
+class Overrides:
+    """
+    The rules compiled for Dom-All (all) and Dom-Short (short), built once per data load.
+    Rules is the optional Rules sheet of the workbook.
+    """
+    def __init__(self, DOM_ALL, DOM_short, Rules=None):
+        self.rules = RULES + sheet_rules(Rules)
+        self.all = CompiledRules(DOM_ALL, self.rules)
+        self.short = CompiledRules(DOM_short, self.rules)
+
+
+def rules_for(frame, compiled=None):
+    """
+    Returns compiled (CompiledRules) when it fits frame, otherwise its rules (the
+    configured rules when compiled is None) compiled for frame.
+    """
+    if compiled is not None and compiled.matches(frame):
+        return compiled
+    return CompiledRules(frame, compiled.rules if compiled is not None else RULES)
@@ -0,0 +1,240 @@
+import time
+
+import calculations_v2 as calc
+from bom import BOMStructure
+from catalog import Catalog, catalog_for
+from channels import side_prices
+from edits import affected_rows, edited_rows, patch_rows
+from memory import lazy_copy
+from overrides import Overrides, rules_for
+from profiles import ProfileCostModel
+from profiling import profiled
+from routing import Routing
+
+########################################################################################
+# Dependency graph of the pricing stages
+#
+# Every stage declares the dataframes it reads (inputs) and the sidebar parameters it
+# depends on (params). Results are memoized per stage and a stage is only recomputed
+# when a parameter it declares changes or when one of its inputs was recomputed.
+#   - workbook                    -> every stage, the BOM structure, MH and its
+#                                    routing sums (routing.py), the part number
+#                                    catalog, the compiled exception rules
+#                                    (overrides.py) and the profile x base fee
+#                                    matrix (profiles.py) only here
+#   - nima / custom / currencies  -> Imp_RM -> BOM -> DOM_ALL -> Pricing
+#   - aluminium fee indices       -> Imp_RM -> BOM (profile columns only) -> DOM_ALL -> Pricing
+#   - DomesticRM                  -> BOM -> DOM_ALL -> Pricing
+#   - OverHead_Rates / labor rate -> DOM_ALL -> Pricing
+#   - labor costing method        -> DOM_ALL -> Pricing
+#   - vat / RepCom / Sales rates  -> Pricing
+#   - target margins              -> Pricing
+#   - UI only toggles             -> nothing
+# A stage with an update function (Pricing) is updated in place of being recomputed
+# when only its inputs changed (e.g. edited cells of the short list), see reprice_lists.
+# With a shared store.StageCache the results of the stages which only read workbook
+# data (not the edits of a session) are shared by the pipelines of every session.
+########################################################################################
+
+class Stage:
+    """
+    A node of the pipeline: func is called with the input dataframes as positional
+    arguments and the declared parameters as keyword arguments.
+    update optionally computes the new outputs from the previous inputs and outputs,
+    update(previous_inputs, previous_outputs, *inputs, **params), when the parameters
+    did not change. It returns None when it can not, func is called then.
+    """
+    def __init__(self, name, func, inputs, params, outputs, update=None):
+        self.name = name
+        self.func = func
+        self.inputs = inputs
+        self.params = params
+        self.outputs = outputs
+        self.update = update
+
+
+def _freeze(value):
+    # Parameters are compared by value, dictionaries (rates) and lists (e.g. from a
+    # json parameter file) are made hashable
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class Pipeline:
+    """
+    Runs the stages in order and memoizes the outputs of each stage.
+    Stages must be given in topological order.
+    shared is an optional store.StageCache shared with other pipelines.
+    """
+    def __init__(self, stages, shared=None):
+        self.stages = stages
+        self.shared = shared
+        self._memo = {}         # stage name -> (key, outputs, version, inputs)
+        self.recomputed = []    # names of the stages recomputed by the last run
+        self.updated = []       # names of the recomputed stages only updated (stage.update)
+        self.timings = {}       # stage name -> seconds spent by the last run
+
+    def run(self, sources, params, private=(), progress=None):
+        """
+        sources: dictionary of name -> (token, dataframe). The token identifies the
+            content of the dataframe (e.g. the workbook hash or an edit counter),
+            a new token invalidates every stage that reads the dataframe. A missing
+            source (e.g. the optional Rules sheet) is passed as None.
+        params: dictionary of the sidebar parameters.
+        private: names of the sources only valid in this pipeline (e.g. an edited
+            short list), the stages reading them are not shared.
+        progress: optional progress(stage name, stages done, stages) called before
+            each stage, it may raise to stop the run between two stages (the stages
+            already run stay memoized).
+        Returns a dictionary with the sources overridden by the stage outputs.
+        """
+        values = {name: frame for name, (token, frame) in sources.items()}
+        tokens = {name: token for name, (token, frame) in sources.items()}
+        private = set(private)
+        self.recomputed = []
+        self.updated = []
+        self.timings = {}
+
+        for i, stage in enumerate(self.stages):
+            if progress is not None:
+                progress(stage.name, i, len(self.stages))
+            key = (tuple(tokens.get(name) for name in stage.inputs),
+                   tuple(_freeze(params[name]) for name in stage.params))
+            memo = self._memo.get(stage.name)
+            shared = self.shared is not None and private.isdisjoint(stage.inputs)
+
+            start = time.perf_counter()
+            if memo is None or memo[0] != key:
+                inputs = [values.get(name) for name in stage.inputs]
+                kwargs = {name: params[name] for name in stage.params}
+                result = self.shared.get(stage.name, key) if shared else None
+                if result is None and memo is not None and stage.update is not None and memo[0][1] == key[1]:
+                    result = stage.update(memo[3], memo[1], *inputs, **kwargs)
+                    if result is not None:
+                        self.updated.append(stage.name)
+                if result is None:
+                    result = stage.func(*inputs, **kwargs)
+                    if len(stage.outputs) == 1:
+                        result = (result,)
+                if shared:
+                    self.shared.put(stage.name, key, result)
+                version = memo[2] + 1 if memo else 1
+                memo = (key, result, version, inputs)
+                self._memo[stage.name] = memo
+                self.recomputed.append(stage.name)
+            self.timings[stage.name] = time.perf_counter() - start
+
+            for name, frame in zip(stage.outputs, memo[1]):
+                values[name] = frame
+                # Shared outputs are identified by their key, the same in every pipeline
+                tokens[name] = (stage.name, key) if shared else (stage.name, memo[2])
+                if not shared:
+                    private.add(name)
+
+        return values
+
+########################################################################################
+# Stage functions which are not a single call to calculations_v2
+
+@profiled
+def price_lists(DOM_ALL, DOM_short, Compare, Catalog, Overrides, method, RepCom, vat, CommonPartPriceCriteria, CommonPartCoeff, Sales_Percent, Target_Gross=None):
+    """
+    Base prices with the selected method and the side prices of both lists.
+    Target_Gross holds the targets of the 'Target Margin' method (targets.py).
+    Works on (lazy) copies so the memoized cost results and the Compare sheet are never modified.
+    Catalog is the part number catalog of the workbook, rebuilt if the edits of
+    the short list changed its part numbers, Overrides its compiled exception rules
+    (recompiled in the same case, the configured rules when None).
+    """
+    DOM_ALL = lazy_copy(DOM_ALL)
+    DOM_short = lazy_copy(DOM_short)
+    Compare = lazy_copy(Compare)
+    catalog = catalog_for(DOM_ALL, DOM_short, Compare, Catalog)
+    rules_all = rules_for(DOM_ALL, Overrides.all if Overrides is not None else None)
+    rules_short = rules_for(DOM_short, Overrides.short if Overrides is not None else None)
+
+    # Call to Update DOM_short and DOM_ALL with Mani algorithm
+    DOM_short, DOM_ALL = calc.UpdateBasePrice(DOM_ALL, DOM_short, method, Compare, RepCom, vat, CommonPartPriceCriteria, CommonPartCoeff, catalog, Target_Gross, rules_all)
+
+    # Other Users Prices (every channel of channels.py) in Dom-all and DOM_Short
+    side_prices(DOM_ALL, Sales_Percent, Compare, catalog.all, rules=rules_all)
+    side_prices(DOM_short, Sales_Percent, Compare, catalog.short, rules=rules_short)
+
+    return DOM_ALL, DOM_short
+
+
+@profiled
+def reprice_lists(previous, outputs, DOM_ALL, DOM_short, Compare, Catalog, Overrides, **params):
+    """
+    Update of price_lists when only cells of the editable columns of the short list
+    changed since the previous run: the rows reached by the edits are priced with the
+    rows they read and patched into the previous price lists.
+    Returns None when other inputs changed.
+    """
+    previous_ALL, previous_short, previous_Compare, previous_Catalog, previous_Overrides = previous
+    priced_ALL, priced_short = outputs
+    if (DOM_ALL is not previous_ALL or Compare is not previous_Compare or Catalog is not previous_Catalog
+            or Overrides is not previous_Overrides):
+        return None
+    # The dashboard sends back the previous priced short list with the edited cells
+    edited = edited_rows(DOM_short, priced_short)
+    if edited is None:
+        return None
+
+    catalog = catalog_for(DOM_ALL, DOM_short, Compare, Catalog)
+    affected_all, affected_short, rows_all, rows_short = affected_rows(catalog, edited)
+    if not affected_short.any() and not affected_all.any():
+        return priced_ALL, DOM_short
+    # Edits reaching most of the rows are priced as a whole
+    if rows_all.sum() > len(rows_all) // 2 or rows_short.sum() > len(rows_short) // 2:
+        return None
+    subset_ALL, subset_short = price_lists(DOM_ALL[rows_all], DOM_short[rows_short], Compare, None, Overrides, **params)
+    return patch_rows(priced_ALL, affected_all, subset_ALL), patch_rows(DOM_short, affected_short, subset_short)
+
+########################################################################################
+PRICING_STAGES = [
+    Stage("Catalog", Catalog,
+          inputs=["DOM_ALL", "Workbook_DOM_short", "Compare"],
+          params=[],
+          outputs=["Catalog"]),
+    Stage("Overrides", Overrides,
+          inputs=["DOM_ALL", "Workbook_DOM_short", "Rules"],
+          params=[],
+          outputs=["Overrides"]),
+    Stage("Profiles", ProfileCostModel,
+          inputs=["Al_profile"],
+          params=[],
+          outputs=["Profiles"]),
+    Stage("Imp_RM", calc.process_AlprofIMPRM,
+          inputs=["Profiles", "Imp_RM"],
+          params=["euro_to_currency", "nima", "custom", "ExpDuties", "Al_index"],
+          outputs=["Al_profile", "Imp_RM"]),
+    Stage("BOM structure", BOMStructure,
+          inputs=["BOM"],
+          params=[],
+          outputs=["BOM_structure"]),
+    Stage("BOM", calc.process_bom,
+          inputs=["Profiles", "Imp_RM", "Shemsh", "BOM_structure"],
+          params=["DomesticRM", "Al_index"],
+          outputs=["Assembly_costs"]),
+    Stage("MH", calc.process_mh,
+          inputs=["MH", "Cost"],
+          params=[],
+          outputs=["MH"]),
+    Stage("Routing", Routing,
+          inputs=["MH"],
+          params=[],
+          outputs=["Routing"]),
+    Stage("DOM_ALL", calc.process_DOM_ALL,
+          inputs=["Assembly_costs", "Routing", "DOM_ALL", "Overrides"],
+          params=["OverHead_Rates", "OLDlaborRate", "LaborCosting"],
+          outputs=["DOM_ALL"]),
+    Stage("Pricing", price_lists,
+          inputs=["DOM_ALL", "DOM_short", "Compare", "Catalog", "Overrides"],
+          params=["method", "RepCom", "vat", "CommonPartPriceCriteria", "CommonPartCoeff", "Sales_Percent", "Target_Gross"],
+          outputs=["DOM_ALL", "DOM_short"],
+          update=reprice_lists),
+]
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+########################################################################################
+# Cost model of the aluminium profiles
+#
+# The cost of a profile is its weight (وزن) times the sum of its base fees (the columns
+# named with پايه). The fees follow commodity indices (LME aluminium...), so the model
+# keeps the profile x fee matrix weight * fee, built once per workbook, and a vector of
+# fee indices (1 = the fees of the workbook) reprices every profile with one product:
+#   model = ProfileCostModel(Al_profile)
+#   model.totals({"*": 1.05})                   # every fee 5% up
+#   model.totals(weekly)                        # weeks x fee columns -> profiles x weeks
+#   material, raw_material = model.bom_costs(structure, weekly, master_cost, DomesticRM)
+# The Al_index parameter ({fee column or "*": index}) applies the indices to the pricing.
+########################################################################################
+
+# Marker of the base fee columns of the Aluminium Profile sheet
+BASE_FEE = "پايه"
+
+
+def fee_columns(Al_profile):
+    """
+    Base fee columns of the Aluminium Profile sheet.
+    """
+    return list(Al_profile.columns[Al_profile.columns.str.contains(BASE_FEE, case=False, na=False)])
+
+
+class ProfileCostModel:
+    """
+    Profile x base fee cost matrix of the Aluminium Profile sheet.
+        frame: the sheet
+        parts: profile part numbers (rows of the matrix)
+        fees: base fee columns (columns of the matrix)
+        matrix: weight x fee, missing values count as zero like the row sum
+    """
+    def __init__(self, Al_profile):
+        self.frame = Al_profile
+        self.parts = pd.Index(Al_profile["Part No"])
+        self.fees = fee_columns(Al_profile)
+        weight = Al_profile["وزن"].to_numpy(dtype=float)
+        cost = Al_profile[self.fees].to_numpy(dtype=float) * weight[:, None]
+        self.matrix = np.where(np.isnan(cost), 0, cost)
+        self._bom = {}      # id of a BOM structure -> (structure, profile components and their cost matrix columns)
+
+    def index_matrix(self, indices=None):
+        """
+        Fee indices as a vector (fees) or a fees x periods matrix.
+        indices is None (the workbook fees), a dictionary of fee column ("*" for every
+        fee) -> index, a DataFrame of periods x fee columns or an array.
+        """
+        if indices is None:
+            return np.ones(len(self.fees))
+        if isinstance(indices, dict):
+            unknown = [fee for fee in indices if fee != "*" and fee not in self.fees]
+            if unknown:
+                raise ValueError(f"Unknown base fee columns {', '.join(map(str, unknown))}, the fees are {', '.join(self.fees)}")
+            default = float(indices.get("*", 1.0))
+            return np.array([float(indices.get(fee, default)) for fee in self.fees])
+        if isinstance(indices, pd.DataFrame):
+            return indices.reindex(columns=self.fees).fillna(1.0).to_numpy(dtype=float).T
+        return np.asarray(indices, dtype=float)
+
+    def totals(self, indices=None):
+        """
+        Cost (Total) of every profile with the fee indices, profiles x periods for a
+        series of indices.
+        """
+        index = self.index_matrix(indices)
+        if index.ndim == 1:
+            return (self.matrix * index).sum(axis=1)
+        return self.matrix @ index
+
+    def bom_costs(self, structure, indices, master_cost, DomesticRM):
+        """
+        Material Cost and Raw Material Cost of the assemblies of a bom.BOMStructure with
+        the fee indices, Series (DataFrames of assemblies x periods for a series).
+        master_cost holds the master data cost of the other sheets (Imported Raw Material,
+        Shemsh) by part number, DomesticRM the increase of the estimated material cost.
+        The roll-up with the workbook fees is the structure's, the indices then only
+        re-cost the profile columns of the cost matrix with one product. A profile whose
+        cost falls to zero switches to the estimated material cost like in the roll-up.
+        """
+        cached = self._bom.get(id(structure))
+        if cached is None or cached[0] is not structure:
+            cached = (structure,) + self._bom_matrices(structure)
+            self._bom[id(structure)] = cached
+        _, components, profiles, columns = cached
+
+        # Roll-up with the workbook fees, incremental in the structure
+        master_cost = pd.concat([pd.Series(self.matrix.sum(axis=1), index=self.parts), master_cost])
+        vector = structure.component_vector(master_cost.groupby(level=0).sum(), DomesticRM)
+        material, raw_material = structure.rollup(vector)
+        index = self.index_matrix(indices)
+        if index.ndim == 1 and (index == 1).all():
+            return material, raw_material
+
+        # Cost of the profile components with the indices (components x periods)
+        other = master_cost.iloc[len(self.parts):].groupby(level=0).sum().reindex(structure.components[components]).fillna(0)
+        if index.ndim == 1:
+            master = other.to_numpy(dtype=float) + profiles @ index
+        else:
+            master = other.to_numpy(dtype=float)[:, None] + profiles @ index
+        fallback = (master == 0) * (1 + DomesticRM / 100.0)
+        n_components = len(structure.components)
+        base_master, base_fallback = vector[components], vector[n_components + components]
+        if index.ndim > 1:
+            base_master, base_fallback = base_master[:, None], base_fallback[:, None]
+        delta = columns @ np.concatenate([master - base_master, fallback - base_fallback])
+
+        n = len(structure.parents)
+        if index.ndim == 1:
+            return material + delta[:n], raw_material + delta[n:]
+        periods = indices.index if isinstance(indices, pd.DataFrame) else None
+        material = pd.DataFrame(material.to_numpy()[:, None] + delta[:n], index=structure.parents, columns=periods)
+        raw_material = pd.DataFrame(raw_material.to_numpy()[:, None] + delta[n:], index=structure.parents, columns=periods)
+        return material, raw_material
+
+    def _bom_matrices(self, structure):
+        # Positions of the profile components in the structure, their components x fees
+        # cost and the master data and fallback columns of the cost matrix for them
+        positions = structure.components.get_indexer(self.parts)
+        found = np.flatnonzero(positions >= 0)
+        components, codes = np.unique(positions[found], return_inverse=True)
+        rows = sparse.csr_matrix((np.ones(len(found)), (codes, found)), shape=(len(components), len(self.parts)))
+        profiles = rows @ self.matrix
+        cost_matrix = structure.cost_matrix.tocsc()
+        columns = cost_matrix[:, np.concatenate([components, len(structure.components) + components])].tocsr()
+        return components, profiles, columns
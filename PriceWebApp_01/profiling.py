@@ -0,0 +1,198 @@
+import contextvars
+import cProfile
+import functools
+import json
+import logging
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+########################################################################################
+# Instrumentation of the pricing functions
+#
+# The functions decorated with @profiled record their wall time, the rows of the
+# DataFrames they receive and return, the peak traced memory and the number of
+# DataFrame copies made while they run, but only inside an active Profiler (otherwise
+# the decorator is a single check). Every record is also logged as a json line on the
+# "pricewebapp.profile" logger.
+# A Profiler is active in the thread (context) which entered it: the pricing workers of
+# several dashboard sessions can be profiled at the same time, each profiler records
+# the calls and counts the copies of its own thread only. The traced memory is that of
+# the whole process.
+#   with Profiler(dump="pricing.prof") as profiler:
+#       PricingEngine().run("Pricing.xlsx")
+#   profiler.summary()
+########################################################################################
+
+logger = logging.getLogger("pricewebapp.profile")
+
+# The active profiler of the current thread, None when not profiling
+_active = contextvars.ContextVar("pricewebapp_profiler", default=None)
+
+# DataFrame.copy is counted and tracemalloc started while at least one Profiler is active
+_lock = threading.Lock()
+_users = 0
+_copy = pd.DataFrame.copy
+_started_tracing = False
+
+
+@functools.wraps(_copy)
+def _counted_copy(frame, *args, **kwargs):
+    profiler = _active.get()
+    if profiler is not None:
+        profiler._copies += 1
+    return _copy(frame, *args, **kwargs)
+
+
+def _acquire(memory):
+    global _users, _started_tracing
+    with _lock:
+        if _users == 0:
+            pd.DataFrame.copy = _counted_copy
+        _users += 1
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+
+
+def _release():
+    global _users, _started_tracing
+    with _lock:
+        _users -= 1
+        if _users == 0:
+            pd.DataFrame.copy = _copy
+            if _started_tracing:
+                tracemalloc.stop()
+                _started_tracing = False
+
+
+def _rows(value):
+    # Rows of the DataFrames in an argument or a returned tuple
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(_rows(v) for v in value if isinstance(v, pd.DataFrame))
+    return 0
+
+
+def profiled(func=None, name=None):
+    """
+    Decorator recording the calls of func in the active Profiler.
+    """
+    if func is None:
+        return functools.partial(profiled, name=name)
+    stage = name or func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = _active.get()
+        if profiler is None:
+            return func(*args, **kwargs)
+        with profiler.track(stage) as record:
+            record["rows_in"] = _rows(args) + _rows(list(kwargs.values()))
+            result = func(*args, **kwargs)
+            record["rows_out"] = _rows(result)
+        return result
+    return wrapper
+
+
+class Profiler:
+    """
+    Context manager collecting the records of the @profiled functions.
+        memory: trace the peak memory with tracemalloc (slows the run down)
+        dump: optional path of a profile of the whole block, a cProfile stats file
+            (tool="cprofile", read with pstats) or a pyinstrument html report
+            (tool="pyinstrument", requires the pyinstrument package)
+    """
+    def __init__(self, memory=True, dump=None, tool="cprofile"):
+        self.memory = memory
+        self.dump = dump
+        self.tool = tool
+        self.records = []
+        self._stack = []
+        self._copies = 0
+
+    def __enter__(self):
+        if _active.get() is not None:
+            raise RuntimeError("A Profiler is already active in this thread")
+        self._token = _active.set(self)
+        _acquire(self.memory)
+
+        self._tool = None
+        if self.dump and self.tool == "pyinstrument":
+            from pyinstrument import Profiler as Instrument
+            self._tool = Instrument()
+            self._tool.start()
+        elif self.dump:
+            self._tool = cProfile.Profile()
+            self._tool.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self._tool is not None and self.tool == "pyinstrument":
+            self._tool.stop()
+            with open(self.dump, "w", encoding="utf-8") as f:
+                f.write(self._tool.output_html())
+        elif self._tool is not None:
+            self._tool.disable()
+            self._tool.dump_stats(self.dump)
+        _release()
+        _active.reset(self._token)
+        return False
+
+    def track(self, stage):
+        """
+        Context manager recording one call of stage, yields the record.
+        """
+        return _Track(self, stage)
+
+    def summary(self):
+        """
+        One row per stage: calls, total seconds, rows in and out of the last call,
+        highest peak memory (MB) and DataFrame copies.
+        """
+        columns = ["stage", "calls", "seconds", "rows_in", "rows_out", "peak_mb", "copies"]
+        if not self.records:
+            return pd.DataFrame(columns=columns)
+        records = pd.DataFrame(self.records)
+        summary = records.groupby("stage", sort=False).agg(
+            calls=("seconds", "size"), seconds=("seconds", "sum"), rows_in=("rows_in", "last"),
+            rows_out=("rows_out", "last"), peak_mb=("peak_mb", "max"), copies=("copies", "sum"))
+        return summary.reset_index()[columns]
+
+
+class _Track:
+    # One call of a stage, nested calls are included in the outer record
+    def __init__(self, profiler, stage):
+        self.profiler = profiler
+        self.record = {"stage": stage, "depth": len(profiler._stack), "rows_in": 0, "rows_out": 0}
+
+    def __enter__(self):
+        profiler = self.profiler
+        if profiler.memory and profiler._stack:
+            # Keep the peak of the outer call before resetting it for this one
+            outer = profiler._stack[-1]
+            outer.peak = max(outer.peak, tracemalloc.get_traced_memory()[1])
+        if profiler.memory:
+            tracemalloc.reset_peak()
+        self.peak = 0
+        self.copies = profiler._copies
+        profiler._stack.append(self)
+        self.start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *exc):
+        profiler = self.profiler
+        self.record["seconds"] = time.perf_counter() - self.start
+        profiler._stack.pop()
+        if profiler.memory:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            if profiler._stack:
+                profiler._stack[-1].peak = max(profiler._stack[-1].peak, self.peak)
+        self.record["peak_mb"] = self.peak / 2**20 if profiler.memory else None
+        self.record["copies"] = profiler._copies - self.copies
+        profiler.records.append(self.record)
+        logger.info(json.dumps(self.record))
+        return False
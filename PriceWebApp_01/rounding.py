@@ -0,0 +1,78 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+########################################################################################
+# Rounding policies of the prices
+#
+# A policy is a table of thresholds and steps: a value below thresholds[i] (and not
+# below a previous threshold) is rounded up to a multiple of steps[i], values above
+# the last threshold to a multiple of the last step. The tier of every value is found
+# with one searchsorted over the thresholds, so whole columns are rounded at once.
+#
+# The policies can be changed without code edits with a json file (rounding.json next
+# to this file or the path in PRICEWEBAPP_ROUNDING):
+#   {"Base Price": {"thresholds": [], "steps": [10000]}, ...}
+########################################################################################
+
+class RoundingPolicy:
+    """
+    Tiered ceiling rounding, steps has one more entry than thresholds.
+    """
+    def __init__(self, thresholds, steps):
+        if len(steps) != len(thresholds) + 1:
+            raise ValueError("A rounding policy needs one more step than thresholds")
+        self.thresholds = np.asarray(thresholds, dtype=float)
+        self.steps = np.asarray(steps, dtype=float)
+
+    def __call__(self, values, by=None):
+        """
+        Rounds up values to the step of their tier.
+        by optionally gives the values choosing the tier (e.g. Finished Cost) when
+        it is not the rounded value itself.
+        """
+        x = np.asarray(values, dtype=float)
+        step = self.step(x if by is None else by)
+        rounded = np.ceil(x / step) * step
+        if isinstance(values, pd.Series):
+            return pd.Series(rounded, index=values.index, name=values.name)
+        return rounded
+
+    def step(self, by):
+        """
+        Step of the tier of every value of by.
+        """
+        return self.steps[np.searchsorted(self.thresholds, np.asarray(by, dtype=float), side='right')]
+
+    def to_dict(self):
+        return {"thresholds": self.thresholds.tolist(), "steps": self.steps.tolist()}
+
+
+DEFAULT_POLICIES = {
+    # Final Domestic Cost of the imported raw materials
+    "Imported Raw Material": RoundingPolicy([200, 1000, 5000, 20000, 100000], [10, 50, 100, 500, 1000, 5000]),
+    # Base Price Including VAT (IRR)
+    "Base Price": RoundingPolicy([], [10000]),
+    # Common parts, the threshold is the Price Criteria for Rounding Common Parts of the sidebar
+    "Common Parts": RoundingPolicy([900000], [5000, 100000]),
+    # End-User, Electrical Shops and Wholesales prices
+    "Side Prices": RoundingPolicy([300000], [5000, 10000]),
+}
+
+
+def load_policies(path=None):
+    """
+    Returns the default policies updated with the policies of the json file.
+    """
+    path = path or os.environ.get("PRICEWEBAPP_ROUNDING", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rounding.json"))
+    policies = dict(DEFAULT_POLICIES)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for name, policy in json.load(f).items():
+                policies[name] = RoundingPolicy(policy.get("thresholds", []), policy["steps"])
+    return policies
+
+
+ROUNDING_POLICIES = load_policies()
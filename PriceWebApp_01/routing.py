@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+from catalog import take
+
+########################################################################################
+# Labor cost of the routing lines (MH sheet) per part and per cost center
+#
+# The routing lines are interned once per workbook as integer codes of their PART_NO
+# and Cost Center, and the man hours and the labor cost at the Est Labor Cost of the
+# cost centers are summed per part and per center with np.bincount. Nothing here
+# depends on the sidebar parameters, so the pipeline builds it once (Routing stage) and
+# the labor rate or the costing method only scale the precomputed sums:
+#   - Labor Rate:  Man_Hour * OLDlaborRate (the historical costing)
+#   - Cost Center: Man_Hour * mean rate of the cost centers of the part (weighted by
+#                  their man hours), OLDlaborRate for the lines without a center rate
+########################################################################################
+
+LABOR_COSTING = ["Labor Rate", "Cost Center"]
+
+
+class Routing:
+    """
+    Man hours and center rated labor cost of the MH lines (process_mh) per part.
+        parts: part numbers of the lines (PART_NO)
+        centers: cost centers of the lines
+        man_hours: man hours per part
+        rated_hours / rated_cost: man hours and labor cost of the lines whose cost
+            center has an Est Labor Cost, per part
+    """
+    def __init__(self, MH):
+        part_codes, parts = pd.factorize(MH['PART_NO'])
+        center_codes, centers = pd.factorize(MH['Cost Center'], sort=True)
+        self.parts = pd.Index(parts)
+        self.centers = pd.Index(centers)
+
+        # Missing man hours count as zero, like the groupby sum
+        hours = MH['Man_Hour'].to_numpy(dtype=float)
+        hours = np.where(np.isnan(hours), 0, hours)
+        if 'Est Labor Cost' in MH:
+            line_rates = pd.to_numeric(MH['Est Labor Cost'], errors='coerce').to_numpy(dtype=float)
+        else:
+            line_rates = np.full(len(MH), np.nan)
+        rated = ~np.isnan(line_rates)
+
+        # Lines without a part number are not costed
+        lines = part_codes >= 0
+        self.part_codes = part_codes[lines]
+        self.center_codes = center_codes[lines]
+        self.hours = hours[lines]
+        self.line_rates = line_rates[lines]
+        self.rated = rated[lines]
+
+        n = len(self.parts)
+        self.man_hours = np.bincount(self.part_codes, weights=self.hours, minlength=n)
+        self.rated_hours = np.bincount(self.part_codes, weights=np.where(self.rated, self.hours, 0), minlength=n)
+        self.rated_cost = np.bincount(self.part_codes, weights=np.where(self.rated, self.hours * np.nan_to_num(self.line_rates), 0), minlength=n)
+
+    def positions(self, part_no):
+        """
+        Position of each part number in parts, -1 for the parts without routing lines.
+        """
+        return self.parts.get_indexer(part_no)
+
+    def labor_rates(self, positions, OLDlaborRate):
+        """
+        Labor cost per man hour of the parts at positions with the cost center rates.
+        OLDlaborRate is a number or a row vector (one rate per scenario), the result
+        is then parts x scenarios.
+        """
+        rate = np.asarray(OLDlaborRate, dtype=float)
+        hours, rated_hours, rated_cost = (take(values, positions).astype(float)
+                                          for values in (self.man_hours, self.rated_hours, self.rated_cost))
+        if rate.ndim:
+            hours, rated_hours, rated_cost = hours[:, None], rated_hours[:, None], rated_cost[:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = (rated_cost + (hours - rated_hours) * rate) / hours
+        return np.where(hours > 0, mean, rate)
+
+    def center_costs(self, OLDlaborRate):
+        """
+        Man hours and labor cost at the labor rate (-OLD) and at the center rate (-NEW)
+        per cost center, with their difference.
+        """
+        valid = self.center_codes >= 0
+        codes, hours = self.center_codes[valid], self.hours[valid]
+        new_cost = hours * np.where(self.rated[valid], self.line_rates[valid], OLDlaborRate)
+        man_hours = np.bincount(codes, weights=hours, minlength=len(self.centers))
+        costs = pd.DataFrame({
+            'Man_Hour': man_hours,
+            'Labor Cost -OLD': man_hours * OLDlaborRate,
+            'Labor Cost -NEW': np.bincount(codes, weights=new_cost, minlength=len(self.centers)),
+        }, index=pd.Index(self.centers, name='Cost Center'))
+        costs['Diff'] = costs['Labor Cost -NEW'] - costs['Labor Cost -OLD']
+        return costs
@@ -0,0 +1,195 @@
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+from channels import BASE_PRICE, CHANNELS
+from memory import parquet_frame
+
+########################################################################################
+# Versioned store of pricing runs
+#
+# A saved run is a folder of RUNS_DIR holding the priced lists as Parquet files and
+# run.json with the full parameter set, the workbook hash and the save time:
+#   run_id = save_run(results, engine.params, key, name="October")
+#   diff_runs(last_month, run_id)
+# The diff only reads the part numbers and the compared columns of the two runs and
+# aligns the parts through their integer codes, so it does not depend on the number
+# of saved runs. From the command line:
+#   python runs.py list
+#   python runs.py diff 20260901-101500-123456-3f2a 20261001-093000-654321-3f2a --out diff.csv
+########################################################################################
+
+RUNS_DIR = os.environ.get("PRICEWEBAPP_RUNS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "runs"))
+
+# Lists saved with a run
+LISTS = ["DOM_ALL", "DOM_short"]
+
+# Columns compared by diff_runs: the prices of every channel, the cost and the gross margin
+DIFF_COLUMNS = [BASE_PRICE] + [channel.column for channel in CHANNELS] + ["Finished Cost", "New_Gross"]
+
+# Compared columns which are percentages, their change is in points
+MARGIN_COLUMNS = ["New_Gross"]
+
+
+def save_run(results, params, key=None, name=None, runs_dir=RUNS_DIR):
+    """
+    Saves the priced lists of an engine.PricingResults with its parameters.
+    key is the workbook hash, name an optional label. Returns the run id.
+    """
+    created = datetime.datetime.now()
+    run_id = created.strftime("%Y%m%d-%H%M%S-%f") + (f"-{key[:4]}" if key else "")
+    folder = os.path.join(runs_dir, run_id)
+    tmp_folder = f"{folder}.{os.getpid()}.tmp"
+    os.makedirs(tmp_folder, exist_ok=True)
+    try:
+        for list_name in LISTS:
+            parquet_frame(results.frames[list_name]).to_parquet(os.path.join(tmp_folder, f"{list_name}.parquet"), index=False)
+        info = {"id": run_id, "name": name or run_id, "created": created.isoformat(timespec="seconds"),
+                "workbook": key, "params": params}
+        with open(os.path.join(tmp_folder, "run.json"), "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_folder, folder)
+    except Exception:
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+        raise
+    return run_id
+
+
+def run_info(run_id, runs_dir=RUNS_DIR):
+    """
+    Metadata of a run: id, name, created, workbook and params.
+    """
+    with open(os.path.join(runs_dir, run_id, "run.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_runs(runs_dir=RUNS_DIR):
+    """
+    The saved runs, oldest first (id, name, created, workbook).
+    """
+    runs = []
+    if os.path.isdir(runs_dir):
+        for run_id in os.listdir(runs_dir):
+            if os.path.exists(os.path.join(runs_dir, run_id, "run.json")):
+                info = run_info(run_id, runs_dir)
+                runs.append({column: info[column] for column in ("id", "name", "created", "workbook")})
+    return pd.DataFrame(runs, columns=["id", "name", "created", "workbook"]).sort_values(["created", "id"], ignore_index=True)
+
+
+def load_run(run_id, list_name="DOM_ALL", columns=None, runs_dir=RUNS_DIR):
+    """
+    A priced list of a run, only the given columns (and Part No.) when columns is given.
+    """
+    if columns is not None:
+        columns = ["Part No."] + [column for column in columns if column != "Part No."]
+    return pd.read_parquet(os.path.join(runs_dir, run_id, f"{list_name}.parquet"), columns=columns)
+
+
+def _read_columns(run_id, list_name, columns, runs_dir):
+    # Part numbers and the columns of the run which exist, NaN for the others
+    path = os.path.join(runs_dir, run_id, f"{list_name}.parquet")
+    available = set(pd.read_parquet(path, columns=[]).columns) | set(_schema_names(path))
+    frame = pd.read_parquet(path, columns=["Part No."] + [column for column in columns if column in available])
+    for column in columns:
+        if column not in frame:
+            frame[column] = np.nan
+    return frame
+
+
+def _schema_names(path):
+    import pyarrow.parquet as pq
+    return pq.read_schema(path).names
+
+
+def diff_runs(old_id, new_id, list_name="DOM_ALL", columns=DIFF_COLUMNS, only_changed=False, runs_dir=RUNS_DIR):
+    """
+    Per part changes between two runs. For every column: the old and new values and
+    the change (in points for the gross margin, with the change in % for the others).
+    Status is "added" / "removed" for the parts of only one run, else "changed" or
+    "same". only_changed keeps the parts which are not "same".
+    """
+    old = _read_columns(old_id, list_name, columns, runs_dir)
+    new = _read_columns(new_id, list_name, columns, runs_dir)
+
+    # Parts of both runs, in the order of the new run then the removed ones, the part
+    # numbers are interned once as integer codes and aligned with position arrays
+    old_parts, new_parts = old["Part No."].astype(str), new["Part No."].astype(str)
+    if old_parts.equals(new_parts):
+        parts = new_parts.to_numpy()
+        old_rows = new_rows = np.arange(len(parts))
+    else:
+        codes, uniques = pd.factorize(pd.concat([old_parts, new_parts], ignore_index=True))
+        old_codes, new_codes = codes[:len(old_parts)], codes[len(old_parts):]
+        old_position, new_position = np.full(len(uniques), -1), np.full(len(uniques), -1)
+        old_position[old_codes] = np.arange(len(old_codes))
+        new_position[new_codes] = np.arange(len(new_codes))
+        part_codes = np.concatenate([new_codes, old_codes[new_position[old_codes] < 0]])
+        parts = np.asarray(uniques)[part_codes]
+        old_rows, new_rows = old_position[part_codes], new_position[part_codes]
+
+    diff = {"Part No.": parts}
+    changed = np.zeros(len(parts), dtype=bool)
+    for column in columns:
+        before = _aligned(old[column], old_rows)
+        after = _aligned(new[column], new_rows)
+        with np.errstate(invalid="ignore"):
+            change = after - before
+        diff[f"{column} old"] = before
+        diff[f"{column} new"] = after
+        diff[f"{column} change"] = change
+        if column not in MARGIN_COLUMNS:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                diff[f"{column} change (%)"] = np.where(before != 0, change / np.abs(before) * 100, np.nan)
+        changed |= ~((before == after) | (np.isnan(before) & np.isnan(after)))
+
+    status = np.where(old_rows < 0, "added", np.where(new_rows < 0, "removed", np.where(changed, "changed", "same")))
+    diff = pd.DataFrame(diff)
+    diff.insert(1, "Status", status)
+    if only_changed:
+        diff = diff[status != "same"].reset_index(drop=True)
+    return diff
+
+
+def _aligned(values, rows):
+    # values at rows as floats, NaN where the row is -1 (part not in the run)
+    values = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+    aligned = values[np.where(rows >= 0, rows, 0)] if len(values) else np.full(len(rows), np.nan)
+    aligned[rows < 0] = np.nan
+    return aligned
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List the saved pricing runs or compare two of them.")
+    parser.add_argument("--runs-dir", default=RUNS_DIR, help="Folder of the saved runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="List the saved runs")
+    diff = commands.add_parser("diff", help="Per part price changes between two runs")
+    diff.add_argument("old", help="Id of the older run")
+    diff.add_argument("new", help="Id of the newer run")
+    diff.add_argument("--list", default="DOM_ALL", choices=LISTS, help="Price list compared (default: DOM_ALL)")
+    diff.add_argument("--all", action="store_true", help="Also list the parts without change")
+    diff.add_argument("--out", help="Write the diff to this csv file")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        print(list_runs(args.runs_dir).to_string(index=False))
+        return 0
+
+    result = diff_runs(args.old, args.new, args.list, only_changed=not args.all, runs_dir=args.runs_dir)
+    print(result["Status"].value_counts().to_string())
+    if args.out:
+        result.to_csv(args.out, index=False)
+        print(f"Written {args.out}")
+    else:
+        print(result.head(20).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import calculations_v2 as calc
+import pipeline as pipe
+from bom import BOMStructure
+from catalog import Catalog
+from engine import merge_params
+from overrides import Overrides
+from profiles import ProfileCostModel
+from routing import Routing
+
+########################################################################################
+# What-if pricing over many parameter sets
+#
+# The cost chain (Imported Raw Material -> BOM -> Finished Cost) is evaluated for all
+# scenarios at once: every cost column becomes a parts x scenarios array and the BOM
+# roll-up is one sparse matrix x matrix product. Pricing (base price, compare and side
+# prices) then runs per scenario, in a process pool for large sweeps.
+#   scenarios = scenario_grid(nima=[650000, 680000, 710000], **{"OverHead_Rates.MOH": [1.0, 1.2]})
+#   scenarios = scenario_grid(**{"Al_index.*": [0.95, 1.0, 1.05]})     # aluminium prices
+#   results = run_scenarios(frames, scenarios)
+#   results.summary()
+########################################################################################
+
+# Sweeps with more scenarios than this are priced in a process pool
+POOL_THRESHOLD = 50
+
+
+def scenario_grid(**axes):
+    """
+    All the combinations of the given parameter values, rates inside a dictionary
+    parameter are given with a dotted name (e.g. "euro_to_currency.USD").
+    Returns a list of parameter overrides, one per scenario.
+    """
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+
+def scenario_params(base_params, overrides):
+    """
+    Full parameter set of a scenario: base parameters updated with the overrides.
+    """
+    params = merge_params(base_params)
+    for name, value in overrides.items():
+        if "." in name:
+            group, key = name.split(".", 1)
+            params[group][key] = value
+        else:
+            params[name] = value
+    return params
+
+
+def _scenario_rates(scenarios, group, names):
+    # parameter group x scenarios array of the rates
+    return np.array([[params[group].get(name, np.nan) for params in scenarios] for name in names], dtype=float)
+
+
+def _scenario_values(scenarios, name):
+    return np.array([params[name] for params in scenarios], dtype=float)
+
+########################################################################################
+def imported_cost(Imp_RM, scenarios):
+    """
+    Final Domestic Cost of the imported raw materials, parts x scenarios.
+    The same steps as process_AlprofIMPRM with the rates as row vectors.
+    """
+    currency_codes, currencies = pd.factorize(Imp_RM["Currency"])
+    currency_to_euro = 1 / _scenario_rates(scenarios, "euro_to_currency", currencies)
+    currency_to_euro = np.vstack([currency_to_euro, np.full(len(scenarios), np.nan)])  # unknown currency
+    usd = _scenario_rates(scenarios, "euro_to_currency", ["USD"])[0]
+    nima = _scenario_values(scenarios, "nima")
+    custom = _scenario_values(scenarios, "custom")
+
+    cost = Imp_RM["Cost"].to_numpy(dtype=float)[:, None]
+    euro_cost = cost * currency_to_euro[currency_codes]
+    meg_cost = Imp_RM["MEG Commission Percentage"].to_numpy(dtype=float)[:, None] * euro_cost + euro_cost
+    vsg_cost = Imp_RM["VS.G Commission Percentage"].to_numpy(dtype=float)[:, None] * meg_cost + meg_cost
+    irr_cost = vsg_cost * usd * nima
+    duties = vsg_cost * usd * Imp_RM["Tariff Percentage"].to_numpy(dtype=float)[:, None] * custom
+    return calc.custom_round(duties + irr_cost)
+
+
+def finished_cost(frames, scenarios, structure=None):
+    """
+    Finished Cost of DOM_ALL for every scenario, parts x scenarios.
+    frames are the workbook frames (engine.PricingEngine.load), scenarios full
+    parameter sets (scenario_params).
+    """
+    base = scenarios[0]
+    profile_model = ProfileCostModel(frames["Al_profile"])
+    Al_profile, Imp_RM = calc.process_AlprofIMPRM(profile_model, frames["Imp_RM"], base["euro_to_currency"], base["nima"],
+                                                  base["custom"], base["ExpDuties"], base["Al_index"])
+    structure = structure or BOMStructure(frames["BOM"])
+    routing = Routing(calc.process_mh(frames["MH"], frames["Cost"]))
+    # Man hours and the other scenario independent columns
+    overrides = Overrides(frames["DOM_ALL"], frames["DOM_short"], frames.get("Rules"))
+    DOM_ALL = calc.process_DOM_ALL(calc.process_bom(Al_profile, Imp_RM, frames["Shemsh"], structure, base["DomesticRM"]),
+                                   routing, frames["DOM_ALL"], overrides, base["OverHead_Rates"], base["OLDlaborRate"])
+
+    # Component costs, components x scenarios
+    n = len(scenarios)
+    imported = imported_cost(Imp_RM, scenarios)
+    indices = np.column_stack([profile_model.index_matrix(params["Al_index"]) for params in scenarios])
+    domestic = _scenario_values(scenarios, "DomesticRM")
+    n_parents = len(structure.parents)
+    if np.array_equal(imported, imported[:, :1].repeat(n, axis=1), equal_nan=True) and (domestic == domestic[0]).all():
+        # Only the aluminium fee indices change, the profile columns are re-costed
+        master_cost = pd.concat([pd.Series(imported[:, 0], index=Imp_RM["Part No"]),
+                                 frames["Shemsh"].set_index("Part No")["Est Mtr Cost"]])
+        material, raw_material = profile_model.bom_costs(structure, indices, master_cost, domestic[0])
+        rollup = np.vstack([material.to_numpy(), raw_material.to_numpy()])
+    else:
+        # Profiles of every scenario with one product of the profile x fee matrix and the fee indices
+        profiles = pd.DataFrame(profile_model.totals(indices), index=Al_profile["Part No"])
+        imported = pd.DataFrame(imported, index=Imp_RM["Part No"])
+        shemsh = pd.DataFrame(np.repeat(frames["Shemsh"]["Est Mtr Cost"].to_numpy(dtype=float)[:, None], n, axis=1), index=frames["Shemsh"]["Part No"])
+        master = pd.concat([profiles, imported, shemsh]).groupby(level=0).sum()
+        master = master.reindex(structure.components).fillna(0).to_numpy()
+        fallback = (master == 0) * (1 + domestic / 100.0)
+
+        # Roll up of all scenarios with one sparse product
+        rollup = structure.cost_matrix @ np.vstack([master, fallback])
+    positions = structure.parents.get_indexer(DOM_ALL["Part No."])
+    found = (positions >= 0)[:, None]
+    material = np.where(found, rollup[:n_parents][positions], np.nan)
+    raw_material = np.where(found & structure.has_rm[positions][:, None], rollup[n_parents:][positions], np.nan)
+
+    # Labor and overheads, the same formulas as process_DOM_ALL
+    man_hour = DOM_ALL["Man_Hour"].to_numpy(dtype=float)[:, None]
+    rates = _scenario_rates(scenarios, "OverHead_Rates", ["MOH", "LAB", "LABSU1", "LABSU2"])
+    labor_rates = _scenario_values(scenarios, "OLDlaborRate")
+    per_center = np.array([params["LaborCosting"] == "Cost Center" for params in scenarios])
+    if per_center.any():
+        center_rates = routing.labor_rates(routing.positions(DOM_ALL["Part No."]), labor_rates)
+        labor_rates = np.where(per_center, center_rates, labor_rates)
+    labor = man_hour * labor_rates
+    moh = raw_material * rates[0] / 100
+    moh = overrides.all.apply_values("MOH", "MOH", moh, DOM_ALL)
+    lab = man_hour * rates[1] + rates[3] * rates[1] * man_hour / 100 + labor * rates[2] / 100
+    overhead = DOM_ALL["Depr."].to_numpy(dtype=float)[:, None] + DOM_ALL["Machin"].to_numpy(dtype=float)[:, None] + lab + moh
+    return DOM_ALL, material + overhead + labor
+
+########################################################################################
+PRICE_COLUMNS = ["Base Price Including VAT (IRR)", "New_Gross", "End-User Price Including VAT (IRR)",
+                 "Electrical Shops (IRR)", "Wholesales Price Including VAT (IRR)",
+                 "End-User Turkey Price (IRR)", "End-User Iraq Armenia Afghanistan Price (IRR)"]
+
+
+def _price_scenarios(DOM_ALL, DOM_short, Compare, scenarios, costs, Rules=None):
+    """
+    Prices DOM_ALL with the Finished Cost of each scenario.
+    Rules is the optional Rules sheet of the workbook.
+    Returns one parts x scenarios array per price column.
+    """
+    columns = {name: np.empty_like(costs) for name in PRICE_COLUMNS}
+    catalog = Catalog(DOM_ALL, DOM_short, Compare)
+    overrides = Overrides(DOM_ALL, DOM_short, Rules)
+    for i, params in enumerate(scenarios):
+        DOM_ALL["Finished Cost"] = costs[:, i]
+        priced, _ = pipe.price_lists(DOM_ALL, DOM_short, Compare, catalog, overrides, params["method"], params["RepCom"], params["vat"],
+                                     params["CommonPartPriceCriteria"], params["CommonPartCoeff"], params["Sales_Percent"],
+                                     params.get("Target_Gross"))
+        for name in PRICE_COLUMNS:
+            columns[name][:, i] = priced[name].to_numpy(dtype=float)
+    return columns
+
+
+class ScenarioResults:
+    """
+    Per scenario parameters and parts x scenarios frames of the Finished Cost and prices.
+    """
+    def __init__(self, scenarios, overrides, part_no, costs, prices):
+        self.params = scenarios
+        self.scenarios = pd.DataFrame(overrides)
+        self.finished_cost = pd.DataFrame(costs, index=part_no)
+        self.prices = {name: pd.DataFrame(values, index=part_no) for name, values in prices.items()}
+
+    @property
+    def base_price(self):
+        return self.prices["Base Price Including VAT (IRR)"]
+
+    @property
+    def new_gross(self):
+        return self.prices["New_Gross"]
+
+    def summary(self):
+        """
+        One row per scenario: the overrides, total Finished Cost, mean base price and
+        the distribution of New_Gross over the parts.
+        """
+        gross = self.new_gross.replace([np.inf, -np.inf], np.nan)
+        summary = self.scenarios.copy()
+        summary["Total Finished Cost"] = self.finished_cost.sum().to_numpy()
+        summary["Mean Base Price"] = self.base_price.mean().to_numpy()
+        summary["New_Gross Mean"] = gross.mean().to_numpy()
+        for q in (0.1, 0.5, 0.9):
+            summary[f"New_Gross P{int(q * 100)}"] = gross.quantile(q).to_numpy()
+        return summary
+
+
+def run_scenarios(frames, overrides, base_params=None, DOM_short=None, processes=None):
+    """
+    Evaluates every scenario of overrides (list of parameter overrides, e.g. from
+    scenario_grid) on the workbook frames. DOM_short optionally replaces the workbook
+    short list (e.g. with the edits of a session). Sweeps larger than POOL_THRESHOLD
+    are priced in a pool of processes (default: all cores).
+    """
+    scenarios = [scenario_params(base_params, o) for o in overrides]
+    DOM_ALL, costs = finished_cost(frames, scenarios)
+    DOM_short = frames["DOM_short"] if DOM_short is None else DOM_short
+
+    # Only the columns used by pricing are sent to the workers
+    columns = ["Price List Type", "Part No.", "Base Part", "Product Family", "Model", " Old Base Prices (IRR)",
+               "Old Finished Cost With Comp.", "Finished Cost"]
+    DOM_ALL = DOM_ALL[[column for column in columns if column in DOM_ALL]].copy()
+
+    if len(scenarios) <= POOL_THRESHOLD:
+        prices = _price_scenarios(DOM_ALL, DOM_short, frames["Compare"], scenarios, costs, frames.get("Rules"))
+    else:
+        processes = processes or os.cpu_count()
+        chunks = np.array_split(np.arange(len(scenarios)), processes)
+        with ProcessPoolExecutor(processes) as pool:
+            futures = [pool.submit(_price_scenarios, DOM_ALL, DOM_short, frames["Compare"],
+                                   [scenarios[i] for i in chunk], costs[:, chunk], frames.get("Rules")) for chunk in chunks if len(chunk)]
+            parts = [future.result() for future in futures]
+        prices = {name: np.hstack([part[name] for part in parts]) for name in PRICE_COLUMNS}
+
+    return ScenarioResults(scenarios, overrides, DOM_ALL["Part No."], costs, prices)
@@ -0,0 +1,242 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from bom import explode_bom
+from compare_rules import compare_levels
+from memory import part_numbers
+from overrides import RULE_COLUMNS, RULES, CompiledRules, Rule
+
+########################################################################################
+# Layout of the workbook sheets, checked and coerced when a workbook is loaded
+#
+# Every sheet declares its required columns, the numeric and part number columns and
+# its key (unique part numbers). validate_frames checks all the sheets in one pass:
+#   - headers are matched ignoring case and spaces and renamed to the names used by
+#     the calculations ('SETUP TIME ' -> ' SETUP TIME', 'old base prices (irr)' ->
+#     ' Old Base Prices (IRR)')
+#   - part number columns become strings, numbers stored as text become numbers
+#   - missing columns, duplicated keys and text in numeric columns raise a SchemaError
+#     listing every problem with its sheet, column and Excel rows, so a bad workbook
+#     fails when it is loaded and not in the middle of the pricing
+# The editable columns of Dom-Short are lenient: text there becomes NaN with a warning.
+# A BOM sheet with PARENT PART NO in place of TOP LEVEL PART NO is a single level BOM,
+# it is checked with its own layout and exploded to the flattened layout (bom.py).
+########################################################################################
+
+# Rows listed per problem in the report
+MAX_ROWS = 10
+
+
+class Sheet:
+    """
+    Declared layout of a sheet.
+        name: sheet name in the workbook (for the report)
+        required: columns the calculations read
+        numeric: required columns holding numbers
+        lenient: numeric columns where text becomes NaN with a warning instead of an error
+        parts: part number columns (required or not)
+        key: column whose values must be unique
+        checks: functions of the coerced frame returning a list of problems
+    """
+    def __init__(self, name, required, numeric=(), lenient=(), parts=(), key=None, checks=()):
+        self.name = name
+        self.required = list(required)
+        self.numeric = list(numeric)
+        self.lenient = list(lenient)
+        self.parts = list(parts)
+        self.key = key
+        self.checks = list(checks)
+
+    @property
+    def columns(self):
+        return list(dict.fromkeys(self.required + self.numeric + self.lenient + self.parts))
+
+
+class SchemaError(ValueError):
+    """
+    The workbook does not match the declared layout, problems lists the errors.
+    """
+    def __init__(self, problems):
+        self.problems = problems
+        lines = [f"{p['sheet']} '{p['column']}': {p['problem']}" for p in problems]
+        super().__init__("The workbook does not match the expected layout:\n" + "\n".join(lines))
+
+    def report(self):
+        """
+        Problems as a table of sheet, column, problem, count and Excel rows.
+        """
+        return pd.DataFrame(self.problems, columns=["sheet", "column", "problem", "count", "rows"])
+
+
+def _problem(sheet, column, problem, rows=()):
+    # Excel rows of the frame rows: the header is row 1
+    rows = np.asarray(rows)
+    excel_rows = ", ".join(str(row + 2) for row in rows[:MAX_ROWS]) + (" ..." if len(rows) > MAX_ROWS else "")
+    return {"sheet": sheet.name, "column": column, "problem": problem, "count": len(rows), "rows": excel_rows}
+
+
+def _normal(name):
+    return " ".join(str(name).split()).casefold()
+
+
+def normalize_headers(frame, columns):
+    """
+    frame with the headers equal to one of columns ignoring case and spaces renamed
+    to that column.
+    """
+    names = {_normal(column): column for column in columns}
+    renames = {header: names[_normal(header)] for header in frame.columns
+               if _normal(header) in names and header != names[_normal(header)] and names[_normal(header)] not in frame}
+    return frame.rename(columns=renames) if renames else frame
+
+
+def _numbers(column):
+    # Numbers of a column, text is parsed ignoring spaces and thousands separators
+    if column.dtype.kind in "biuf":
+        return column
+    text = column.astype(object).where(column.notna()).astype(str).str.replace(",", "", regex=False).str.strip()
+    return pd.to_numeric(text.where(column.notna() & (text != "")), errors="coerce")
+
+
+def validate_sheet(frame, sheet):
+    """
+    Checks and coerces one sheet. Returns the coerced frame, the errors and the warnings.
+    """
+    frame = normalize_headers(frame, sheet.columns)
+    errors, notes = [], []
+    for column in sheet.required:
+        if column not in frame:
+            errors.append(_problem(sheet, column, "missing column"))
+
+    columns = {}
+    for column in sheet.numeric + sheet.lenient:
+        if column not in frame:
+            continue
+        values = frame[column]
+        numbers = _numbers(values)
+        if numbers is values:
+            continue
+        text = numbers.isna() & values.notna() & (values.astype(object).astype(str).str.strip() != "")
+        if text.any():
+            problem = f"text in a numeric column ({', '.join(map(str, values[text].unique()[:3]))})"
+            (notes if column in sheet.lenient else errors).append(_problem(sheet, column, problem, np.flatnonzero(text)))
+        columns[column] = numbers
+    for column in sheet.parts:
+        if column in frame and not isinstance(frame[column].dtype, pd.StringDtype):
+            columns[column] = part_numbers(frame[column])
+    if columns:
+        frame = frame.assign(**columns)
+
+    if sheet.key in frame:
+        duplicated = frame[sheet.key].duplicated(keep=False) & frame[sheet.key].notna()
+        if duplicated.any():
+            values = frame.loc[duplicated, sheet.key].unique()
+            problem = f"{len(values)} duplicated values ({', '.join(map(str, values[:3]))})"
+            errors.append(_problem(sheet, sheet.key, problem, np.flatnonzero(duplicated)))
+    if not errors:
+        for check in sheet.checks:
+            errors.extend(check(frame, sheet))
+    return frame, errors, notes
+
+
+def _copy_sources(frame, sheet):
+    # The copy_row rules (man hours of the Galaxy parts) read the row of a source part
+    rules = CompiledRules(frame, [rule for rule in RULES if rule.action == 'copy_row'])
+    return [_problem(sheet, rule.column, f"{', '.join(rule.values)} need the {rule.column} of part {rule.value}, "
+                                         f"which is not in the sheet", rows)
+            for rule, rows, source in zip(rules.rules, rules.rows, rules.sources) if len(rows) and source < 0]
+
+
+def _compare_cycles(frame, sheet):
+    # The super components of the Compare rows resolve in order (compare_rules.CompareGraph)
+    parts = pd.Index(frame['Component Part 1'])
+
+    def rows_of(column):
+        return np.where(frame[column].notna(), parts.get_indexer(frame[column]), -1)
+
+    cycle = compare_levels(rows_of('Super Component 1'), rows_of('Component Part 2'))[1]
+    if not len(cycle):
+        return []
+    problem = f"cycle of super components ({', '.join(map(str, parts[cycle][:3]))})"
+    return [_problem(sheet, 'Super Component 1', problem, cycle)]
+
+
+def _rules(frame, sheet):
+    # Every row of the Rules sheet is a valid rule
+    problems = []
+    for row, values in enumerate(frame.to_dict("records")):
+        try:
+            Rule(**{column: values.get(column) for column in RULE_COLUMNS})
+        except ValueError as e:
+            problems.append(_problem(sheet, "Step / Action", str(e), [row]))
+    return problems
+
+
+# Layout of the sheets, keyed by the variable names of input_df
+SCHEMAS = {
+    "Cost": Sheet("Cost Centers", ["Cost Center"]),
+    "Al_profile": Sheet("Aluminium Profile", ["Part No", "وزن"], numeric=["وزن"], parts=["Part No"]),
+    "Imp_RM": Sheet("IMP", ["Part No", "Cost", "Currency", "MEG Commission Percentage", "VS.G Commission Percentage", "Tariff Percentage"],
+                    numeric=["Cost", "MEG Commission Percentage", "VS.G Commission Percentage", "Tariff Percentage"],
+                    parts=["Part No"]),
+    "MH": Sheet("MH", ["PART_NO", "Cost Center", "RUN FACTOR", " SETUP TIME", "STD LOT SIZE", "QTY", "CREW SIZE"],
+                numeric=["RUN FACTOR", " SETUP TIME", "STD LOT SIZE", "QTY", "CREW SIZE"], parts=["PART_NO"]),
+    "BOM": Sheet("BOM", ["TOP LEVEL PART NO", "PART NO", "CUMM QTY PER ASSEMBLY", "TEMPLATE ID", "ESTIMATED MATERIAL COST"],
+                 numeric=["CUMM QTY PER ASSEMBLY", "ESTIMATED MATERIAL COST"], parts=["TOP LEVEL PART NO", "PART NO"]),
+    "Shemsh": Sheet("Shemsh", ["Part No", "Est Mtr Cost"], numeric=["Est Mtr Cost"], parts=["Part No"]),
+    "DOM_short": Sheet("Dom-Short", ["Price List Type", "Part No.", "Super Base Part", "Original Price (IRR)", "New_Gross", "Base Price Change (%)"],
+                       lenient=["Original Price (IRR)", "New_Gross", "Base Price Change (%)"],
+                       parts=["Part No.", "Super Base Part"], key="Part No."),
+    "DOM_ALL": Sheet("Dom-All", ["Price List Type", "Part No.", "Base Part", " Old Base Prices (IRR)", "Old Finished Cost With Comp.", "Depr.", "Machin"],
+                     numeric=[" Old Base Prices (IRR)", "Old Finished Cost With Comp.", "Depr.", "Machin"],
+                     parts=["Part No.", "Base Part"], key="Part No.", checks=[_copy_sources]),
+    "Rules": Sheet("Rules", ["Step", "Match", "Values", "Action"], checks=[_rules]),
+    "Compare": Sheet("Compare", ["Component Part 1", "Component Part 2", "Super Component 1"],
+                     parts=["Component Part 1", "Component Part 2", "Super Component 1"], key="Component Part 1",
+                     checks=[_compare_cycles]),
+}
+
+
+# Single level BOM (parent -> component lines), exploded to the layout of the BOM sheet
+BOM_LEVELS = Sheet("BOM", ["PARENT PART NO", "PART NO", "QTY PER ASSEMBLY", "TEMPLATE ID", "ESTIMATED MATERIAL COST"],
+                   numeric=["QTY PER ASSEMBLY", "ESTIMATED MATERIAL COST"], parts=["PARENT PART NO", "PART NO"])
+
+
+def single_level(frame):
+    """
+    Whether a BOM sheet lists parent -> component lines (BOM_LEVELS).
+    """
+    headers = {_normal(header) for header in frame.columns}
+    return _normal("PARENT PART NO") in headers and _normal("TOP LEVEL PART NO") not in headers
+
+
+def validate_frames(frames, schemas=SCHEMAS):
+    """
+    Checks and coerces the sheets of a dictionary of frames (keyed like SCHEMAS and
+    engine.FRAME_NAMES). Returns the coerced frames, raises a SchemaError listing all
+    the errors and a ValueError for frames not declared in schemas.
+    The lenient problems are reported with warnings.warn.
+    """
+    unknown = [name for name in frames if name not in schemas]
+    if unknown:
+        raise ValueError(f"Unknown frames {', '.join(map(str, unknown))}, the sheets are {', '.join(schemas)}")
+    frames = dict(frames)
+    errors = []
+    for name, sheet in schemas.items():
+        if isinstance(frames.get(name), pd.DataFrame):
+            if name == "BOM" and single_level(frames[name]):
+                sheet = BOM_LEVELS
+            frames[name], sheet_errors, notes = validate_sheet(frames[name], sheet)
+            errors.extend(sheet_errors)
+            if sheet is BOM_LEVELS and not sheet_errors:
+                try:
+                    frames[name] = explode_bom(frames[name])
+                except ValueError as e:
+                    errors.append(_problem(sheet, "PARENT PART NO", str(e)))
+            for note in notes:
+                warnings.warn(f"Warning: {note['sheet']} '{note['column']}': {note['problem']}, rows {note['rows']} are taken as empty.")
+    if errors:
+        raise SchemaError(errors)
+    return frames
@@ -0,0 +1,172 @@
+import datetime
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from memory import parquet_frame
+
+########################################################################################
+# Snapshots of the dashboard sessions
+#
+# The state of a pricing session (the edited short list, the priced Dom-All, the sidebar
+# parameters and the workbook it prices) is checkpointed to SESSIONS_DIR after every
+# run, so the work survives the end of the session or a restart of the server:
+#   checkpoint = Checkpoint(workbook_key, owner=token)
+#   checkpoint.save(params, data, data_version, DOM_ALL)
+#   snapshot = load_session(checkpoint.session_id)
+# Every frame is an Arrow IPC file rewritten only when the frame changed (an edit or a
+# new price list), the parameters are a small json file. Loading maps the files in
+# memory and converts them without parsing, resuming takes a fraction of a second. The
+# workbook frames are not saved, they are read from the parsed workbook cache
+# (calculations_v2.CACHE_DIR) by the workbook hash. Every snapshot has an owner token,
+# a user only lists the snapshots of their token.
+########################################################################################
+
+SESSIONS_DIR = os.environ.get("PRICEWEBAPP_SESSIONS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions"))
+
+# Snapshots kept, the oldest are deleted beyond
+MAX_SESSIONS = 20
+
+# Frames of a snapshot: file name -> attribute
+FRAMES = {"data": "data", "All": "DOM_ALL"}
+
+
+# Schema metadata key of the rows holding numbers in the columns of part numbers
+# mixing numbers and text, written as text
+NUMBERS_KEY = b"pricewebapp.numbers"
+
+
+def _number_rows(frame):
+    # column -> positions of the integers of the object columns mixing integers and text
+    numbers = {}
+    for name in frame.columns:
+        column = frame[name]
+        if column.dtype == object and pd.api.types.infer_dtype(column, skipna=True) == "mixed-integer":
+            is_number = [isinstance(value, (int, np.integer)) and not isinstance(value, bool) for value in column]
+            numbers[str(name)] = np.flatnonzero(is_number).tolist()
+    return numbers
+
+
+def write_frame(frame, path):
+    """
+    Writes frame (with its index) as an Arrow IPC file, replacing path at once.
+    The part numbers of the columns mixing numbers and text are read back as they were.
+    """
+    table = pa.Table.from_pandas(parquet_frame(frame), preserve_index=True)
+    table = table.replace_schema_metadata({**table.schema.metadata, NUMBERS_KEY: json.dumps(_number_rows(frame)).encode()})
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def read_frame(path):
+    """
+    Frame of an Arrow IPC file of write_frame, read through a memory map.
+    """
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+        frame = table.to_pandas()
+    numbers = json.loads((table.schema.metadata or {}).get(NUMBERS_KEY, b"{}"))
+    for name, rows in numbers.items():
+        column = frame[name].astype(object)
+        column.iloc[rows] = [int(value) for value in column.iloc[rows]]
+        frame[name] = column
+    return frame
+
+
+class Snapshot:
+    """
+    A saved session: session_id, owner, workbook (hash), compact, saved (time), params,
+    data (the edited short list), data_version (its edit counter) and DOM_ALL
+    (the priced Dom-All, None when it was not saved).
+    """
+    def __init__(self, info, frames):
+        self.session_id = info["id"]
+        self.owner = info.get("owner")
+        self.workbook = info["workbook"]
+        self.compact = info.get("compact", False)
+        self.saved = info["saved"]
+        self.params = info["params"]
+        self.data_version = info["data_version"]
+        self.data = frames.get("data")
+        self.DOM_ALL = frames.get("DOM_ALL")
+
+
+class Checkpoint:
+    """
+    Snapshot of one session, save writes the frames which changed since the last save.
+    owner is the token of the user of the session (list_sessions).
+    """
+    def __init__(self, workbook_key, compact=False, session_id=None, owner=None, sessions_dir=SESSIONS_DIR):
+        created = datetime.datetime.now()
+        self.session_id = session_id or created.strftime("%Y%m%d-%H%M%S-%f") + f"-{workbook_key[:4]}"
+        self.workbook_key = workbook_key
+        self.compact = compact
+        self.owner = owner
+        self.folder = os.path.join(sessions_dir, self.session_id)
+        self._saved = {}    # file name -> frame last written (identity)
+        os.makedirs(self.folder, exist_ok=True)
+        prune_sessions(sessions_dir)
+
+    def save(self, params, data, data_version, DOM_ALL=None):
+        """
+        Checkpoints the session: the frames are written when they are not the frames
+        of the last save (the pricing returns new frames when anything changed).
+        """
+        for name, frame in (("data", data), ("All", DOM_ALL)):
+            if frame is not None and self._saved.get(name) is not frame:
+                write_frame(frame, os.path.join(self.folder, f"{name}.arrow"))
+                self._saved[name] = frame
+        info = {"id": self.session_id, "owner": self.owner, "workbook": self.workbook_key, "compact": self.compact,
+                "saved": datetime.datetime.now().isoformat(timespec="seconds"),
+                "params": params, "data_version": data_version}
+        tmp_path = os.path.join(self.folder, f"session.json.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.folder, "session.json"))
+
+
+def list_sessions(workbook_key=None, owner=None, sessions_dir=SESSIONS_DIR):
+    """
+    The saved sessions (id, workbook, saved), latest first, only those of a workbook
+    when workbook_key is given and only those of an owner token when owner is given.
+    """
+    sessions = []
+    if os.path.isdir(sessions_dir):
+        for session_id in os.listdir(sessions_dir):
+            path = os.path.join(sessions_dir, session_id, "session.json")
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    info = json.load(f)
+                if workbook_key in (None, info["workbook"]) and owner in (None, info.get("owner")):
+                    sessions.append({"id": info["id"], "workbook": info["workbook"], "saved": info["saved"]})
+    return sorted(sessions, key=lambda session: session["saved"], reverse=True)
+
+
+def load_session(session_id, sessions_dir=SESSIONS_DIR):
+    """
+    Snapshot of a saved session.
+    """
+    folder = os.path.join(sessions_dir, session_id)
+    with open(os.path.join(folder, "session.json"), encoding="utf-8") as f:
+        info = json.load(f)
+    frames = {}
+    for name, attribute in FRAMES.items():
+        path = os.path.join(folder, f"{name}.arrow")
+        if os.path.exists(path):
+            frames[attribute] = read_frame(path)
+    return Snapshot(info, frames)
+
+
+def prune_sessions(sessions_dir=SESSIONS_DIR, keep=MAX_SESSIONS):
+    """
+    Deletes the oldest snapshots beyond keep (the folders without session.json
+    are the sessions being created and kept).
+    """
+    for session in list_sessions(sessions_dir=sessions_dir)[keep:]:
+        shutil.rmtree(os.path.join(sessions_dir, session["id"]), ignore_errors=True)
@@ -0,0 +1,107 @@
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import calculations_v2 as calc
+from engine import FRAME_NAMES
+
+########################################################################################
+# Workbook data shared by the dashboard sessions
+#
+# A workbook is loaded once per process (dashboard_v2 keeps the SharedWorkbook in
+# st.cache_resource) and its frames are only read: the pricing functions work on lazy
+# copy on write copies. The stage results which only depend on the workbook and the
+# parameters (costs, catalog, BOM structure and the prices of the unedited short list)
+# are kept in a StageCache shared by the engines of the sessions, so a session only
+# holds its edits, its parameters and the frames computed from its edits:
+#   workbook = load_workbook("Pricing.xlsx")
+#   engine = PricingEngine(shared=workbook.stages)
+#   engine.price(workbook.frames, workbook.key, edited_short_list, edits_version)
+########################################################################################
+
+# Bytes of stage outputs kept per workbook
+MAX_STAGE_BYTES = 512 * 2**20
+
+
+def output_bytes(outputs):
+    """
+    Memory of the frames, series and arrays of a stage result (deep memory usage
+    of the frames), other objects are not counted.
+    """
+    size = 0
+    for output in outputs:
+        if isinstance(output, (pd.DataFrame, pd.Series)):
+            size += int(np.sum(output.memory_usage(deep=True, index=True)))
+        elif isinstance(output, np.ndarray):
+            size += output.nbytes
+    return size
+
+
+class StageCache:
+    """
+    Outputs of the pipeline stages keyed by stage name and stage key, shared by
+    several pipelines (and threads). The least recently used entries are dropped
+    while the outputs hold more than max_bytes (see output_bytes), a result larger
+    than max_bytes is not kept.
+    """
+    def __init__(self, max_bytes=MAX_STAGE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()   # (name, key) -> (outputs, bytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name, key):
+        with self._lock:
+            entry = self._entries.get((name, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end((name, key))
+            return entry[0]
+
+    def put(self, name, key, outputs):
+        size = output_bytes(outputs)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop((name, key), None)
+            if previous is not None:
+                self.nbytes -= previous[1]
+            self._entries[(name, key)] = (outputs, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= self._entries.popitem(last=False)[1][1]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedWorkbook:
+    """
+    Frames of a loaded workbook (read only), the warnings of the loader and the
+    stage results shared by the sessions pricing it.
+    """
+    def __init__(self, key, frames, warnings=(), max_bytes=MAX_STAGE_BYTES):
+        self.key = key
+        self.frames = frames
+        self.warnings = list(warnings)
+        self.stages = StageCache(max_bytes)
+
+
+def load_workbook(workbook, key=None, compact=False, max_bytes=MAX_STAGE_BYTES):
+    """
+    Reads a workbook (path or file-like object, None for a cached workbook given
+    by its key) into a SharedWorkbook.
+    The loader warnings (e.g. missing sheets) are kept instead of being raised.
+    """
+    key = key or calc.workbook_hash(workbook)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", UserWarning)
+        frames = dict(zip(FRAME_NAMES, calc.input_df(workbook, key, compact=compact)))
+    return SharedWorkbook(key, frames, [str(warning.message) for warning in caught], max_bytes)
@@ -0,0 +1,195 @@
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from calculations_v2 import EXPECTED_SHEETS
+from engine import FRAME_NAMES
+from overrides import GALAXY_MAN_HOURS_PART
+
+########################################################################################
+# Synthetic cost workbook
+#
+# Random but valid data for the nine sheets read by input_df, at any scale, so the
+# pricing can be run and benchmarked without the real workbook:
+#   frames = synthetic_frames(parts=50000, bom_lines=1000000)
+#   PricingEngine().price(frames, "synthetic")
+#   write_workbook(frames, "Synthetic.xlsx")
+# or from the command line:
+#   python synthetic.py Synthetic.xlsx --parts 50000 --bom-lines 1000000
+# Every part of Dom-All has a BOM, man hours and old prices; the short list is the
+# first fifth of the parts with groups of ten sharing a Super Base Part, the other parts
+# take their price from a Base Part of the short list, and the Compare sheet chains
+# super components over three levels. The special parts of the calculations (Galaxy,
+# man hour exceptions, explosion proof 34 parts, 3129814000) are included.
+########################################################################################
+
+# The part the Galaxy parts take their man hours from (copy_row rule of overrides.py)
+# is placed at Dom-All row 1213, the row the first version of the calculations read
+MIN_PARTS = 1214
+
+# Rows of an xlsx sheet (header excluded)
+XLSX_MAX_ROWS = 1048575
+
+
+def synthetic_frames(parts=2000, short=None, bom_lines=None, components=None, compare_rows=None, seed=0):
+    """
+    Frames of a synthetic workbook, keyed like engine.FRAME_NAMES.
+        parts: rows of Dom-All (at least MIN_PARTS)
+        short: rows of Dom-Short (default parts / 5)
+        bom_lines: lines of the BOM sheet (default 6 per part)
+        components: purchased components (default parts / 10, at least 300)
+        compare_rows: rows of the Compare sheet (default short / 30)
+    """
+    if parts < MIN_PARTS:
+        raise ValueError(f"A synthetic workbook needs at least {MIN_PARTS} parts")
+    rng = np.random.default_rng(seed)
+    short = short or parts // 5
+    bom_lines = bom_lines or 6 * parts
+    components = max(components or parts // 10, 300)
+    compare_rows = compare_rows or max(short // 30, 13)
+
+    part_no = np.char.mod("31AA%07d", np.arange(parts)).astype(object)
+    part_no[5] = 3129814000             # integer part number like the real workbook
+    part_no[6:9] = ["34XX000001", "34XX000002", "34XX000003"]
+    part_no[10:12] = ["31CS009006", "31CS009007"]
+    part_no[1213] = GALAXY_MAN_HOURS_PART
+    part_no[12:16] = ["31BB802000", "31BB803000", "31BB804000", "31BB805000"]
+    short_parts = part_no[:short]
+
+    # Purchased components: aluminium profiles, imported raw material, shemsh and domestic
+    n_profiles, n_imported, n_shemsh = components // 6, components // 3, components // 6
+    n_domestic = components - n_profiles - n_imported - n_shemsh
+    profiles = np.char.mod("AL%06d", np.arange(n_profiles)).astype(object)
+    imported = np.char.mod("IM%06d", np.arange(n_imported)).astype(object)
+    shemsh = np.char.mod("SH%06d", np.arange(n_shemsh)).astype(object)
+    domestic = np.char.mod("DM%06d", np.arange(n_domestic)).astype(object)
+    component_no = np.concatenate([profiles, imported, shemsh, domestic])
+
+    Cost = pd.DataFrame({
+        "Cost Center": [100, 200, 300, 400],
+        "Cost Center Description": ["Assembly", "Press", "Paint", "Test"],
+        "Est Labor Cost": [2_000_000, 2_500_000, 3_000_000, 2_200_000],
+    })
+    Al_profile = pd.DataFrame({
+        "Part No": profiles,
+        "وزن": rng.random(n_profiles) * 3,
+        "نرخ پايه 1": rng.integers(1000, 5000, n_profiles),
+        "نرخ پايه 2": rng.integers(100, 900, n_profiles),
+    })
+    Imp_RM = pd.DataFrame({
+        "Part No": imported,
+        "Cost": rng.random(n_imported) * 10,
+        "Currency": rng.choice(["USD", "AED", "EUR"], n_imported),
+        "MEG Commission Percentage": 0.05,
+        "VS.G Commission Percentage": 0.03,
+        "Tariff Percentage": rng.choice([0.04, 0.1, 0.15], n_imported),
+    })
+    Shemsh = pd.DataFrame({"Part No": shemsh, "Est Mtr Cost": rng.integers(1000, 20000, n_shemsh)})
+
+    # Every part has at least one line, the other lines go to random parts
+    parents = np.concatenate([np.arange(parts), rng.integers(0, parts, max(bom_lines - parts, 0))])[:bom_lines]
+    parents.sort()
+    BOM = pd.DataFrame({
+        "TOP LEVEL PART NO": part_no[parents],
+        "PART NO": component_no[rng.integers(0, len(component_no), len(parents))],
+        "CUMM QTY PER ASSEMBLY": rng.integers(1, 5, len(parents)).astype(float),
+        "TEMPLATE ID": np.where(rng.random(len(parents)) < 0.7, "RM", "SF"),
+        "ESTIMATED MATERIAL COST": rng.integers(1000, 50000, len(parents)).astype(float),
+    })
+
+    MH = pd.DataFrame({
+        "PART_NO": np.repeat(part_no, 2),
+        "Cost Center": rng.choice(Cost["Cost Center"].to_numpy(), 2 * parts),
+        "RUN FACTOR": rng.integers(5, 50, 2 * parts),
+        " SETUP TIME": rng.random(2 * parts),
+        "STD LOT SIZE": 100,
+        "QTY": 1,
+        "CREW SIZE": 1,
+    })
+
+    family = rng.choice(["Downlight", "Panel", "Flood", "Street"], parts)
+    model = np.where(rng.random(parts) < 0.2, "ضد انفجار", "مدل")
+    list_type = np.where(rng.random(parts) < 0.1, "Common Parts", "Luminaires")
+    base_part = np.where(np.arange(parts) >= short, short_parts[np.arange(parts) % short], np.nan).astype(object)
+    description = np.char.mod("Luminaire %d", np.arange(parts)).astype(object)
+    DOM_ALL = pd.DataFrame({
+        "Price List Type": list_type,
+        "Part No.": part_no,
+        "Part Description": description,
+        "Product Family": family,
+        "Model": model,
+        "Base Part": base_part,
+        " Old Base Prices (IRR)": rng.integers(50, 500, parts) * 100000,
+        "Old Finished Cost With Comp.": rng.integers(20, 200, parts) * 100000,
+        "Depr.": rng.integers(1000, 9000, parts),
+        "Machin": rng.integers(1000, 9000, parts),
+    })
+    DOM_short = pd.DataFrame({
+        "Price List Type": list_type[:short],
+        "Part No.": short_parts,
+        "Part Description": description[:short],
+        "Product Family": family[:short],
+        "Model": model[:short],
+        "Super Base Part": short_parts[np.arange(short) // 10 * 10],
+        "Original Price (IRR)": rng.integers(50, 500, short) * 100000,
+        "New_Gross": np.round(rng.uniform(20, 40, short), 1),
+        "Base Price Change (%)": np.round(rng.uniform(0, 20, short), 1),
+    })
+
+    # Compare rows on distinct short list parts: roots are their own super component,
+    # the next rows point to a root and the last third to a row of the second level
+    compare_rows = min(compare_rows, (short - 1) // 2)
+    component_1 = short_parts[1:2 * compare_rows:2]
+    component_2 = short_parts[2:2 * compare_rows + 1:2]
+    level = np.arange(compare_rows) * 3 // compare_rows
+    roots = np.flatnonzero(level == 0)
+    second = np.flatnonzero(level == 1)
+    super_row = np.where(level == 0, np.arange(compare_rows),
+                         np.where(level == 1, roots[np.arange(compare_rows) % len(roots)],
+                                  second[np.arange(compare_rows) % max(len(second), 1)] if len(second) else 0))
+    Compare = pd.DataFrame({
+        "Component Part 1": component_1,
+        "Component Part 2": component_2,
+        "Super Component 1": component_1[super_row],
+    })
+
+    return {"Cost": Cost, "Al_profile": Al_profile, "Imp_RM": Imp_RM, "MH": MH, "BOM": BOM, "Shemsh": Shemsh,
+            "DOM_short": DOM_short, "DOM_ALL": DOM_ALL, "Compare": Compare}
+
+
+def write_workbook(frames, path):
+    """
+    Writes the frames as an xlsx workbook with the sheet names of input_df.
+    Raises ValueError when a sheet has more rows than xlsx allows (large BOMs are
+    benchmarked from the frames directly).
+    """
+    too_large = [name for name, frame in frames.items() if len(frame) > XLSX_MAX_ROWS]
+    if too_large:
+        raise ValueError(f"Sheets {', '.join(too_large)} have more than {XLSX_MAX_ROWS} rows, xlsx can not hold them")
+    with pd.ExcelWriter(path) as writer:
+        for sheet, name in zip(EXPECTED_SHEETS, FRAME_NAMES):
+            frames[name].to_excel(writer, sheet_name=sheet, index=False)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic cost workbook.")
+    parser.add_argument("workbook", help="Output Excel file")
+    parser.add_argument("--parts", type=int, default=2000, help="Rows of Dom-All (default: 2000)")
+    parser.add_argument("--short", type=int, help="Rows of Dom-Short (default: parts / 5)")
+    parser.add_argument("--bom-lines", type=int, help="Lines of the BOM (default: 6 per part)")
+    parser.add_argument("--components", type=int, help="Purchased components (default: parts / 10)")
+    parser.add_argument("--compare-rows", type=int, help="Rows of the Compare sheet (default: short / 30)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    args = parser.parse_args(argv)
+
+    frames = synthetic_frames(args.parts, args.short, args.bom_lines, args.components, args.compare_rows, args.seed)
+    write_workbook(frames, args.workbook)
+    print(f"Written {args.workbook}: " + ", ".join(f"{name} {len(frame)}" for name, frame in frames.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
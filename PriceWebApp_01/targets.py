@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+from rounding import ROUNDING_POLICIES
+
+########################################################################################
+# Target margin price solver ("Target Margin" pricing method)
+#
+# The targets are New_Gross percentages per price list type, product family or model,
+# the Target_Gross parameter:
+#   {"Price List Type": {"Luminaires": 30}, "Product Family": {"Street": 32.5},
+#    "Model": {"ضد انفجار": 35}}
+# A more specific level wins (Model over Product Family over Price List Type), the rows
+# without a target keep their own New_Gross as target. The base price of a row is the
+# smallest price of the rounding steps whose New_Gross after VAT and RepCom reaches the
+# target, solved for every row at once:
+#   New_Gross = (1 - RepCom/100 - Finished Cost * (1 + VAT/100) / price) * 100
+# UpdateBasePrice then propagates the prices through Base Part and Compare as for the
+# other methods.
+########################################################################################
+
+# Levels of the targets, from the least to the most specific
+TARGET_LEVELS = ["Price List Type", "Product Family", "Model"]
+
+
+def target_table(targets=None):
+    """
+    Targets as a table of Level, Value and Target Gross (%) rows (dashboard editor).
+    """
+    rows = [(level, value, target) for level in TARGET_LEVELS for value, target in (targets or {}).get(level, {}).items()]
+    return pd.DataFrame(rows, columns=["Level", "Value", "Target Gross (%)"]).astype({"Level": object, "Value": object, "Target Gross (%)": float})
+
+
+def targets_from_table(table):
+    """
+    Target_Gross parameter of a table of target_table, incomplete rows are ignored.
+    """
+    targets = {}
+    for level, value, target in table[["Level", "Value", "Target Gross (%)"]].itertuples(index=False):
+        if level in TARGET_LEVELS and pd.notna(value) and str(value).strip() and pd.notna(target):
+            targets.setdefault(level, {})[str(value).strip()] = float(target)
+    return targets
+
+
+def target_gross(DOM, targets):
+    """
+    Target New_Gross of every row of DOM (DOM_short or DOM_ALL), NaN for the rows
+    without a target.
+    """
+    target = pd.Series(np.nan, index=DOM.index)
+    for level in TARGET_LEVELS:
+        values = (targets or {}).get(level)
+        if values and level in DOM:
+            level_target = DOM[level].astype(object).map(values).astype(float)
+            target = level_target.where(level_target.notna(), target)
+    return target
+
+
+def new_gross(price, cost, RepCom, VAT):
+    """
+    New_Gross (%) of a base price including VAT.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (1 - RepCom / 100 - np.asarray(cost, dtype=float) * (1 + VAT / 100) / np.asarray(price, dtype=float)) * 100
+
+
+def solve_base_price(cost, target, RepCom, VAT, policy=None, by=None):
+    """
+    Smallest base price of the rounding policy (default: the Base Price policy) whose
+    New_Gross reaches target. by chooses the rounding tier as in RoundingPolicy.
+    NaN where the cost is missing or the target can not be reached (target of
+    100 - RepCom or more).
+    """
+    policy = policy or ROUNDING_POLICIES["Base Price"]
+    cost = np.asarray(cost, dtype=float)
+    target = np.asarray(target, dtype=float)
+    margin = (100 - RepCom - target) / 100
+    with np.errstate(divide="ignore", invalid="ignore"):
+        exact = np.where(margin > 0, cost * (1 + VAT / 100) / margin, np.nan)
+    price = policy(exact, by=by)
+
+    # The float error of the exact price can round it up one step too far
+    lower = price - policy.step(price if by is None else by)
+    lower_ok = (lower > 0) & (policy(lower, by=by) == lower) & (new_gross(lower, cost, RepCom, VAT) >= target - 1e-9)
+    return np.where(lower_ok, lower, price)
+
+
+def missed_targets(DOM):
+    """
+    Rows whose New_Gross is below their Target Gross, the Compare adjustments or the
+    Common Parts rules moved their price below the solved one.
+    """
+    return DOM['New_Gross'] < DOM['Target Gross'] - 1e-9
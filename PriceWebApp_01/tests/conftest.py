@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# The modules of the app are flat modules of PriceWebApp_01
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synthetic  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def frames():
+    """
+    Frames of a small synthetic workbook (synthetic.py), shared read only by the tests.
+    """
+    return synthetic.synthetic_frames(parts=2000)
@@ -0,0 +1,51 @@
+import os
+
+import pandas as pd
+import pytest
+
+import batch
+import calculations_v2 as calc
+import synthetic
+from engine import PricingEngine
+
+
+@pytest.fixture
+def folder(tmp_path, monkeypatch):
+    # two workbooks of different parts, the parsed workbooks are cached under the test folder
+    monkeypatch.setattr(calc, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("PRICEWEBAPP_CACHE_DIR", str(tmp_path / "cache"))
+    folder = tmp_path / "Workbooks"
+    folder.mkdir()
+    for name, seed in (("Lighting", 0), ("Industrial", 1)):
+        synthetic.write_workbook(synthetic.synthetic_frames(parts=1500, seed=seed), str(folder / f"{name}.xlsx"))
+    return folder
+
+
+def test_batch_matches_single_runs(folder, tmp_path):
+    params = {"method": "New Gross", "nima": 700000}
+    out = tmp_path / "out"
+    done = []
+    summary = batch.price_folder(str(folder), params, str(out), "csv", processes=2,
+                                 progress=lambda row, n, total: done.append((row["Workbook"], total)))
+
+    assert summary["Workbook"].tolist() == ["Industrial", "Lighting"]
+    assert summary["Status"].tolist() == ["ok", "ok"]
+    assert sorted(done) == [("Industrial", 2), ("Lighting", 2)]
+    assert pd.read_csv(out / "Summary.csv")["Workbook"].tolist() == ["Industrial", "Lighting"]
+
+    for row in summary.to_dict("records"):
+        results = PricingEngine(params).run(str(folder / f"{row['Workbook']}.xlsx"))
+        for column, value in batch.workbook_summary(results).items():
+            assert row[column] == pytest.approx(value, nan_ok=True), (row["Workbook"], column)
+        expected = tmp_path / "single" / row["Workbook"]
+        results.write(str(expected), "csv")
+        for name in os.listdir(expected):
+            pd.testing.assert_frame_equal(pd.read_csv(out / row["Workbook"] / name), pd.read_csv(expected / name))
+
+
+def test_a_failed_workbook_does_not_stop_the_others(folder, tmp_path):
+    (folder / "Broken.xlsx").write_bytes(b"not a workbook")
+    summary = batch.price_folder(str(folder), {}, str(tmp_path / "out"), "csv", processes=2)
+    assert summary["Workbook"].tolist() == ["Broken", "Industrial", "Lighting"]
+    assert summary["Status"].str.startswith("error").tolist() == [True, False, False]
+    assert summary["Parts"].isna().tolist() == [True, False, False]
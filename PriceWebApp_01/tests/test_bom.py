@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import calculations_v2 as calc
+from bom import BOMStructure, explode_bom
+from engine import merge_params
+from schema import SchemaError, validate_frames
+
+PARAMS = merge_params({})
+
+
+def small_frames():
+    Al_profile = pd.DataFrame({"Part No": ["P1", "P2"], "Total": [10.0, 0.0]})
+    Imp_RM = pd.DataFrame({"Part No": ["I1"], "Final Domestic Cost": [5.0]})
+    Shemsh = pd.DataFrame({"Part No": ["S1"], "Est Mtr Cost": [2.0]})
+    BOM = pd.DataFrame({
+        "TOP LEVEL PART NO": ["A", "A", "A", "A", "B", "B"],
+        "PART NO": ["P1", "I1", "S1", "D1", "P2", "I1"],
+        "CUMM QTY PER ASSEMBLY": [2, 1, 3, 4, 1, 2],
+        "TEMPLATE ID": ["RM", "RM", "MFG", "RM", "RM", "MFG"],
+        "ESTIMATED MATERIAL COST": [0, 0, 0, 7, 6, 0],
+    })
+    return Al_profile, Imp_RM, Shemsh, BOM
+
+
+def processed(frames):
+    return calc.process_AlprofIMPRM(frames["Al_profile"], frames["Imp_RM"], PARAMS["euro_to_currency"], PARAMS["nima"],
+                                    PARAMS["custom"], PARAMS["ExpDuties"])
+
+
+def baseline_costs(Al_profile, Imp_RM, Shemsh, BOM, DomesticRM):
+    # Merge and groupby of the first version of process_bom / process_DOM_ALL
+    BOM = BOM.merge(Al_profile[['Part No', 'Total']], how='left', left_on='PART NO', right_on='Part No', suffixes=('', '_aluminium'))
+    BOM = BOM.merge(Imp_RM[['Part No', 'Final Domestic Cost']], how='left', left_on='PART NO', right_on='Part No', suffixes=('', '_imp'))
+    BOM = BOM.merge(Shemsh[['Part No', 'Est Mtr Cost']], how='left', left_on='PART NO', right_on='Part No', suffixes=('', '_shemsh'))
+    BOM['Material Cost'] = BOM['Total'].fillna(0) + BOM['Final Domestic Cost'].fillna(0) + BOM['Est Mtr Cost'].fillna(0)
+    BOM['ESTIMATED MATERIAL COST'] = BOM['ESTIMATED MATERIAL COST'] * (1 + DomesticRM / 100.0)
+    BOM['Material Cost'] = BOM['Material Cost'].where(BOM['Material Cost'] != 0, BOM['ESTIMATED MATERIAL COST'])
+    BOM['Total Component Cost'] = BOM['Material Cost'] * BOM['CUMM QTY PER ASSEMBLY']
+    material = BOM.groupby('TOP LEVEL PART NO')['Total Component Cost'].sum()
+    raw_material = BOM[BOM['TEMPLATE ID'] == 'RM'].groupby('TOP LEVEL PART NO')['Total Component Cost'].sum()
+    return material, raw_material
+
+
+def test_costs_of_a_small_bom():
+    # A: 2 x 10 + 5 + 3 x 2 + 4 x 7 (D1 has no master data cost), B: 6 (P2 costs 0) + 2 x 5
+    costs = calc.process_bom(*small_frames(), 0)
+    assert costs.loc["A"].tolist() == pytest.approx([59, 53])
+    assert costs.loc["B"].tolist() == pytest.approx([16, 6])
+    costs = calc.process_bom(*small_frames(), 10)
+    assert costs.loc["A"].tolist() == pytest.approx([61.8, 55.8])
+
+
+def test_incremental_rollup_of_a_small_bom():
+    Al_profile, Imp_RM, Shemsh, BOM = small_frames()
+    structure = BOMStructure(BOM)
+    calc.process_bom(Al_profile, Imp_RM, Shemsh, structure, 0)
+    Imp_RM["Final Domestic Cost"] = 8.0
+    costs = calc.process_bom(Al_profile, Imp_RM, Shemsh, structure, 0)
+    pd.testing.assert_frame_equal(costs, calc.process_bom(Al_profile, Imp_RM, Shemsh, BOM, 0))
+    assert costs.loc["B"].tolist() == pytest.approx([22, 6])
+    assert set(structure.where_used(["I1"])) == {"A", "B"}
+    assert set(structure.where_used(["P1", "X"])) == {"A"}
+
+
+def test_explode_bom():
+    BOM = pd.DataFrame({
+        "PARENT PART NO": ["A", "S", "A"],
+        "PART NO": ["S", "R1", "R2"],
+        "QTY PER ASSEMBLY": [2, 3, 1],
+        "TEMPLATE ID": ["MFG", "RM", "RM"],
+    })
+    flat = explode_bom(BOM)
+    quantities = flat.set_index(["TOP LEVEL PART NO", "PART NO"])["CUMM QTY PER ASSEMBLY"].to_dict()
+    assert quantities == {("A", "S"): 2, ("A", "R1"): 6, ("A", "R2"): 1, ("S", "R1"): 3}
+    assert flat.set_index("PART NO")["TEMPLATE ID"].to_dict() == {"S": "MFG", "R1": "RM", "R2": "RM"}
+    BOM.loc[len(BOM)] = ["R1", "A", 1, "RM"]
+    with pytest.raises(ValueError, match="cycle"):
+        explode_bom(BOM)
+
+
+@pytest.mark.parametrize("DomesticRM", [0, 7.5])
+def test_costs_match_the_groupby(frames, DomesticRM):
+    Al_profile, Imp_RM = processed(frames)
+    costs = calc.process_bom(Al_profile, Imp_RM, frames["Shemsh"], frames["BOM"], DomesticRM)
+    material, raw_material = baseline_costs(Al_profile, Imp_RM, frames["Shemsh"], frames["BOM"], DomesticRM)
+    np.testing.assert_allclose(costs["Material Cost"], material.reindex(costs.index), rtol=1e-9)
+    np.testing.assert_allclose(costs["Raw Material Cost"], raw_material.reindex(costs.index), rtol=1e-9)
+
+
+def test_incremental_rollup_matches_a_new_structure(frames):
+    Al_profile, Imp_RM = processed(frames)
+    structure = BOMStructure(frames["BOM"])
+    calc.process_bom(Al_profile, Imp_RM, frames["Shemsh"], structure, 0)
+    # A few imported components cost more, only their assemblies are re-costed
+    Imp_RM = Imp_RM.copy()
+    Imp_RM.loc[:4, "Final Domestic Cost"] *= 1.5
+    incremental = calc.process_bom(Al_profile, Imp_RM, frames["Shemsh"], structure, 0)
+    full = calc.process_bom(Al_profile, Imp_RM, frames["Shemsh"], BOMStructure(frames["BOM"]), 0)
+    pd.testing.assert_frame_equal(incremental, full, check_exact=False, rtol=1e-9)
+
+
+def test_many_incremental_rollups_match_full_rollups(frames):
+    structure = BOMStructure(frames["BOM"])
+    rng = np.random.default_rng(0)
+    n = len(structure.components)
+    master_cost = pd.Series(rng.uniform(1, 1000, n), index=structure.components)
+    vector = structure.component_vector(master_cost, 0)
+    first = structure.rollup(vector)
+    kept = first[0].copy()
+    for _ in range(1000):
+        # Costs of a few components edited again and again
+        vector = vector.copy()
+        vector[rng.choice(4, 2, replace=False)] = rng.uniform(1, 1e6, 2)
+        material, raw_material = structure.rollup(vector)
+        expected = structure.cost_matrix @ vector
+        # Within rounding of a single update, the updates do not add up
+        np.testing.assert_allclose(material, expected[:len(structure.parents)], rtol=4e-15)
+    # The results of earlier calls (e.g. of another session) are not changed
+    pd.testing.assert_series_equal(first[0], kept)
+
+
+def test_where_used(frames):
+    BOM = frames["BOM"]
+    structure = BOMStructure(BOM)
+    component = BOM["PART NO"].iloc[0]
+    expected = set(BOM.loc[BOM["PART NO"] == component, "TOP LEVEL PART NO"])
+    assert set(structure.where_used([component])) == expected
+
+
+def single_level_bom():
+    return pd.DataFrame({
+        "PARENT PART NO": ["A", "S", "A"],
+        "PART NO": ["S", "R1", "R2"],
+        "QTY PER ASSEMBLY": [2, 3, 1],
+        "TEMPLATE ID": ["MFG", "RM", "RM"],
+        "ESTIMATED MATERIAL COST": [0, 10, 5],
+    })
+
+
+def test_single_level_bom_is_exploded_on_load():
+    BOM = validate_frames({"BOM": single_level_bom()})["BOM"]
+    quantities = BOM.set_index(["TOP LEVEL PART NO", "PART NO"])["CUMM QTY PER ASSEMBLY"].to_dict()
+    assert quantities == {("A", "S"): 2, ("A", "R1"): 6, ("A", "R2"): 1, ("S", "R1"): 3}
+    assert BOM.set_index("PART NO")["TEMPLATE ID"].to_dict() == {"S": "MFG", "R1": "RM", "R2": "RM"}
+    structure = BOMStructure(BOM)
+    material, raw_material = structure.rollup(structure.component_vector(pd.Series(dtype=float), 0))
+    assert material["A"] == pytest.approx(65)
+    assert raw_material["A"] == pytest.approx(65)
+
+
+def test_single_level_bom_with_a_cycle():
+    BOM = single_level_bom()
+    BOM.loc[len(BOM)] = ["R1", "A", 1, "RM", 1]
+    with pytest.raises(SchemaError, match="cycle"):
+        validate_frames({"BOM": BOM})
@@ -0,0 +1,60 @@
+import io
+import os
+
+import pandas as pd
+import pytest
+
+import calculations_v2 as calc
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(calc, "CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_cached_sheets_round_trip(cache_dir):
+    sheets = {
+        "Cost": pd.DataFrame({"Cost Center": ["A", "B"], "Est Labor Cost": [1.5, None]}),
+        "Shemsh": pd.DataFrame({"Part No": ["31AB001", "31AB002"], "Est Mtr Cost": [10.0, 20.0]}),
+    }
+    calc.write_cached_sheets("a", sheets)
+    cached = calc.read_cached_sheets("a")
+    assert sorted(cached) == ["Cost", "Shemsh"]
+    for name, frame in sheets.items():
+        pd.testing.assert_frame_equal(cached[name], frame, check_dtype=False)
+    assert calc.read_cached_sheets("b") is None
+
+
+def test_workbook_hash_of_a_path_and_an_upload(tmp_path):
+    path = tmp_path / "workbook.xlsx"
+    path.write_bytes(b"workbook content")
+    assert calc.workbook_hash(str(path)) == calc.workbook_hash(io.BytesIO(b"workbook content"))
+    assert calc.workbook_hash(str(path)) != calc.workbook_hash(io.BytesIO(b"other content"))
+
+
+def test_mixed_part_numbers_are_cached_as_strings(cache_dir):
+    frame = pd.DataFrame({"Part No": [3129814000, "31AB001", None], "Cost": [1.0, 2.0, 3.0]}, dtype=object)
+    calc.write_cached_sheets("a", {"Imp_RM": frame.assign(Cost=frame["Cost"].astype(float))})
+    assert sorted(os.listdir(cache_dir / "a")) == ["Imp_RM.parquet", "sheets.json"]
+    cached = calc.read_cached_sheets("a")["Imp_RM"]
+    assert cached["Part No"].tolist()[:2] == ["3129814000", "31AB001"]
+    assert cached["Part No"].isna().tolist() == [False, False, True]
+
+
+def test_corrupt_cache_is_reported(cache_dir):
+    calc.write_cached_sheets("a", {"Cost": pd.DataFrame({"Cost": [1.0]})})
+    (cache_dir / "a" / "Cost.parquet").write_bytes(b"not parquet")
+    with pytest.warns(UserWarning, match="can not be read"):
+        assert calc.read_cached_sheets("a") is None
+    assert not (cache_dir / "a").exists()
+    assert calc.read_cached_sheets("missing") is None
+
+
+def test_least_recently_used_workbooks_are_pruned(cache_dir):
+    for i, key in enumerate("abc"):
+        calc.write_cached_sheets(key, {"Cost": pd.DataFrame({"Cost": [1.0]})})
+        os.utime(cache_dir / key, (i, i))
+    calc.read_cached_sheets("a")
+    calc.prune_cache(keep=2)
+    assert sorted(os.listdir(cache_dir)) == ["a", "c"]
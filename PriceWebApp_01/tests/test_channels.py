@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from channels import BASE_PRICE, CHANNELS, END_USER, Channel, channel_levels, side_prices
+from engine import merge_params
+from test_rounding import baseline_test_round
+
+EXPLOSION = 'ضد انفجار'
+
+
+def baseline_side_price(parent, model, rate, explosion_rate=None):
+    # Calc_Side_Prices of the first version: parent times the rate of the model, then test_round
+    price = parent * rate
+    if explosion_rate is not None:
+        price = np.where(model == EXPLOSION, parent * explosion_rate, price)
+    return np.array([baseline_test_round(value) for value in price])
+
+
+@pytest.fixture
+def small_list():
+    DOM = pd.DataFrame({
+        'Part No.': ["P1", "P2", "P3", "P4", "P5"],
+        'Model': ["مدل", EXPLOSION, "مدل", EXPLOSION, "مدل"],
+        'Price List Type': ["Luminaires"] * 5,
+        BASE_PRICE: [1234567.0, 2345678.0, 245678.0, 98765.0, 245678.0],
+    })
+    # P5 follows the gap of P1 and P3: P5 = P3 + (P1 - P3)
+    Compare = pd.DataFrame({
+        'Component Part 1': ["P1", "P5"],
+        'Component Part 2': ["P3", "P3"],
+        'Super Component 1': ["P1", "P1"],
+    })
+    return DOM, Compare
+
+
+def test_every_channel_matches_the_first_version(small_list):
+    DOM, Compare = small_list
+    Sales_Percent = merge_params({})["Sales_Percent"]
+    side_prices(DOM, Sales_Percent, Compare)
+
+    model = DOM['Model'].to_numpy()
+    base = DOM[BASE_PRICE].to_numpy(dtype=float)
+    end_user = baseline_side_price(base, model, Sales_Percent["End_User_DOM_All"], Sales_Percent["End_User_DOM_Explosion"])
+    expected = {
+        END_USER: end_user,
+        'Electrical Shops (IRR)': baseline_side_price(
+            end_user, model, Sales_Percent["Electrical_All"], Sales_Percent["Electrical_Explosion"]),
+        'Wholesales Price Including VAT (IRR)': baseline_side_price(end_user, model, Sales_Percent["Wholesales"]),
+        'End-User Turkey Price (IRR)': baseline_side_price(base, model, Sales_Percent["End_User_Turkey"]),
+        'End-User Iraq Armenia Afghanistan Price (IRR)': baseline_side_price(
+            base, model, Sales_Percent["End_User_Iraq_Armenia_Afghan"]),
+    }
+    assert set(expected) == {channel.column for channel in CHANNELS}
+    for column, prices in expected.items():
+        # compare adjustment of the first version: P5 takes the gap of P1 and P3 over P3
+        prices[4] = prices[2] + (prices[0] - prices[2])
+        np.testing.assert_array_equal(DOM[column].to_numpy(dtype=float), prices, err_msg=column)
+
+
+def test_channels_after_their_parent():
+    levels = channel_levels(CHANNELS)
+    assert [[channel.column for channel in level] for level in levels] == [
+        [END_USER, 'End-User Turkey Price (IRR)', 'End-User Iraq Armenia Afghanistan Price (IRR)'],
+        ['Electrical Shops (IRR)', 'Wholesales Price Including VAT (IRR)'],
+    ]
+
+
+def test_cycle_of_parent_channels():
+    with pytest.raises(ValueError, match="cycle of parent channels"):
+        channel_levels([Channel("A", "B", "Wholesales"), Channel("B", "A", "Wholesales")])
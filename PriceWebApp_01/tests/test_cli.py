@@ -0,0 +1,54 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import calculations_v2 as calc
+import cli
+import synthetic
+from engine import PricingEngine
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    # the parsed workbooks are cached under the test folder
+    monkeypatch.setattr(calc, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("PRICEWEBAPP_CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+@pytest.fixture
+def workbook(tmp_path, cache_dir):
+    return synthetic.write_workbook(synthetic.synthetic_frames(parts=2000), str(tmp_path / "Pricing.xlsx"))
+
+
+def test_main_prices_a_workbook(workbook, tmp_path, capsys):
+    params = {"nima": 700000, "Sales_Percent": {"Wholesales": 0.9}}
+    params_path = tmp_path / "params.json"
+    params_path.write_text(json.dumps(params), encoding="utf-8")
+    out = tmp_path / "out"
+
+    assert cli.main([workbook, "--params", str(params_path), "--method", "New Gross", "--out", str(out), "--format", "csv"]) == 0
+    printed = capsys.readouterr().out
+    assert "Total" in printed and f"Written {out / 'Dom-All.csv'}" in printed
+
+    # the lists written are those of the engine with the same parameters
+    expected = PricingEngine({**params, "method": "New Gross"}).run(workbook)
+    written = pd.read_csv(out / "Dom-All.csv")
+    assert len(written) == len(expected.DOM_ALL)
+    pd.testing.assert_series_equal(written["Base Price Including VAT (IRR)"], expected.DOM_ALL["Base Price Including VAT (IRR)"],
+                                   check_dtype=False)
+    assert sorted(os.listdir(out)) == sorted(f"{name}.csv" for name in ["Dom-Short", "Dom-All", "Base Price", "End-User",
+                                                                        "Electrical Shops", "Wholesales", "Cost Centers"])
+
+
+def test_main_reports_a_workbook_layout(tmp_path, cache_dir, capsys):
+    frames = synthetic.synthetic_frames(parts=2000)
+    frames["DOM_ALL"] = frames["DOM_ALL"].drop(columns="Old Finished Cost With Comp.")
+    workbook = synthetic.write_workbook(frames, str(tmp_path / "Broken.xlsx"))
+
+    assert cli.main([workbook, "--out", str(tmp_path / "out")]) == 1
+    errors = capsys.readouterr().err
+    assert "does not match the expected layout" in errors and "Old Finished Cost With Comp." in errors
+    assert not (tmp_path / "out").exists()
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from compare_rules import CompareGraph, resolve
+
+
+def graph_of(rows):
+    # Compare rows (Component Part 1, Component Part 2, Super Component 1) as a graph
+    parts = np.array([row[0] for row in rows], dtype=object)
+    positions = {part: i for i, part in enumerate(parts)}
+    super_row = np.array([positions.get(row[2], -1) for row in rows])
+    component_2_row = np.array([positions.get(row[1], -1) for row in rows])
+    return CompareGraph(super_row, component_2_row, parts)
+
+
+def test_three_levels_of_super_components():
+    # C follows the gap of A, E and G follow the gap of C, G also waits for E
+    graph = graph_of([("A", "B", "A"), ("C", "D", "A"), ("E", "F", "C"), ("G", "E", "C")])
+    assert [rows.tolist() for rows in graph.levels] == [[0], [1], [2], [3]]
+    assert graph.depth == 3
+
+    parts = ["A", "B", "C", "D", "E", "F", "G"]
+    prices = np.array([[100, 80, 50, 40, 10, 5, 0]], dtype=float).T
+    prices = np.hstack([prices, prices * 2])
+    component_1 = np.array([parts.index(part) for part in "ACEG"])
+    component_2 = np.array([parts.index(part) for part in "BDFE"])
+    diff, super_diff, adjustment = resolve(graph, prices, component_1, component_2)
+
+    # C = D + (A - B) = 40 + 20, E = F + (C - D) = 5 + 20, G = E + (C - D) = 25 + 20
+    np.testing.assert_array_equal(prices[:, 0], [100, 80, 60, 40, 25, 5, 45])
+    np.testing.assert_array_equal(prices[:, 1], [200, 160, 120, 80, 50, 10, 90])
+    np.testing.assert_array_equal(diff[:, 0], [20, 10, 5, -25])
+    np.testing.assert_array_equal(super_diff[:, 0], [20, 20, 20, 20])
+    np.testing.assert_array_equal(adjustment[:, 0], [0, 10, 15, 45])
+
+
+def test_cycle_of_super_components():
+    with pytest.raises(ValueError, match="cycle of super components, Component Part 1: X, Y"):
+        graph_of([("A", "B", "A"), ("X", "B", "Y"), ("Y", "B", "X")])
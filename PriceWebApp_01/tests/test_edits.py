@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import edits
+from engine import PricingEngine
+
+METHODS = ["Original Price", "New Gross", "Price Diff", "Target Margin"]
+
+# Editable column of each method (dashboard grid)
+EDITED_COLUMN = {"Original Price": "Original Price (IRR)", "New Gross": "New_Gross",
+                 "Price Diff": "Base Price Change (%)", "Target Margin": "New_Gross"}
+
+
+def small_short():
+    return pd.DataFrame({"Part No.": ["31AB001", "31AB002", "31AB003"],
+                         "Original Price (IRR)": [1000.0, 2000.0, np.nan],
+                         "New_Gross": [30.0, 25.0, 20.0],
+                         "Base Price Change (%)": [0.0, 0.0, 0.0]})
+
+
+def test_edits_of_a_sorted_grid():
+    DOM_short = small_short()
+    # The grid returns the rows sorted, an edited price and an untouched missing price
+    grid = DOM_short.iloc[::-1].copy()
+    grid.loc[1, "Original Price (IRR)"] = 2500.0
+    changes = edits.grid_edits(DOM_short, grid)
+    assert changes.values.tolist() == [["31AB002", "Original Price (IRR)", 2500.0]]
+
+    edited = edits.apply_edits(DOM_short, changes)
+    assert edited["Original Price (IRR)"].tolist()[:2] == [1000.0, 2500.0]
+    assert edits.edited_rows(edited, DOM_short).tolist() == [False, True, False]
+    assert edits.edited_rows(edited.assign(New_Gross=1.0).drop(columns="Base Price Change (%)"), DOM_short) is None
+
+
+def test_patch_rows():
+    frame = small_short()
+    subset = frame.iloc[[2]].assign(New_Gross=21.0)
+    patched = edits.patch_rows(frame, np.array([False, False, True]), subset)
+    assert patched["New_Gross"].tolist() == [30.0, 25.0, 21.0]
+    assert frame["New_Gross"].tolist() == [30.0, 25.0, 20.0]
+
+
+@pytest.mark.parametrize("targets", [{}, {"Product Family": {"Street": 32.5}, "Model": {"ضد انفجار": 35}}])
+@pytest.mark.parametrize("method", METHODS)
+def test_edits_reprice_like_a_full_run(frames, method, targets):
+    params = {"method": method, "Target_Gross": targets}
+    engine = PricingEngine(params)
+    priced = engine.price(frames, "synthetic").DOM_short
+
+    # Edits of a Super Base Part and of a plain row, sent back with the priced list like the dashboard
+    column = EDITED_COLUMN[method]
+    rows = [0, 43]
+    changes = pd.DataFrame({"Part No.": priced["Part No."].iloc[rows].to_numpy(), "column": column,
+                            "value": priced[column].iloc[rows].to_numpy(dtype=float) * 1.1 + 1})
+    DOM_short = edits.apply_edits(priced, changes)
+
+    incremental = engine.price(frames, "synthetic", DOM_short, 1)
+    assert engine.pipeline.updated == ["Pricing"]
+    full = PricingEngine(params).price(frames, "synthetic", DOM_short, 1)
+    pd.testing.assert_frame_equal(incremental.DOM_short, full.DOM_short, check_exact=False, rtol=1e-12)
+    pd.testing.assert_frame_equal(incremental.DOM_ALL, full.DOM_ALL, check_exact=False, rtol=1e-12)
+
+
+def test_grid_edits_round_trip(frames):
+    priced = PricingEngine().price(frames, "synthetic").DOM_short
+    grid = priced.copy()
+    grid.loc[5, "Original Price (IRR)"] = 1234500.0
+    changes = edits.grid_edits(priced, grid)
+    assert changes[["Part No.", "column"]].values.tolist() == [[priced.loc[5, "Part No."], "Original Price (IRR)"]]
+    assert edits.apply_edits(priced, changes).loc[5, "Original Price (IRR)"] == 1234500.0
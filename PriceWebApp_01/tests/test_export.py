@@ -0,0 +1,69 @@
+import gc
+import os
+import zipfile
+
+import openpyxl
+import pandas as pd
+import pytest
+
+import export
+from engine import PricingEngine
+
+
+@pytest.fixture(scope="module")
+def sheets(frames):
+    results = PricingEngine().price(frames, "synthetic")
+    return export.export_sheets(results.frames, results.params["OLDlaborRate"])
+
+
+def test_export_sheets(sheets):
+    assert list(sheets) == ["Dom-Short", "Dom-All", "Base Price", "End-User", "Electrical Shops", "Wholesales",
+                            "Cost Centers"]
+    assert list(sheets["End-User"].columns) == export.PART_COLUMNS + [export.END_USER]
+
+
+def test_xlsx_reopens_with_the_sheets(sheets, tmp_path, monkeypatch):
+    # a few rows per chunk so the rows of a sheet are written in several chunks
+    monkeypatch.setattr(export, "CHUNK_ROWS", 150)
+    progress = []
+    path = export.write_xlsx(sheets, str(tmp_path / "Pricing.xlsx"), lambda done, total: progress.append((done, total)))
+
+    total = sum(len(frame) for frame in sheets.values())
+    assert progress[-1] == (total, total)
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        assert workbook.sheetnames == list(sheets)
+        for name, frame in sheets.items():
+            rows = list(workbook[name].iter_rows(values_only=True))
+            assert list(rows[0]) == [str(column) for column in frame.columns], name
+            assert len(rows) - 1 == len(frame), name
+    finally:
+        workbook.close()
+
+    prices = pd.read_excel(path, sheet_name="Base Price")
+    pd.testing.assert_series_equal(prices[export.BASE_PRICE], sheets["Base Price"][export.BASE_PRICE].reset_index(drop=True),
+                                   check_dtype=False)
+
+
+def test_csv_export_is_a_zip_of_every_sheet(sheets, tmp_path):
+    path = export.write_export(sheets, str(tmp_path / "Pricing.zip"), "csv")
+    with zipfile.ZipFile(path) as archive:
+        assert sorted(archive.namelist()) == sorted(f"{name}.csv" for name in sheets)
+
+
+def test_export_file_is_removed_with_its_job(sheets):
+    job = export.ExportJob({"Wholesales": sheets["Wholesales"]}, "csv")
+    assert job.done.wait(60) and job.error is None
+    path = job.path
+    assert os.path.exists(path)
+    # the thread holds the job until it ended
+    job._thread.join()
+    del job
+    gc.collect()
+    assert not os.path.exists(path)
+
+    job = export.ExportJob({"Wholesales": sheets["Wholesales"]}, "csv")
+    assert job.done.wait(60)
+    job.remove()
+    assert not os.path.exists(job.path)
+    job.remove()
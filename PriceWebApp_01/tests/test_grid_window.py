@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+from grid_window import changed_rows, filter_rows, page_count, sort_rows, window
+
+
+def small_frame():
+    return pd.DataFrame({
+        "Part No.": pd.Series([3129814000, "31AA0002", "31ab0003", "32CC0004", "31AA0005"], dtype=object),
+        "Part Description": ["Lamp", "LAMP holder", "Ballast", "Cable", "Lamp cover"],
+        "Finished Cost": [500.0, np.nan, 100.0, 300.0, 100.0],
+    })
+
+
+def test_filter_rows_is_case_insensitive_over_the_search_columns():
+    frame = small_frame()
+    assert filter_rows(frame, " lamp ").tolist() == [True, True, False, False, True]
+    assert filter_rows(frame, "31AB").tolist() == [False, False, True, False, False]
+    assert filter_rows(frame, "31aa").tolist() == [False, True, False, False, True]
+    # numbers are searched as text, columns missing from the frame are skipped
+    assert filter_rows(frame, "98140").tolist() == [True, False, False, False, False]
+    assert filter_rows(frame, "").all()
+    assert not filter_rows(frame, "missing").any()
+
+
+def test_filter_rows_only_restricts_the_rows():
+    frame = small_frame()
+    only = np.array([False, True, True, True, False])
+    assert filter_rows(frame, "lamp", only=only).tolist() == [False, True, False, False, False]
+    assert filter_rows(frame, only=only).tolist() == only.tolist()
+    # the mask given is not modified
+    assert only.tolist() == [False, True, True, True, False]
+
+
+def test_sort_rows_is_stable_with_missing_values_last():
+    frame = small_frame()
+    mask = np.ones(len(frame), dtype=bool)
+    assert sort_rows(frame, mask, "Finished Cost").tolist() == [2, 4, 3, 0, 1]
+    assert sort_rows(frame, mask, "Finished Cost", ascending=False).tolist() == [0, 3, 2, 4, 1]
+    assert sort_rows(frame, mask).tolist() == [0, 1, 2, 3, 4]
+    assert sort_rows(frame, mask, "Unknown").tolist() == [0, 1, 2, 3, 4]
+
+
+def test_sort_rows_sorts_mixed_part_numbers_as_text():
+    frame = small_frame()
+    mask = np.array([True, True, False, True, True])
+    assert sort_rows(frame, mask, "Part No.").tolist() == [0, 1, 4, 3]
+
+
+def test_pages():
+    frame = small_frame()
+    positions = np.array([4, 3, 2, 1, 0])
+    assert page_count(5, 2) == 3
+    assert page_count(4, 2) == 2
+    assert window(frame, positions, 0, 2).index.tolist() == [4, 3]
+    # the last page holds the remaining rows, a page past the end none
+    assert window(frame, positions, 2, 2).index.tolist() == [0]
+    assert window(frame, positions, 3, 2).empty
+
+
+def test_empty_filter_result_has_one_empty_page():
+    frame = small_frame()
+    positions = sort_rows(frame, filter_rows(frame, "missing"), "Finished Cost")
+    assert len(positions) == 0
+    assert page_count(len(positions), 100) == 1
+    page = window(frame, positions, 0, 100)
+    assert page.empty and list(page.columns) == list(frame.columns)
+
+
+def test_changed_rows():
+    before = small_frame()
+    after = before.copy()
+    after.loc[1, "Part Description"] = "Holder"
+    after.loc[2, "Finished Cost"] = 101.0
+    # missing in both frames is not a change, a new value is
+    assert changed_rows(before, after).tolist() == [False, True, True, False, False]
+    after.loc[1, "Finished Cost"] = 7.0
+    assert changed_rows(before, after).tolist() == [False, True, True, False, False]
+    assert not changed_rows(before, before.copy()).any()
+
+
+def test_every_row_changed_when_the_frames_differ():
+    before = small_frame()
+    assert changed_rows(None, before).all()
+    assert changed_rows(before.iloc[:4], before).all()
+    assert changed_rows(before.drop(columns="Finished Cost"), before).all()
+    assert changed_rows(before.astype({"Finished Cost": "float32"}), before).all()
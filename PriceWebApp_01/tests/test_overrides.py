@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from overrides import CompiledRules, Overrides, Rule, sheet_rules
+from schema import SchemaError, validate_frames
+
+
+def parts_frame():
+    return pd.DataFrame({
+        "Part No.": ["3412", "3499", "3112", "34", "4134", "9000"],
+        "Product Family": ["Street", "Flood", "Street", "Indoor", "Flood", "Indoor"],
+        "Man_Hour": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+        "Price": [10.0, 20.0, 30.0, 40.0, 50.0, 60.0],
+        "Old": [15.0, 15.0, 15.0, 45.0, 45.0, 45.0],
+    })
+
+
+def rule(**values):
+    return Rule(**{"Step": "Man_Hour", "Match": "Part No.", "Values": "", "Column": "Man_Hour", "Action": "set", **values})
+
+
+def test_prefix_and_part_matches():
+    rules = CompiledRules(parts_frame(), [rule(Match="Prefix", Values="34"), rule(Match="Prefix", Values="311, 90"),
+                                          rule(Values="34, 9000, 7777")])
+    assert [rows.tolist() for rows in rules.rows] == [[0, 1, 3], [2, 5], [3, 5]]
+
+
+def test_column_matches():
+    rules = CompiledRules(parts_frame(), [rule(Match="Product Family", Values="Flood, Indoor", Step="MOH"),
+                                          rule(Match="Model", Values="Street")])
+    assert [rows.tolist() for rows in rules.rows] == [[1, 3, 4, 5], []]
+    assert np.flatnonzero(rules.mask("MOH")).tolist() == [1, 3, 4, 5]
+    assert not rules.mask("Man_Hour").any()
+
+
+def test_rules_are_applied_in_order():
+    frame = parts_frame()
+    rules = CompiledRules(frame, [rule(Values="3412, 3499", Value=0.5), rule(Values="3112, 3499", Action="copy_row", Value="9000"),
+                                  rule(Step="Compare", Match="Prefix", Values="34", Column="*", Action="floor", Value="Old")])
+    rules.apply("Man_Hour", frame)
+    assert frame["Man_Hour"].tolist() == [0.5, 6.0, 6.0, 4.0, 5.0, 6.0]
+    rules.apply("Compare", frame, columns=["Price"])
+    assert frame["Price"].tolist() == [15.0, 20.0, 30.0, 45.0, 50.0, 60.0]
+
+
+def test_copy_row_of_a_missing_part():
+    frame = parts_frame()
+    rules = CompiledRules(frame, [rule(Values="3112", Action="copy_row", Value="31CS009005")])
+    assert rules.sources == [-1]
+    with pytest.raises(ValueError, match="part 31CS009005 is not in the list"):
+        rules.apply("Man_Hour", frame)
+    # Not matched in this list: nothing to copy
+    CompiledRules(frame, [rule(Values="7777", Action="copy_row", Value="31CS009005")]).apply("Man_Hour", frame)
+
+
+def test_rules_sheet():
+    Rules = pd.DataFrame({"Step": ["MOH"], "Match": ["Product Family"], "Values": ["Street"],
+                          "Column": ["MOH"], "Action": ["set"], "Value": [0]})
+    assert sheet_rules(None) == []
+    frame = parts_frame()
+    overrides = Overrides(frame, frame.iloc[:2], Rules)
+    assert overrides.rules[-1].match == "Product Family"
+    assert overrides.all.rows[-1].tolist() == [0, 2] and overrides.short.rows[-1].tolist() == [0]
+
+    Rules.loc[1] = ["Labor", "Prefix", "34", "MOH", "set", 0]
+    with pytest.raises(ValueError, match="Unknown rule step 'Labor'"):
+        sheet_rules(Rules)
+    with pytest.raises(SchemaError) as error:
+        validate_frames({"Rules": Rules})
+    assert error.value.report()[["sheet", "rows"]].values.tolist() == [["Rules", "3"]]
@@ -0,0 +1,31 @@
+import pipeline as pipe
+import store
+
+
+def scale_stages(calls):
+    def scale(frame, factors):
+        calls.append(factors)
+        return [value * factors[0] for value in frame]
+
+    return [pipe.Stage("Scale", scale, inputs=["Values"], params=["factors"], outputs=["Scaled"])]
+
+
+def test_list_parameters_are_memoized():
+    calls = []
+    pipeline = pipe.Pipeline(scale_stages(calls))
+    sources = {"Values": ("v1", [1, 2])}
+    assert pipeline.run(sources, {"factors": [2, {"nested": [1]}]})["Scaled"] == [2, 4]
+    assert pipeline.run(sources, {"factors": [2, {"nested": [1]}]})["Scaled"] == [2, 4]
+    assert pipeline.recomputed == []
+    pipeline.run(sources, {"factors": [3, {"nested": [1]}]})
+    assert pipeline.recomputed == ["Scale"]
+    assert len(calls) == 2
+
+
+def test_list_parameters_in_a_shared_cache():
+    calls, shared = [], store.StageCache()
+    sources, params = {"Values": ("v1", [1, 2])}, {"factors": [2, {"nested": [1]}]}
+    assert pipe.Pipeline(scale_stages(calls), shared).run(sources, params)["Scaled"] == [2, 4]
+    assert pipe.Pipeline(scale_stages(calls), shared).run(sources, params)["Scaled"] == [2, 4]
+    assert len(calls) == 1
+    assert shared.hits == 1
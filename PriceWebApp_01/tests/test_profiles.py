@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import calculations_v2 as calc
+import scenarios
+from bom import BOMStructure
+from engine import PricingEngine, merge_params
+from profiles import ProfileCostModel, fee_columns
+
+PARAMS = merge_params({})
+
+
+def full_rollup(frames, Al_index, DomesticRM=0):
+    # process_bom on the processed sheets (profile Total with the indices), every assembly re-costed
+    Al_profile, Imp_RM = calc.process_AlprofIMPRM(frames["Al_profile"], frames["Imp_RM"], PARAMS["euro_to_currency"],
+                                                  PARAMS["nima"], PARAMS["custom"], PARAMS["ExpDuties"], Al_index)
+    return calc.process_bom(Al_profile, Imp_RM, frames["Shemsh"], BOMStructure(frames["BOM"]), DomesticRM)
+
+
+def model_rollup(frames, model, structure, Al_index, DomesticRM=0):
+    Al_profile, Imp_RM = calc.process_AlprofIMPRM(model, frames["Imp_RM"], PARAMS["euro_to_currency"],
+                                                  PARAMS["nima"], PARAMS["custom"], PARAMS["ExpDuties"], Al_index)
+    return calc.process_bom(model, Imp_RM, frames["Shemsh"], structure, DomesticRM, Al_index)
+
+
+def test_totals_match_the_row_sum(frames):
+    Al_profile = frames["Al_profile"]
+    fees = fee_columns(Al_profile)
+    expected = Al_profile[fees].mul(Al_profile["وزن"], axis=0).sum(axis=1).to_numpy()
+    np.testing.assert_array_equal(ProfileCostModel(Al_profile).totals(), expected)
+    np.testing.assert_allclose(ProfileCostModel(Al_profile).totals({"*": 1.1}), expected * 1.1)
+
+
+@pytest.mark.parametrize("DomesticRM", [0, 5])
+@pytest.mark.parametrize("Al_index", [{"*": 1.3}, {"*": 0.0}, {"نرخ پايه 1": 0.0, "نرخ پايه 2": 1.2}, {"*": 1.0}])
+def test_bom_costs_match_the_full_rollup(frames, Al_index, DomesticRM):
+    model, structure = ProfileCostModel(frames["Al_profile"]), BOMStructure(frames["BOM"])
+    # The structure holds the roll-up with the workbook fees first, like in the pipeline
+    model_rollup(frames, model, structure, None, DomesticRM)
+    pd.testing.assert_frame_equal(model_rollup(frames, model, structure, Al_index, DomesticRM),
+                                  full_rollup(frames, Al_index, DomesticRM), rtol=1e-9)
+
+
+def test_bom_costs_of_a_series(frames):
+    model, structure = ProfileCostModel(frames["Al_profile"]), BOMStructure(frames["BOM"])
+    weekly = pd.DataFrame({fee: [0.0, 0.9, 1.0, 1.25] for fee in model.fees}, index=pd.RangeIndex(4, name="week"))
+    Imp_RM = calc.process_AlprofIMPRM(frames["Al_profile"], frames["Imp_RM"], PARAMS["euro_to_currency"], PARAMS["nima"],
+                                      PARAMS["custom"], PARAMS["ExpDuties"])[1]
+    master_cost = pd.concat([Imp_RM.set_index("Part No")["Final Domestic Cost"], frames["Shemsh"].set_index("Part No")["Est Mtr Cost"]])
+    material, raw_material = model.bom_costs(structure, weekly, master_cost, 0)
+    assert material.shape == (len(structure.parents), len(weekly))
+    for week, index in weekly.iterrows():
+        expected = full_rollup(frames, index.to_dict())
+        np.testing.assert_allclose(material[week], expected["Material Cost"], rtol=1e-9)
+        np.testing.assert_allclose(raw_material[week], expected["Raw Material Cost"], rtol=1e-9)
+
+
+def test_index_change_in_the_pipeline(frames):
+    engine = PricingEngine()
+    engine.price(frames, "synthetic")
+    engine.params = merge_params({"Al_index": {"*": 0.0}})
+    results = engine.price(frames, "synthetic")
+    assert "BOM" in results.recomputed and "MH" not in results.recomputed
+    expected = full_rollup(frames, {"*": 0.0}).reindex(results.DOM_ALL["Part No."])
+    np.testing.assert_allclose(results.DOM_ALL["Material Cost"], expected["Material Cost"], rtol=1e-9)
+
+
+def test_unknown_fee_column(frames):
+    with pytest.raises(ValueError, match="Unknown base fee"):
+        ProfileCostModel(frames["Al_profile"]).totals({"نرخ پايه 9": 1.1})
+
+
+def test_index_sweep_matches_engine_runs(frames):
+    sweep = [scenarios.scenario_params(PARAMS, overrides) for overrides in scenarios.scenario_grid(**{"Al_index.*": [0.0, 1.0, 1.3]})]
+    DOM_ALL, costs = scenarios.finished_cost(frames, sweep)
+    for i, params in enumerate(sweep):
+        expected = PricingEngine(params).price(frames, "synthetic").DOM_ALL["Finished Cost"]
+        np.testing.assert_allclose(costs[:, i], expected.to_numpy(dtype=float), rtol=1e-9)
@@ -0,0 +1,57 @@
+import threading
+
+import pandas as pd
+
+import profiling
+from engine import PricingEngine
+
+
+@profiling.profiled
+def copies(frame, n):
+    for _ in range(n):
+        frame.copy()
+    return frame
+
+
+def test_profiled_calls_are_recorded():
+    frame = pd.DataFrame({"a": range(10)})
+    with profiling.Profiler(memory=False) as profiler:
+        copies(frame, 1)
+        copies(frame, 3)
+    copies(frame, 2)
+    summary = profiler.summary()
+    assert summary[["stage", "calls", "rows_in", "rows_out", "copies"]].values.tolist() == [["copies", 2, 10, 10, 4]]
+    assert len(profiler.records) == 2
+
+
+def test_stage_records(frames):
+    with profiling.Profiler(memory=False) as profiler:
+        PricingEngine().price(frames, "synthetic")
+    summary = profiler.summary()
+    assert {"process_bom", "process_DOM_ALL", "price_lists"} <= set(summary["stage"])
+    assert (summary["rows_out"] > 0).all()
+
+
+def test_concurrent_profilers_record_their_own_thread():
+    frame = pd.DataFrame({"a": range(10)})
+    barrier = threading.Barrier(2)
+    profilers = {}
+
+    def run(n):
+        with profiling.Profiler(memory=False) as profiler:
+            barrier.wait()
+            copies(frame, n)
+            barrier.wait()
+        profilers[n] = profiler
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in (2, 5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(profilers) == [2, 5]
+    for n, profiler in profilers.items():
+        assert [record["copies"] for record in profiler.records] == [n]
+    # Not profiling: the calls are not recorded and DataFrame.copy is restored
+    assert profiling._active.get() is None
+    assert pd.DataFrame.copy is profiling._copy
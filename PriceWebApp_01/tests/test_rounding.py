@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+import calculations_v2 as calc
+import overrides
+from engine import PricingEngine, merge_params
+from rounding import RoundingPolicy
+
+
+# Per element rounding of the first version of calculations_v2
+def baseline_custom_round(value):
+    steps = [(200, 10), (1000, 50), (5000, 100), (20000, 500), (100000, 1000)]
+    for threshold, step in steps:
+        if value < threshold:
+            return np.ceil(value / step) * step
+    return np.ceil(value / 5000) * 5000
+
+
+def baseline_test_round(value):
+    if value >= 300_000:
+        return np.ceil(value / 10000) * 10000
+    return np.ceil(value / 5000) * 5000
+
+
+VALUES = np.concatenate([
+    [0, 1, 199, 199.5, 200, 200.1, 999, 1000, 4999, 5000, 19999, 20000, 99999, 100000, 100001,
+     299999, 300000, 300001, 1e7, -10, -250],
+    np.random.default_rng(0).uniform(0, 2e6, 1000),
+])
+
+
+def test_custom_round_matches_the_baseline():
+    expected = np.array([baseline_custom_round(value) for value in VALUES])
+    np.testing.assert_array_equal(calc.custom_round(VALUES), expected)
+
+
+def test_side_price_rounding_matches_the_baseline():
+    expected = np.array([baseline_test_round(value) for value in VALUES])
+    np.testing.assert_array_equal(calc.test_round(VALUES), expected)
+
+
+def test_nan_stays_nan():
+    assert np.isnan(calc.custom_round(np.array([np.nan]))).all()
+
+
+def test_policy_needs_one_more_step():
+    with pytest.raises(ValueError):
+        RoundingPolicy([100, 200], [10, 20])
+
+
+def test_common_parts_rounding_matches_the_baseline(frames, monkeypatch):
+    # Without the floor of the common parts at their old price
+    monkeypatch.setattr(overrides, "RULES", [rule for rule in overrides.RULES if rule.action != "floor"])
+    first = PricingEngine().price(frames, "synthetic")
+    DOM_ALL = first.DOM_ALL
+    compared = frames["Compare"].astype(str).to_numpy().ravel()
+    common = DOM_ALL[(DOM_ALL["Price List Type"] == "Common Parts") & ~DOM_ALL["Part No."].astype(str).isin(compared)]
+    criteria = common["Finished Cost"].iloc[0]
+    params = merge_params({"CommonPartPriceCriteria": criteria})
+    results = PricingEngine(params).price(frames, "synthetic")
+    price = results.DOM_ALL.set_index("Part No.")["Base Price Including VAT (IRR)"].reindex(common["Part No."]).to_numpy()
+
+    # First version: a step of 5000 below the criteria, 100000 above, the price of the list when equal
+    short = results.DOM_short.set_index("Part No.")["Base Price Including VAT (IRR)"]
+    listed = (common["Part No."].map(short).fillna(0) + common["Base Part"].map(short).fillna(0)).astype(int)
+    cost = common["Finished Cost"] / params["CommonPartCoeff"]
+    expected = np.where(common["Finished Cost"] < criteria, np.ceil(cost / 5000) * 5000,
+                        np.where(common["Finished Cost"] > criteria, np.ceil(cost / 100000) * 100000, listed))
+    np.testing.assert_array_equal(price, expected)
+    assert price[0] == listed.iloc[0] != np.ceil(cost.iloc[0] / 100000) * 100000
+    assert (common["Finished Cost"] < criteria).any() and (common["Finished Cost"] > criteria).any()
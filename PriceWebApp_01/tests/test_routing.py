@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import calculations_v2 as calc
+import export
+from engine import PricingEngine
+from routing import Routing
+
+OLD_RATE = 2300000
+
+
+def test_man_hours_match_the_groupby(frames):
+    MH = calc.process_mh(frames["MH"], frames["Cost"])
+    routing = Routing(MH)
+    expected = MH.groupby("PART_NO")["Man_Hour"].sum()
+    np.testing.assert_allclose(routing.man_hours, expected.reindex(routing.parts), rtol=1e-12)
+
+
+def test_center_rates_match_the_line_costs(frames):
+    MH = calc.process_mh(frames["MH"], frames["Cost"])
+    routing = Routing(MH)
+    # Labor cost of the lines at their center rate, the labor rate without one
+    cost = MH["Man_Hour"] * pd.to_numeric(MH["Est Labor Cost"], errors="coerce").fillna(OLD_RATE)
+    expected = cost.groupby(MH["PART_NO"]).sum() / MH.groupby("PART_NO")["Man_Hour"].sum()
+    rates = routing.labor_rates(routing.positions(expected.index), OLD_RATE)
+    np.testing.assert_allclose(rates, expected, rtol=1e-9)
+
+
+def test_center_costs_match_the_line_costs(frames):
+    MH = calc.process_mh(frames["MH"], frames["Cost"])
+    costs = Routing(MH).center_costs(OLD_RATE)
+    # Labor Cost -OLD / -NEW / Diff of the lines, summed per cost center
+    lines = pd.DataFrame({"Cost Center": MH["Cost Center"], "Man_Hour": MH["Man_Hour"]})
+    lines["Labor Cost -OLD"] = MH["Man_Hour"] * OLD_RATE
+    lines["Labor Cost -NEW"] = MH["Man_Hour"] * pd.to_numeric(MH["Est Labor Cost"], errors="coerce").fillna(OLD_RATE)
+    expected = lines.groupby("Cost Center").sum()
+    expected["Diff"] = expected["Labor Cost -NEW"] - expected["Labor Cost -OLD"]
+    pd.testing.assert_frame_equal(costs, expected, check_exact=False, rtol=1e-9, check_index_type=False)
+
+
+@pytest.mark.parametrize("LaborCosting", ["Labor Rate", "Cost Center"])
+def test_labor_cost_of_dom_all(frames, LaborCosting):
+    DOM_ALL = PricingEngine({"LaborCosting": LaborCosting, "OLDlaborRate": OLD_RATE}).price(frames, "synthetic").DOM_ALL
+    MH = calc.process_mh(frames["MH"], frames["Cost"])
+    # The parts with a fixed man hour (overrides) are left out
+    regular = DOM_ALL["Part No."].isin(MH["PART_NO"]) & ~DOM_ALL["Part No."].astype(str).str.match("31BB80|31CS009")
+    DOM_ALL = DOM_ALL[regular]
+    man_hours = MH.groupby("PART_NO")["Man_Hour"].sum().reindex(DOM_ALL["Part No."]).to_numpy()
+    np.testing.assert_allclose(DOM_ALL["Man_Hour"], man_hours, rtol=1e-12)
+    # Labor Cost -NEW of the lines at the rates of their cost centers, summed per part
+    rate = pd.to_numeric(MH["Est Labor Cost"], errors="coerce").fillna(OLD_RATE)
+    center_cost = (MH["Man_Hour"] * rate).groupby(MH["PART_NO"]).sum().reindex(DOM_ALL["Part No."]).to_numpy()
+    expected = man_hours * OLD_RATE if LaborCosting == "Labor Rate" else center_cost
+    np.testing.assert_allclose(DOM_ALL["Labor Cost"], expected, rtol=1e-9)
+    np.testing.assert_allclose(DOM_ALL["Labor Cost Diff"], center_cost - man_hours * OLD_RATE, rtol=1e-6, atol=1e-3)
+
+
+def test_cost_centers_are_exported(frames):
+    results = PricingEngine({"OLDlaborRate": OLD_RATE}).price(frames, "synthetic")
+    sheets = export.export_sheets(results.frames, results.params["OLDlaborRate"])
+    costs = Routing(calc.process_mh(frames["MH"], frames["Cost"])).center_costs(OLD_RATE)
+    pd.testing.assert_frame_equal(sheets["Cost Centers"], costs.reset_index())
+    pd.testing.assert_frame_equal(results.center_costs(), costs)
+    assert "Cost Centers" not in export.export_sheets(results.frames)
@@ -0,0 +1,26 @@
+import pandas as pd
+
+import runs
+from engine import PricingResults
+
+
+def priced(part_no, prices):
+    DOM_ALL = pd.DataFrame({"Part No.": part_no, runs.BASE_PRICE: prices})
+    return PricingResults({"DOM_ALL": DOM_ALL, "DOM_short": DOM_ALL}, {}, [])
+
+
+def test_diff_of_two_runs(tmp_path):
+    old = runs.save_run(priced(["31AB001", "31AB002", "31AB003"], [100.0, 200.0, 300.0]), {}, "aaaa", "old", str(tmp_path))
+    new = runs.save_run(priced(["31AB001", "31AB002", "31AB004"], [100.0, 210.0, 400.0]), {}, "bbbb", runs_dir=str(tmp_path))
+    assert runs.run_info(old, str(tmp_path))["name"] == "old"
+    diff = runs.diff_runs(old, new, columns=[runs.BASE_PRICE], only_changed=True, runs_dir=str(tmp_path))
+    assert diff.set_index("Part No.")["Status"].to_dict() == {"31AB002": "changed", "31AB004": "added", "31AB003": "removed"}
+
+
+def test_runs_saved_in_the_same_second(tmp_path):
+    first = runs.save_run(priced(["31AB001", "31AB002"], [100.0, 200.0]), {}, "abcd", runs_dir=str(tmp_path))
+    second = runs.save_run(priced(["31AB001", "31AB002"], [100.0, 210.0]), {}, "abcd", runs_dir=str(tmp_path))
+    assert first != second
+    assert runs.list_runs(str(tmp_path))["id"].tolist() == [first, second]
+    diff = runs.diff_runs(first, second, columns=[runs.BASE_PRICE], only_changed=True, runs_dir=str(tmp_path))
+    assert diff["Part No."].tolist() == ["31AB002"]
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+import scenarios
+from engine import PricingEngine
+
+
+@pytest.mark.parametrize("method", ["Original Price", "New Gross"])
+def test_sweep_matches_single_engine_runs(frames, method):
+    grid = scenarios.scenario_grid(**{"nima": [650000, 710000], "OverHead_Rates.MOH": [1.0, 1.4],
+                                      "LaborCosting": ["Labor Rate", "Cost Center"], "DomesticRM": [0, 5]})
+    results = scenarios.run_scenarios(frames, grid, {"method": method})
+    for i, params in enumerate(results.params):
+        DOM_ALL = PricingEngine(params).price(frames, "synthetic").DOM_ALL
+        np.testing.assert_allclose(results.finished_cost[i], DOM_ALL["Finished Cost"].to_numpy(dtype=float), rtol=1e-9)
+        for name in scenarios.PRICE_COLUMNS:
+            np.testing.assert_allclose(results.prices[name][i], DOM_ALL[name].to_numpy(dtype=float), rtol=1e-9, equal_nan=True, err_msg=name)
+
+
+def test_scenario_params():
+    params = scenarios.scenario_params({"nima": 1}, {"euro_to_currency.USD": 1.2, "vat": 9})
+    assert params["nima"] == 1 and params["vat"] == 9
+    assert params["euro_to_currency"]["USD"] == 1.2 and params["euro_to_currency"]["AED"] == 4.054
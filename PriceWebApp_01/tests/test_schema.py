@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine import FRAME_NAMES
+from overrides import GALAXY_MAN_HOURS_PART
+from schema import SCHEMAS, SchemaError, validate_frames
+
+
+def test_every_engine_frame_has_a_schema():
+    assert set(FRAME_NAMES) <= set(SCHEMAS)
+
+
+def test_compare_part_numbers_are_coerced(frames):
+    # Part numbers read as numbers by Excel match the text part numbers of Dom-All
+    Compare = frames["Compare"].copy()
+    row = Compare.index[Compare["Component Part 1"].astype(str) == "3129814000"][0]
+    Compare["Component Part 1"] = Compare["Component Part 1"].astype(object)
+    Compare.loc[row, "Component Part 1"] = 3129814000
+    validated = validate_frames({**frames, "Compare": Compare})
+    components = validated["Compare"]["Component Part 1"]
+    assert components.map(type).eq(str).all()
+    assert "3129814000" in set(components)
+    assert components.isin(validated["DOM_ALL"]["Part No."]).all()
+
+
+def test_unknown_frames_raise(frames):
+    with pytest.raises(ValueError, match="Unknown frames Adj"):
+        validate_frames({"DOM_ALL": frames["DOM_ALL"], "Adj": frames["Compare"]})
+
+
+def test_problems_are_collected(frames):
+    MH = frames["MH"].drop(columns="QTY").astype({"RUN FACTOR": object})
+    MH.loc[3, "RUN FACTOR"] = "n/a"
+    DOM_short = pd.concat([frames["DOM_short"], frames["DOM_short"].iloc[:1]], ignore_index=True)
+    with pytest.raises(SchemaError) as error:
+        validate_frames({"MH": MH, "DOM_short": DOM_short})
+    problems = error.value.report()
+    assert set(zip(problems["sheet"], problems["column"])) == {("MH", "QTY"), ("MH", "RUN FACTOR"), ("Dom-Short", "Part No.")}
+    assert problems.loc[problems["column"] == "RUN FACTOR", "rows"].item() == "5"
+
+
+def test_lenient_columns_warn(frames):
+    DOM_short = frames["DOM_short"].astype({"New_Gross": object})
+    DOM_short.loc[0, "New_Gross"] = "abc"
+    with pytest.warns(UserWarning, match="New_Gross"):
+        validated = validate_frames({"DOM_short": DOM_short})
+    assert np.isnan(validated["DOM_short"].loc[0, "New_Gross"])
+
+
+def test_compare_rows_are_checked_at_load():
+    Compare = pd.DataFrame({"Component Part 1": ["A", "B", "C", "A"], "Component Part 2": ["X", "Y", "Z", "W"],
+                            "Super Component 1": ["B", "A", "A", "A"]})
+    with pytest.raises(SchemaError) as error:
+        validate_frames({"Compare": Compare})
+    assert error.value.report()[["sheet", "column", "rows"]].values.tolist() == [["Compare", "Component Part 1", "2, 5"]]
+    # A and B are the super component of each other, C waits on them
+    with pytest.raises(SchemaError, match="cycle of super components") as error:
+        validate_frames({"Compare": Compare.iloc[:3]})
+    assert error.value.report()[["sheet", "column", "rows"]].values.tolist() == [["Compare", "Super Component 1", "2, 3, 4"]]
+
+
+def test_galaxy_man_hours_need_their_source_part(frames):
+    DOM_ALL = frames["DOM_ALL"]
+    assert (DOM_ALL["Part No."] == GALAXY_MAN_HOURS_PART).sum() == 1
+    with pytest.raises(SchemaError, match=f"need the Man_Hour of part {GALAXY_MAN_HOURS_PART}") as error:
+        validate_frames({"DOM_ALL": DOM_ALL[DOM_ALL["Part No."] != GALAXY_MAN_HOURS_PART]})
+    # The Excel rows of the Galaxy parts
+    assert error.value.report()[["sheet", "column", "rows"]].values.tolist() == [["Dom-All", "Man_Hour", "12, 13"]]
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+import edits
+import sessions
+from engine import PricingEngine, merge_params
+from memory import parquet_frame
+
+
+@pytest.fixture
+def edited(frames):
+    # the priced short list with a few edited cells, as the dashboard keeps it
+    DOM_short = PricingEngine().price(frames, "synthetic").DOM_short
+    parts = DOM_short["Part No."].iloc[[0, 7, 21]].to_numpy()
+    changes = pd.DataFrame({"Part No.": parts, "column": ["Original Price (IRR)", "New_Gross", "New_Gross"],
+                            "value": [123456.0, 0.5, 0.25]})
+    return edits.apply_edits(DOM_short, changes)
+
+
+def test_snapshot_round_trip(frames, edited, tmp_path):
+    params = merge_params({"nima": 700000, "method": "New Gross", "Sales_Percent": {"Wholesales": 0.9}})
+    DOM_ALL = PricingEngine(params).price(frames, "synthetic", edited, 1).DOM_ALL
+    checkpoint = sessions.Checkpoint("f00dcafe", True, owner="me", sessions_dir=str(tmp_path))
+    checkpoint.save(params, edited, 3, DOM_ALL)
+
+    snapshot = sessions.load_session(checkpoint.session_id, str(tmp_path))
+    assert (snapshot.session_id, snapshot.owner, snapshot.workbook, snapshot.compact) == (checkpoint.session_id, "me", "f00dcafe", True)
+    assert snapshot.params == params and snapshot.data_version == 3
+    pd.testing.assert_frame_equal(snapshot.data, edited)
+    pd.testing.assert_frame_equal(snapshot.DOM_ALL, DOM_ALL)
+
+    # the restored session prices as the session it was saved from
+    resumed = PricingEngine(snapshot.params).price(frames, "synthetic", snapshot.data, snapshot.data_version).DOM_ALL
+    pd.testing.assert_frame_equal(resumed, DOM_ALL)
+
+
+def test_sessions_are_listed_per_owner(edited, tmp_path):
+    for owner, workbook in (("me", "aaaa"), ("me", "bbbb"), ("you", "aaaa"), (None, "aaaa")):
+        sessions.Checkpoint(workbook, owner=owner, sessions_dir=str(tmp_path)).save({}, edited.head(), 0)
+    mine = sessions.list_sessions(owner="me", sessions_dir=str(tmp_path))
+    assert sorted(session["workbook"] for session in mine) == ["aaaa", "bbbb"]
+    assert [session["workbook"] for session in sessions.list_sessions("aaaa", "me", str(tmp_path))] == ["aaaa"]
+    assert len(sessions.list_sessions(owner="them", sessions_dir=str(tmp_path))) == 0
+    assert len(sessions.list_sessions(sessions_dir=str(tmp_path))) == 4
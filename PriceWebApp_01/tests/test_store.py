@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+import store
+
+
+def outputs(rows):
+    # A frame of rows float64 values and an array of as many, 16 bytes per row
+    return pd.DataFrame({"a": np.zeros(rows)}, index=pd.RangeIndex(rows)), np.zeros(rows)
+
+
+def test_stage_cache_is_bounded_by_bytes():
+    cache = store.StageCache(max_bytes=3000)
+    frame, array = outputs(50)
+    assert store.output_bytes((frame, array, "not counted")) == frame.memory_usage(deep=True).sum() + 400
+    for key in "abc":
+        cache.put("Stage", key, outputs(50))
+    assert cache.get("Stage", "a") is not None
+    # d pushes out b, the least recently used one
+    cache.put("Stage", "d", outputs(50))
+    assert cache.get("Stage", "b") is None
+    assert [cache.get("Stage", key) is not None for key in "acd"] == [True, True, True]
+    assert cache.nbytes <= 3000 and len(cache) == 3
+
+    # A result larger than the cache is not kept, replacing an entry counts it once
+    cache.put("Stage", "e", outputs(500))
+    assert cache.get("Stage", "e") is None and len(cache) == 3
+    cache.put("Stage", "a", outputs(50))
+    assert cache.nbytes == 3 * store.output_bytes(outputs(50))
@@ -0,0 +1,24 @@
+import pandas as pd
+import pytest
+
+import synthetic
+from engine import FRAME_NAMES
+
+
+def test_sizes_of_the_frames(frames):
+    assert set(frames) <= set(FRAME_NAMES)
+    assert len(frames["DOM_ALL"]) == 2000
+    assert len(frames["DOM_short"]) == 400
+    assert len(frames["BOM"]) == 12000
+    assert frames["DOM_ALL"]["Part No."].is_unique
+
+
+def test_frames_of_a_seed_are_repeated():
+    first, second = synthetic.synthetic_frames(seed=1), synthetic.synthetic_frames(seed=1)
+    for name in first:
+        pd.testing.assert_frame_equal(first[name], second[name])
+
+
+def test_too_few_parts():
+    with pytest.raises(ValueError, match="at least"):
+        synthetic.synthetic_frames(parts=synthetic.MIN_PARTS - 1)
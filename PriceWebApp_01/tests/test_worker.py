@@ -0,0 +1,94 @@
+import threading
+
+import worker
+
+STAGES = ["Costs", "Pricing"]
+
+
+class FakeEngine:
+    """
+    Engine pricing params["n"] through STAGES, a gated stage waits to be released.
+    """
+    def __init__(self):
+        self.params = None
+        self.stages = []        # (n, stage) of the stages run
+        self.gates = {}         # (n, stage) -> (entered, release)
+
+    def gate(self, n, stage):
+        self.gates[(n, stage)] = (threading.Event(), threading.Event())
+        return self.gates[(n, stage)]
+
+    def price(self, frames, progress=None):
+        n = self.params["n"]
+        for done, stage in enumerate(STAGES):
+            if progress is not None:
+                progress(stage, done, len(STAGES))
+            self.stages.append((n, stage))
+            if (n, stage) in self.gates:
+                entered, release = self.gates[(n, stage)]
+                entered.set()
+                assert release.wait(5)
+        return {"n": n, "frames": frames}
+
+
+def finished(job):
+    assert job.done.wait(5)
+    return job
+
+
+def test_jobs_submitted_within_the_debounce_make_one_run():
+    engine = FakeEngine()
+    runner = worker.PricingWorker(engine, debounce=0.5)
+    frames = object()
+    first = runner.submit({"n": 1}, frames)
+    second = runner.submit({"n": 2}, frames)
+    assert runner.submit({"n": 2}, frames) is second
+    assert finished(first).cancelled and first.results is None
+    assert finished(second).results == {"n": 2, "frames": frames}
+    assert engine.stages == [(2, "Costs"), (2, "Pricing")]
+
+
+def test_a_newer_job_supersedes_the_running_one():
+    engine = FakeEngine()
+    entered, release = engine.gate(1, "Costs")
+    runner = worker.PricingWorker(engine, debounce=0)
+    first = runner.submit({"n": 1}, None)
+    assert entered.wait(5)
+    second = runner.submit({"n": 2}, None)
+    release.set()
+    assert finished(first).cancelled and first.results is None
+    assert finished(second).results["n"] == 2
+    assert runner.latest is second
+
+
+def test_cancel_at_the_next_stage_boundary():
+    engine = FakeEngine()
+    entered, release = engine.gate(1, "Costs")
+    runner = worker.PricingWorker(engine, debounce=0)
+    first = runner.submit({"n": 1}, None)
+    assert entered.wait(5)
+    assert first.stage == "Costs" and first.fraction == 0
+    second = runner.submit({"n": 2}, None)
+    # The running stage ends, the next stage of the superseded job never starts
+    release.set()
+    finished(first)
+    assert first.stage == "Costs"
+    finished(second)
+    assert engine.stages == [(1, "Costs"), (2, "Costs"), (2, "Pricing")]
+
+
+def test_latest_is_replaced_by_a_finished_job_only():
+    engine = FakeEngine()
+    runner = worker.PricingWorker(engine, debounce=0)
+    first = finished(runner.submit({"n": 1}, None))
+    assert runner.latest is first and first.fraction == 1.0
+
+    entered, release = engine.gate(2, "Pricing")
+    second = runner.submit({"n": 2}, None)
+    assert entered.wait(5)
+    # While the second job runs, the page still reads the complete first run
+    assert runner.latest is first and first.results["n"] == 1
+    assert second.results is None and second.fraction == 0.5
+    release.set()
+    finished(second)
+    assert runner.latest is second and second.results["n"] == 2
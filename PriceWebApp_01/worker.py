@@ -0,0 +1,145 @@
+import threading
+import time
+
+########################################################################################
+# Background pricing runs of a dashboard session
+#
+# The pricing of a session runs in a worker thread so the page stays responsive during
+# long recomputes. Every change of the parameters or edits submits a new job:
+#   - a job waits `debounce` seconds before starting, a newer job submitted meanwhile
+#     replaces it (several sidebar numbers changed quickly make one run)
+#   - a newer job cancels the running one at its next stage boundary (Cancelled is
+#     raised from the pipeline progress callback, the finished stages stay memoized)
+#   - a finished job becomes `latest` in one assignment, the page reads the results
+#     of `latest` and never sees a half priced run
+#   runner = PricingWorker(PricingEngine())
+#   job = runner.submit(params, frames, key, DOM_short, edits_version)
+#   job.done.wait(); runner.latest.results
+########################################################################################
+
+# Seconds the page waits for a run before showing the previous prices
+PAGE_WAIT = 1.0
+
+
+class Cancelled(Exception):
+    """
+    A newer job superseded the running one.
+    """
+
+
+class PricingJob:
+    """
+    One pricing run: its parameters and engine.price arguments, progress and outcome.
+    """
+    def __init__(self, generation, params, args, profiler=None):
+        self.generation = generation
+        self.params = params
+        self.args = args
+        self.profiler = profiler
+        self.profiled = profiler is not None
+        self.submitted = time.monotonic()
+        self.done = threading.Event()
+        self.stage = None           # stage running
+        self.fraction = 0.0         # stages done / stages
+        self.results = None
+        self.error = None
+        self.cancelled = False
+
+    def same_request(self, params, args, profiled=False):
+        # The same parameters and the same frames (identity) as this job
+        return self.params == params and self.profiled == profiled and len(self.args) == len(args) and all(
+            a is b or (not hasattr(a, "shape") and not isinstance(a, dict) and a == b) for a, b in zip(self.args, args))
+
+
+class PricingWorker:
+    """
+    Runs the jobs of one engine in a background thread, one at a time.
+        debounce: seconds a job waits for a newer one before starting
+        idle_timeout: seconds after which an idle thread stops (restarted by submit)
+    """
+    def __init__(self, engine, debounce=0.2, idle_timeout=60):
+        self.engine = engine
+        self.debounce = debounce
+        self.idle_timeout = idle_timeout
+        self.latest = None          # last finished job, its results are the current prices
+        self._generation = 0
+        self._last = None           # last submitted job
+        self._pending = None        # job waiting to start
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, params, *args, profiler=None):
+        """
+        Job pricing the engine.price arguments with params. The same request as the
+        last job returns that job, a new one supersedes the pending and running jobs.
+        profiler is an optional callable returning a profiling.Profiler for the run.
+        """
+        with self._condition:
+            last = self._last
+            if (last is not None and last.error is None and not last.cancelled
+                    and last.same_request(params, args, profiler is not None)):
+                return last
+            self._generation += 1
+            job = PricingJob(self._generation, params, args, profiler)
+            if self._pending is not None:
+                self._pending.cancelled = True
+                self._pending.done.set()
+            self._pending = self._last = job
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="pricing-worker", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+            return job
+
+    def _next_job(self):
+        # Pending job once no newer job was submitted for debounce seconds, None when idle
+        with self._condition:
+            idle_since = time.monotonic()
+            while self._pending is None:
+                remaining = idle_since + self.idle_timeout - time.monotonic()
+                if remaining <= 0:
+                    self._thread = None
+                    return None
+                self._condition.wait(remaining)
+            while True:
+                job = self._pending
+                remaining = job.submitted + self.debounce - time.monotonic()
+                if remaining <= 0:
+                    self._pending = None
+                    return job
+                self._condition.wait(remaining)
+
+    def _loop(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            self._run(job)
+
+    def _check(self, job, stage, done, stages):
+        # Progress callback of the pipeline, stops a superseded job between stages
+        if job.generation != self._generation:
+            raise Cancelled()
+        job.stage = stage
+        job.fraction = done / stages
+
+    def _run(self, job):
+        try:
+            self.engine.params = job.params
+            progress = lambda stage, done, stages: self._check(job, stage, done, stages)
+            if job.profiler is not None:
+                job.profiler = job.profiler()
+                with job.profiler:
+                    job.results = self.engine.price(*job.args, progress=progress)
+            else:
+                job.results = self.engine.price(*job.args, progress=progress)
+            job.fraction = 1.0
+            with self._condition:
+                if self.latest is None or job.generation > self.latest.generation:
+                    self.latest = job
+        except Cancelled:
+            job.cancelled = True
+        except Exception as e:
+            job.error = e
+        finally:
+            job.done.set()